@@ -0,0 +1,5 @@
+BEGIN;
+
+CREATE INDEX donation_payment_date_id_idx ON donation (payment_date, id);
+
+COMMIT;
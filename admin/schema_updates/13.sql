@@ -0,0 +1,31 @@
+BEGIN;
+
+CREATE TABLE donor_summary (
+  id             SERIAL                   NOT NULL,
+  first_name     CHARACTER VARYING        NOT NULL,
+  last_name      CHARACTER VARYING        NOT NULL,
+  editor_name    CHARACTER VARYING,
+  anonymous      BOOLEAN                  NOT NULL,
+  amount         NUMERIC(11, 2)           NOT NULL,
+  fee            NUMERIC(11, 2),
+  donation_count INTEGER                  NOT NULL,
+  payment_date   TIMESTAMP WITH TIME ZONE,
+  nag_deadline   TIMESTAMP WITH TIME ZONE,
+  CONSTRAINT donor_summary_pkey PRIMARY KEY (id)
+);
+
+CREATE UNIQUE INDEX donor_summary_identity_idx ON donor_summary (first_name, last_name, coalesce(editor_name, ''), anonymous);
+CREATE INDEX donor_summary_amount_idx ON donor_summary (amount DESC) WHERE NOT anonymous;
+CREATE INDEX donor_summary_lower_editor_name_idx ON donor_summary (lower(editor_name));
+
+CREATE INDEX donation_donor_idx ON donation (first_name, last_name);
+
+INSERT INTO donor_summary (first_name, last_name, editor_name, anonymous,
+                           amount, fee, donation_count, payment_date, nag_deadline)
+     SELECT first_name, last_name, NULLIF(editor_name, ''), anonymous,
+            sum(amount), sum(fee), count(*), max(payment_date),
+            max(payment_date + (amount + COALESCE(fee, 0)) * 7.5 * interval '1 day')
+       FROM donation
+   GROUP BY first_name, last_name, NULLIF(editor_name, ''), anonymous;
+
+COMMIT;
@@ -0,0 +1,23 @@
+BEGIN;
+
+CREATE TYPE job_status_types AS ENUM (
+  'pending',
+  'dead'
+);
+
+CREATE TABLE job (
+  id           SERIAL                   NOT NULL,
+  type         CHARACTER VARYING        NOT NULL,
+  payload      JSON                     NOT NULL,
+  status       job_status_types         NOT NULL,
+  created      TIMESTAMP WITH TIME ZONE NOT NULL,
+  run_at       TIMESTAMP WITH TIME ZONE NOT NULL,
+  attempts     INTEGER                  NOT NULL,
+  max_attempts INTEGER                  NOT NULL,
+  last_error   TEXT,
+  CONSTRAINT job_pkey PRIMARY KEY (id)
+);
+
+CREATE INDEX job_pending_run_at_idx ON job (run_at, id) WHERE status = 'pending';
+
+COMMIT;
@@ -0,0 +1,21 @@
+BEGIN;
+
+CREATE TYPE paypal_ipn_status_types AS ENUM (
+  'received',
+  'verified',
+  'invalid'
+);
+
+CREATE TABLE paypal_ipn (
+  id             SERIAL                   NOT NULL,
+  txn_id         CHARACTER VARYING,
+  payment_status CHARACTER VARYING,
+  data           BYTEA                    NOT NULL,
+  status         paypal_ipn_status_types  NOT NULL,
+  received       TIMESTAMP WITH TIME ZONE NOT NULL,
+  CONSTRAINT paypal_ipn_pkey PRIMARY KEY (id)
+);
+
+CREATE UNIQUE INDEX paypal_ipn_txn_id_payment_status_idx ON paypal_ipn (txn_id, payment_status) WHERE txn_id IS NOT NULL;
+
+COMMIT;
@@ -0,0 +1,22 @@
+BEGIN;
+
+-- Removing duplicate donations (the first one is kept)
+DELETE FROM donation duplicate
+      USING donation original
+      WHERE duplicate.payment_method = original.payment_method
+        AND duplicate.transaction_id = original.transaction_id
+        AND duplicate.id > original.id;
+
+CREATE UNIQUE INDEX donation_payment_method_transaction_id_idx ON donation (payment_method, transaction_id);
+
+-- Summaries might include removed donations
+DELETE FROM donor_summary;
+INSERT INTO donor_summary (first_name, last_name, editor_name, anonymous,
+                           amount, fee, donation_count, payment_date, nag_deadline)
+     SELECT first_name, last_name, NULLIF(editor_name, ''), anonymous,
+            sum(amount), sum(fee), count(*), max(payment_date),
+            max(payment_date + (amount + COALESCE(fee, 0)) * 7.5 * interval '1 day')
+       FROM donation
+   GROUP BY first_name, last_name, NULLIF(editor_name, ''), anonymous;
+
+COMMIT;
@@ -0,0 +1,33 @@
+BEGIN;
+
+CREATE TYPE donation_rollup_period_types AS ENUM (
+  'month',
+  'year'
+);
+
+CREATE TABLE donation_rollup (
+  id             SERIAL                       NOT NULL,
+  period         donation_rollup_period_types NOT NULL,
+  start          DATE                         NOT NULL,
+  payment_method CHARACTER VARYING,
+  amount         NUMERIC(11, 2)               NOT NULL,
+  fee            NUMERIC(11, 2),
+  donation_count INTEGER                      NOT NULL,
+  donor_count    INTEGER,
+  CONSTRAINT donation_rollup_pkey PRIMARY KEY (id)
+);
+
+CREATE UNIQUE INDEX donation_rollup_period_start_idx ON donation_rollup (period, start, COALESCE(payment_method, ''));
+
+-- Same as DonationRollup.rebuild()
+INSERT INTO donation_rollup (period, start, payment_method, amount, fee, donation_count, donor_count)
+     SELECT period, CAST(date_trunc(CAST(period AS text), payment_date AT TIME ZONE 'UTC') AS date),
+            CASE WHEN GROUPING(payment_method) = 0
+                 THEN COALESCE(CAST(payment_method AS text), 'other') END,
+            sum(amount), sum(fee), count(*), count(DISTINCT lower(email))
+       FROM donation, unnest(ARRAY['month', 'year']::donation_rollup_period_types[]) AS period
+      WHERE payment_date IS NOT NULL
+   GROUP BY period, CAST(date_trunc(CAST(period AS text), payment_date AT TIME ZONE 'UTC') AS date),
+            GROUPING SETS ((payment_method), ());
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- Needs to be run by a superuser, because it installs pg_trgm extension
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Substring search of users and tokens in the admin interface
+CREATE INDEX user_musicbrainz_id_trgm_idx ON "user" USING gin (musicbrainz_id gin_trgm_ops);
+CREATE INDEX user_org_name_trgm_idx ON "user" USING gin (org_name gin_trgm_ops);
+CREATE INDEX user_contact_name_trgm_idx ON "user" USING gin (contact_name gin_trgm_ops);
+CREATE INDEX user_contact_email_trgm_idx ON "user" USING gin (contact_email gin_trgm_ops);
+CREATE INDEX token_value_trgm_idx ON token USING gin (value gin_trgm_ops);
+
+-- Prefix search of tokens
+CREATE INDEX token_value_pattern_idx ON token (value text_pattern_ops);
+
+COMMIT;
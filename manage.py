@@ -24,5 +24,111 @@ def cleanup_logs():
         AccessLog.remove_old_ip_addr_records()
 
 
+@manager.command
+def rebuild_donor_summary():
+    """Recalculate summaries of all donors from donations."""
+    from metabrainz.model.donor_summary import DonorSummary
+    DonorSummary.rebuild()
+
+
+@manager.option('-c', '--concurrency', dest='concurrency', type=int, default=1,
+                help="Number of worker processes.")
+def worker(concurrency):
+    """Perform background jobs (sending receipts, etc.)."""
+    from metabrainz import jobs
+    jobs.run_workers(create_app, concurrency)
+
+
+@manager.command
+def retry_dead_jobs():
+    """Retry background jobs that failed too many times."""
+    from metabrainz import jobs
+    print("%s jobs will be retried." % jobs.retry_dead())
+
+
+@manager.option('-s', '--start', dest='start', help="First date of the period (YYYY-MM-DD).")
+@manager.option('-e', '--end', dest='end', help="Date after the last date of the period (YYYY-MM-DD).")
+@manager.option('-y', '--year', dest='year', type=int, help="Year (instead of start and end dates).")
+@manager.option('--statements', dest='statements', action='store_true', default=False,
+                help="Send one statement to each donor instead of a receipt for each donation.")
+@manager.option('-p', '--processes', dest='processes', type=int, default=None,
+                help="Number of worker processes (number of CPUs by default).")
+@manager.option('-n', '--dry-run', dest='dry_run', action='store_true', default=False,
+                help="Generate PDFs without sending them.")
+@manager.option('-c', '--checkpoint', dest='checkpoint',
+                help="File where progress is saved. Existing checkpoint is resumed.")
+def receipts(start, end, year, statements, processes, dry_run, checkpoint):
+    """Send receipts or statements for donations made during a period."""
+    from metabrainz.donations import bulk
+    from datetime import date, datetime
+    if year:
+        start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    elif start and end:
+        start = datetime.strptime(start, "%Y-%m-%d").date()
+        end = datetime.strptime(end, "%Y-%m-%d").date()
+    else:
+        print("Either a year or start and end dates need to be specified.")
+        return
+
+    def progress(processed, failed, elapsed):
+        print("%8d processed, %6d failed, %8.1f/s" % (processed, failed, processed / elapsed if elapsed else 0))
+
+    bulk.run(start, end,
+             mode=bulk.MODE_STATEMENTS if statements else bulk.MODE_RECEIPTS,
+             processes=processes,
+             dry_run=dry_run,
+             checkpoint_path=checkpoint,
+             app_factory=create_app,
+             progress=progress)
+
+
+@manager.option('file', help="CSV file with donations.")
+@manager.option('-n', '--dry-run', dest='dry_run', action='store_true', default=False,
+                help="Only check that the file is valid.")
+def import_donations(file, dry_run):
+    """Import donations (checks, bitcoin) from a CSV file and send receipts."""
+    from metabrainz.donations import importer
+    try:
+        with open(file, 'rb') as f:
+            rows, imported, elapsed = importer.import_donations(f, dry_run)
+    except importer.InvalidFileError as e:
+        print("Nothing has been imported. %s:" % e)
+        for error in e.errors:
+            print(error)
+        return
+    if dry_run:
+        print("%s rows are valid." % rows)
+    else:
+        print("%s donations imported, %s duplicates skipped." % (imported, rows - imported))
+    print("%.2f s, %.0f rows/s." % (elapsed, rows / elapsed if elapsed else 0))
+
+
+@manager.command
+def rebuild_donation_rollups():
+    """Recalculate monthly and yearly totals of donations from scratch."""
+    from metabrainz.model.donation_rollup import DonationRollup
+    from metabrainz.model import donation
+    DonationRollup.rebuild()
+    donation.invalidate_cache()
+    print("Donation rollups have been rebuilt.")
+
+
+@manager.command
+def benchmark_cache(iterations=10000):
+    """Compare performance of cache backends."""
+    from metabrainz.cache import benchmark
+    results = benchmark.run(int(iterations), current_app.config.get('MEMCACHED_SERVERS'))
+    for backend, operation, ops_per_second in results:
+        print("%-10s %-25s %12.0f ops/s" % (backend, operation, ops_per_second))
+
+
+@manager.command
+def benchmark_receipts(iterations=200):
+    """Measure how fast donation receipts are generated."""
+    from metabrainz.donations import benchmark
+    for implementation, receipts_per_second in benchmark.run(int(iterations)):
+        print("%-15s %8.1f receipts/s" % (implementation, receipts_per_second))
+
+
 if __name__ == '__main__':
     manager.run()
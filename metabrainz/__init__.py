@@ -19,15 +19,27 @@ def create_app():
         app.config['DEBUG_TB_TEMPLATE_EDITOR_ENABLED'] = True
 
     # Database
-    from metabrainz.model import db
+    from metabrainz.model import db, query_counter
     db.init_app(app)
-
-    # Memcached
-    if 'MEMCACHED_SERVERS' in app.config:
-        from metabrainz import cache
-        cache.init(app.config['MEMCACHED_SERVERS'],
-                   app.config['MEMCACHED_NAMESPACE'],
-                   debug=1 if app.debug else 0)
+    query_counter.init_app(app)
+
+    # Cache
+    from metabrainz import cache
+    cache.init(app.config.get('MEMCACHED_SERVERS'),
+               app.config['MEMCACHED_NAMESPACE'],
+               debug=1 if app.debug else 0,
+               backend=app.config['CACHE_BACKEND'],
+               local_max_items=app.config['CACHE_LOCAL_MAX_ITEMS'],
+               l1_size=app.config['CACHE_L1_SIZE'],
+               l1_time=app.config['CACHE_L1_TIME'],
+               l1_namespace_times=app.config['CACHE_L1_NAMESPACE_TIMES'],
+               l1_version_check_interval=app.config['CACHE_L1_VERSION_CHECK_INTERVAL'],
+               stats_flush_interval=app.config['CACHE_STATS_FLUSH_INTERVAL'],
+               serializer=app.config['CACHE_SERIALIZER'],
+               compression=app.config['CACHE_COMPRESSION'],
+               compress_threshold=app.config['CACHE_COMPRESS_THRESHOLD'],
+               max_item_size=app.config['CACHE_MAX_ITEM_SIZE'],
+               dead_retry=app.config['MEMCACHED_DEAD_RETRY'])
 
     # MusicBrainz OAuth
     from metabrainz.users import login_manager, musicbrainz_login
@@ -1,12 +1,17 @@
 from flask import Response
 from flask_admin import expose
+from werkzeug.exceptions import BadRequest, NotFound
 from metabrainz.admin import AdminIndexView, AdminBaseView
 from metabrainz.model.user import User, STATE_PENDING, STATE_ACTIVE, STATE_REJECTED, STATE_WAITING, STATE_LIMITED
-from metabrainz.model.token import Token
+from metabrainz.model.token import Token, MATCH_EXACT, MATCH_PREFIX, MATCH_CONTAINS
 from metabrainz.model.token_log import TokenLog
 from metabrainz.model.access_log import AccessLog
-from metabrainz import flash
+from metabrainz.model.donation_rollup import DonationRollup, PERIOD_MONTH
+from metabrainz import flash, cache, http_client, mail
+from metabrainz.cache import stats as cache_stats
 from flask import request, redirect, url_for
+from datetime import datetime
+import calendar
 import time
 import json
 
@@ -27,13 +32,20 @@ class UsersView(AdminBaseView):
     @expose('/')
     def index(self):
         value = request.args.get('value')
-        results = User.search(value) if value else []
+        results, next_after = [], None
+        if value:
+            try:
+                results, next_after = User.search(value, after=request.args.get('after'))
+            except ValueError as e:
+                raise BadRequest(str(e))
         return self.render('admin/users/index.html',
-                           value=value, results=results)
+                           value=value, results=results, next_after=next_after)
 
     @expose('/<int:user_id>')
     def details(self, user_id):
         user = User.get(id=user_id)
+        if user is None:
+            raise NotFound("Can't find user with a specified ID.")
         active_tokens = Token.get_all(owner_id=user.id, is_active=True)
         return self.render(
             'admin/users/details.html',
@@ -114,6 +126,7 @@ class CommercialUsersView(AdminBaseView):
         limit = 20
         offset = (page - 1) * limit
         users, count = User.get_all_commercial(limit=limit, offset=offset)
+        User.load_tokens(users)
         return self.render('admin/commercial-users/index.html', users=users,
                            page=page, limit=limit, count=count)
 
@@ -123,9 +136,14 @@ class TokensView(AdminBaseView):
     @expose('/')
     def index(self):
         value = request.args.get('value')
-        results = Token.search_by_value(value) if value else []
+        match = request.args.get('match', MATCH_CONTAINS)
+        if match not in (MATCH_EXACT, MATCH_PREFIX, MATCH_CONTAINS):
+            raise BadRequest("Unknown match type: %s" % match)
+        results, next_after = [], None
+        if value:
+            results, next_after = Token.search_by_value(value, match, after=request.args.get('after'))
         return self.render('admin/tokens/search.html',
-                           value=value, results=results)
+                           value=value, match=match, results=results, next_after=next_after)
 
 
 class StatsView(AdminBaseView):
@@ -163,3 +181,78 @@ class StatsView(AdminBaseView):
                 i[1]
             ] for i in stats]}]),
             content_type='application/json; charset=utf-8')
+
+    @expose('/donations')
+    def donations(self):
+        return self.render('admin/stats/donations.html')
+
+    @expose('/donations/data')
+    def donations_data(self):
+        """Monthly totals of donations for each payment method."""
+        series = {}
+        for total in DonationRollup.get_totals(PERIOD_MONTH):
+            timestamp = calendar.timegm(datetime.strptime(total['start'], '%Y-%m-%d').utctimetuple()) * 1000
+            series.setdefault('total', []).append([timestamp, total['amount']])
+            for payment_method, method_total in total['payment_methods'].iteritems():
+                series.setdefault(payment_method, []).append([timestamp, method_total['amount']])
+        return Response(json.dumps([{'name': name, 'data': data} for name, data in sorted(series.iteritems())]),
+                        content_type='application/json; charset=utf-8')
+
+    @expose('/cache')
+    def cache(self):
+        counters, worker_count = cache.collect_stats()
+        return self.render(
+            'admin/stats/cache.html',
+            rows=_cache_stats_rows(counters),
+            worker_count=worker_count,
+        )
+
+    @expose('/cache/metrics')
+    def cache_metrics(self):
+        counters, worker_count = cache.collect_stats()
+        return Response(json.dumps({
+                'workers': worker_count,
+                'latency_buckets': cache_stats.LATENCY_BUCKETS,
+                'namespaces': counters,
+            }),
+            content_type='application/json; charset=utf-8')
+
+    @expose('/http/metrics')
+    def http_metrics(self):
+        """Statistics of requests to payment providers (from this worker only)."""
+        return Response(json.dumps({
+                'latency_buckets': http_client.LATENCY_BUCKETS,
+                'providers': http_client.get_stats(),
+            }),
+            content_type='application/json; charset=utf-8')
+
+    @expose('/mail/metrics')
+    def mail_metrics(self):
+        """Statistics of sent messages (from this worker only)."""
+        return Response(json.dumps(dict(mail.get_stats(), latency_buckets=mail.LATENCY_BUCKETS)),
+                        content_type='application/json; charset=utf-8')
+
+
+def _cache_stats_rows(counters):
+    """Converts cache counters into a list of rows for the statistics page."""
+    namespaces_with_hits = set(namespace for namespace, operations in counters.iteritems()
+                               if operations.get('get', {}).get('hits'))
+    rows = []
+    for namespace, operations in sorted(counters.iteritems()):
+        for operation, values in sorted(operations.iteritems()):
+            items = values['hits'] if operation == 'get' else values['sets']  # items that have been transferred
+            row = dict(values)
+            row.update(
+                namespace=namespace,
+                operation=operation,
+                hit_ratio=float(values['hits']) / (values['hits'] + values['misses'])
+                          if values['hits'] + values['misses'] else None,
+                avg_latency=values['time'] * 1000 / values['calls'] if values['calls'] else 0,
+                avg_size=values.get('bytes', 0) / items if items else None,
+                p50=cache_stats.percentile(values['latency'], 50),
+                p95=cache_stats.percentile(values['latency'], 95),
+                p99=cache_stats.percentile(values['latency'], 99),
+                never_hit=operation == 'set' and namespace not in namespaces_with_hits,
+            )
+            rows.append(row)
+    return rows
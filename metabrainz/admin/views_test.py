@@ -1,4 +1,8 @@
 from metabrainz.testing import FlaskTestCase
+from metabrainz.model.user import User, STATE_ACTIVE
+from metabrainz.model.token import Token
+from metabrainz.model.tier import Tier
+from metabrainz.model import db
 from flask import url_for
 
 
@@ -12,3 +16,57 @@ class AdminViewsTestCase(FlaskTestCase):
 
     def test_tokensview_index(self):
         self.assertStatus(self.client.get(url_for('tokensview.index')), 302)
+
+    def test_statsview_cache(self):
+        self.assertStatus(self.client.get(url_for('statsview.cache')), 302)
+
+    def test_statsview_donations(self):
+        self.assertStatus(self.client.get(url_for('statsview.donations')), 302)
+
+    def test_statsview_http_metrics(self):
+        self.assertStatus(self.client.get(url_for('statsview.http_metrics')), 302)
+
+    def test_statsview_mail_metrics(self):
+        self.assertStatus(self.client.get(url_for('statsview.mail_metrics')), 302)
+
+
+class AdminViewsSignedInTestCase(FlaskTestCase):
+
+    def setUp(self):
+        super(AdminViewsSignedInTestCase, self).setUp()
+        self.app.config['ADMINS'] = [u'Admin']
+        admin = self._add_user(u'Admin', is_commercial=False)
+        db.session.commit()
+        self.temporary_login(admin.id)
+
+    def _add_user(self, name, is_commercial=True, tier=None):
+        user = User(is_commercial=is_commercial, musicbrainz_id=name, contact_name=name,
+                    contact_email=u'test@example.org', state=STATE_ACTIVE, org_name=name, tier=tier)
+        db.session.add(user)
+        return user
+
+    def test_commercial_users(self):
+        tier = Tier(name=u'Unicorn', price=1000, available=True)
+        users = [self._add_user(u'User %s' % i, tier=tier) for i in range(3)]
+        db.session.flush()
+        db.session.add(Token(value=u'token', owner_id=users[0].id))
+        db.session.commit()
+        db.session.expunge_all()  # users need to be loaded by the view
+
+        response = self.client.get(url_for('commercialusersview.index'))
+        self.assert200(response)
+        self.assertIn('Unicorn', response.data)
+        # Signed in user, count of users, list of users with tiers, and their tokens
+        self.assertQueryCount(response, 4)
+
+    def test_user_details(self):
+        user = self._add_user(u'User', tier=Tier(name=u'Unicorn', price=1000, available=True))
+        db.session.commit()
+        user_id = user.id
+        db.session.expunge_all()  # users need to be loaded by the view
+
+        response = self.client.get(url_for('usersview.details', user_id=user_id))
+        self.assert200(response)
+        # Signed in user, user with tier, and tokens
+        self.assertQueryCount(response, 3)
+        self.assert404(self.client.get(url_for('usersview.details', user_id=user_id + 1)))
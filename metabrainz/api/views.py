@@ -3,6 +3,7 @@ from flask.helpers import safe_join
 from werkzeug.wrappers import Response
 from werkzeug.urls import iri_to_uri
 from metabrainz.api.decorators import token_required, tracked
+from metabrainz.page_cache import cached_page
 import logging
 import re
 import os
@@ -25,6 +26,7 @@ MAX_PACKET_AGE_CRITICAL = 60 * 60 * 6  # 4 hours
 
 
 @api_bp.route('/')
+@cached_page()
 def info():
     """This view provides information about using the API."""
     return render_template('api/info.html')
@@ -0,0 +1,631 @@
+"""
+This module serves as an interface to memcached instance.
+
+Module needs to be initialized before use. See init() function.
+
+It basically serves as a wrapper for python-memcached package with additional
+functionality and tweaks specific to our needs. Storage itself is delegated
+to one of the backends (see metabrainz.cache.backends module): memcached,
+in-process storage that can be used in tests and single-process deployments,
+or a null backend that doesn't store anything. Null backend is used until
+the module is initialized.
+
+There's also support for namespacing, which simplifies management of different
+versions of data saved in the cache. You can invalidate whole namespace using
+invalidate_namespace() function. See its description for more info.
+
+Optionally there can be an in-process cache (L1) in front of the backend. It
+keeps a limited number of recently used items from namespaces in memory of
+each worker, which saves a network round trip for data that rarely changes.
+Items in L1 are invalidated across workers using namespace versions: each
+worker periodically checks version of the namespace in the backend and drops
+its local items if the version has changed.
+
+Values are serialized into byte strings before they are stored in the
+backend. Large values are compressed, and values that don't fit into a single
+memcached item are split into chunks. See metabrainz.cache.serialization
+module for details.
+
+Every worker records hits, misses, sets, errors, serialized size, and latency of operations
+in each namespace. These counters are periodically stored in the backend and
+can be aggregated across workers with collect_stats() function. See
+metabrainz.cache.stats module for details.
+
+Results of functions can be cached using memoized() decorator. It protects
+against cache stampedes: only one worker at a time recomputes an expired
+result, while others wait for it or keep using the previous value.
+
+Package python-memcached is available at https://pypi.python.org/pypi/python-memcached/.
+More information about memcached can be found at http://memcached.org/.
+"""
+from metabrainz.cache.backends import Backend, NullBackend, create_backend, MAX_RELATIVE_TIME, DEFAULT_DEAD_RETRY
+from metabrainz.cache.lru import LRUCache
+from metabrainz.cache import stats, serialization
+from functools import wraps
+import hashlib
+import random
+import logging
+import math
+import time as _time
+
+# Workers that can't get a lock to compute missing memoized result check if it
+# appeared in the cache this many times before computing it themselves.
+MEMOIZED_WAIT_ATTEMPTS = 20
+MEMOIZED_WAIT_INTERVAL = 0.05  # seconds
+
+# Prefix of keys that store namespace versions. These keys are always kept on
+# the same memcached server (see metabrainz.cache.ring module).
+VERSION_KEY_PREFIX = "version:"
+
+TIER_L1 = "l1"
+TIER_L2 = "l2"  # backend
+
+_backend = NullBackend()
+_glob_namespace = "MeB:"
+
+_serializer = serialization.Serializer()
+_max_item_size = serialization.DEFAULT_MAX_ITEM_SIZE
+
+_l1 = None
+_l1_time = 0
+_l1_namespace_times = {}
+_l1_version_check_interval = 0
+_l1_versions = {}  # namespace -> (version, time of the last check)
+
+_stats_flush_interval = stats.DEFAULT_FLUSH_INTERVAL
+
+_stats = {
+    TIER_L1: {"hits": 0, "misses": 0},
+    TIER_L2: {"hits": 0, "misses": 0},
+}
+
+
+def init(servers=None, namespace="MeB", debug=0, backend=None,
+         local_max_items=None, l1_size=0, l1_time=60, l1_namespace_times=None,
+         l1_version_check_interval=5, stats_flush_interval=stats.DEFAULT_FLUSH_INTERVAL,
+         serializer=serialization.SERIALIZER_PICKLE, compression=serialization.COMPRESSION_ZLIB,
+         compress_threshold=serialization.DEFAULT_COMPRESS_THRESHOLD,
+         max_item_size=serialization.DEFAULT_MAX_ITEM_SIZE, dead_retry=DEFAULT_DEAD_RETRY):
+    """Initializes the cache. Needs to be called before use.
+
+    Args:
+        servers: List of memcached server addresses (strings in "host:port"
+            format) or tuples with an address and weight of the server.
+        namespace: Optional global namespace that will be prepended to all keys.
+        debug: Whether to display error messages when a server can't be contacted.
+        backend: Name of the backend ("memcached", "local", or "null") or a
+            Backend instance. By default memcached is used if server addresses
+            are specified, null backend otherwise.
+        local_max_items: Max number of items stored by the local backend.
+        l1_size: Max number of items in the in-process cache. L1 is disabled
+            if set to 0.
+        l1_time: Default number of seconds items are kept in L1.
+        l1_namespace_times: Optional dictionary with number of seconds items
+            from specific namespaces are kept in L1. Namespaces with value 0
+            are not stored in L1.
+        l1_version_check_interval: Number of seconds after which L1 checks
+            namespace version in the backend.
+        stats_flush_interval: Number of seconds between saving statistics of
+            the worker in the backend. Set to 0 to disable saving.
+        serializer: Serializer of plain data: "pickle", "json", or "msgpack".
+            Other values are always pickled.
+        compression: Compression of large values: "zlib", "zstd", or None.
+        compress_threshold: Min size of serialized value (in bytes) that is
+            compressed.
+        max_item_size: Max size of an item in the backend (in bytes). Larger
+            values are split into chunks.
+        dead_retry: Number of seconds during which memcached server that
+            couldn't be contacted is skipped. Its keys are moved to the next
+            server on the ring, except for namespace versions.
+    """
+    global _backend, _glob_namespace, _serializer, _max_item_size
+    global _l1, _l1_time, _l1_namespace_times, _l1_version_check_interval
+    global _stats_flush_interval
+    # TODO(roman): Check length of the namespace (should fit with hash appended):
+    _glob_namespace = namespace + ":"
+    if isinstance(backend, Backend):
+        _backend = backend
+    else:
+        options = {"local_max_items": local_max_items} if local_max_items else {}
+        _backend = create_backend(backend, servers, debug=debug, dead_retry=dead_retry,
+                                  pinned_prefixes=[_glob_namespace + VERSION_KEY_PREFIX], **options)
+
+    _l1 = LRUCache(l1_size) if l1_size else None
+    _l1_time = l1_time
+    _l1_namespace_times = l1_namespace_times or {}
+    _l1_version_check_interval = l1_version_check_interval
+    _l1_versions.clear()
+    _stats_flush_interval = stats_flush_interval
+    _serializer = serialization.Serializer(serializer, compression, compress_threshold)
+    _max_item_size = max_item_size
+
+
+def set(key, val, time=0, namespace=None):
+    """Set a key to a given value.
+
+    Args:
+        key: Key of the item.
+        value: Item's value.
+        time: The time after which this value should expire, either as a delta
+            number of seconds, or an absolute unix time-since-the-epoch value.
+            If set to 0, value will be stored "forever".
+        namespace: Optional namespace in which key needs to be defined.
+
+    Returns:
+        True if stored successfully, False otherwise.
+    """
+    not_stored_count = set_multi({key: val}, time, namespace)
+    return len(not_stored_count) == 0
+
+
+def get(key, namespace=None):
+    """Retrieve an item.
+
+    Args:
+        key: Key of the item that needs to be retrieved.
+        namespace: Optional namespace in which key was defined.
+
+    Returns:
+        Stored value or None if it's not found.
+    """
+    result = get_multi([key], namespace)
+    return result[key] if key in result else None
+
+
+def add(key, val, time=0, namespace=None):
+    """Set a key to a given value only if it doesn't exist yet.
+
+    Because memcached does this check atomically, it can be used as a lock
+    between workers.
+
+    Args:
+        key: Key of the item.
+        value: Item's value.
+        time: The time after which this value should expire (see `set`).
+        namespace: Optional namespace in which key needs to be defined.
+
+    Returns:
+        True if stored successfully, False if key already exists.
+    """
+    start = _time.time()
+    key = _prep_key(key, namespace)
+    items, _, size = _encode({key: val})
+    try:
+        data = items.pop(key)
+        if items:  # chunks need to be in place before the value itself
+            _backend.set_multi(items, time)
+        added = _backend.add(key, data, time)
+    except Exception:
+        _record(namespace, "add", start, errors=1)
+        raise
+    _record(namespace, "add", start, sets=1 if added else 0, size=size if added else 0)
+    return added
+
+
+def incr(key, delta=1, time=0, namespace=None):
+    """Increment a counter, creating it if it doesn't exist.
+
+    Counters are stored as plain integers, so they can only be accessed with
+    this function.
+
+    Args:
+        key: Key of the counter.
+        delta: Amount by which counter is incremented.
+        time: The time after which a new counter should expire (see `set`).
+            Expiration time doesn't change when counter is incremented.
+        namespace: Optional namespace in which key needs to be defined.
+
+    Returns:
+        New value of the counter.
+    """
+    start = _time.time()
+    key = _prep_key(key, namespace)
+    try:
+        value = _backend.incr(key, delta)
+        if value is None and not _backend.add(key, delta, time):
+            value = _backend.incr(key, delta)  # created by another worker in the meantime
+    except Exception:
+        _record(namespace, "incr", start, errors=1)
+        raise
+    _record(namespace, "incr", start, sets=1)
+    return delta if value is None else value
+
+
+def delete(key, namespace=None):
+    """Delete an item.
+
+    Args:
+        key: Key of the item that needs to be deleted.
+        namespace: Optional namespace in which key was defined.
+
+    Returns:
+          True if deleted successfully, False otherwise.
+    """
+    return delete_multi([key], namespace)
+
+
+def set_multi(mapping, time=0, namespace=None):
+    """Set multiple keys doing just one query.
+
+    Args:
+        mapping: A dict of key/value pairs to set.
+
+    Returns:
+        List of keys which failed to be stored (memcache out of memory, etc.).
+    """
+    start = _time.time()
+    prepared = _prep_dict(mapping, namespace)
+    items, chunk_owners, size = _encode(dict((key, mapping[orig_key]) for key, orig_key in prepared.iteritems()))
+    try:
+        not_stored = _backend.set_multi(items, time)
+    except Exception:
+        _record(namespace, "set", start, errors=len(prepared))
+        raise
+    # Value is not stored if any of its chunks is not stored
+    not_stored = frozenset(chunk_owners.get(key, key) for key in not_stored)
+    _record(namespace, "set", start, sets=len(prepared) - len(not_stored), errors=len(not_stored), size=size)
+    l1_time = _get_l1_time(namespace, time)
+    if l1_time:
+        for key, orig_key in prepared.iteritems():
+            if key not in not_stored:
+                _l1.set(key, mapping[orig_key], l1_time, namespace)
+    return [prepared[key] for key in not_stored]
+
+
+def get_multi(keys, namespace=None):
+    """Retrieve multiple keys doing just one query.
+
+    Args:
+        keys: Array of keys that need to be retrieved.
+
+    Returns:
+        A dictionary of key/value pairs that were available.
+    """
+    start = _time.time()
+    prepared = dict(zip(_prep_list(keys, namespace), keys))
+    result = {}
+
+    l1_time = _get_l1_time(namespace)
+    if l1_time:
+        for key in prepared.keys():
+            found, value = _l1.get(key)
+            if found:
+                result[prepared.pop(key)] = value
+        _stats[TIER_L1]["hits"] += len(result)
+        _stats[TIER_L1]["misses"] += len(prepared)
+
+    if prepared:
+        try:
+            fetched, size = _decode(_backend.get_multi(prepared.keys()))
+        except Exception:
+            _record(namespace, "get", start, hits=len(result), errors=len(prepared))
+            raise
+        _stats[TIER_L2]["hits"] += len(fetched)
+        _stats[TIER_L2]["misses"] += len(prepared) - len(fetched)
+        for key, value in fetched.iteritems():
+            result[prepared[key]] = value
+            if l1_time:
+                _l1.set(key, value, l1_time, namespace)
+
+    else:
+        size = 0
+
+    _record(namespace, "get", start, hits=len(result), misses=len(keys) - len(result), size=size)
+    return result
+
+
+def delete_multi(keys, namespace=None):
+    start = _time.time()
+    keys = _prep_list(keys, namespace)
+    if _l1 is not None:
+        for key in keys:
+            _l1.delete(key)
+    try:
+        deleted = _backend.delete_multi(keys)
+    except Exception:
+        _record(namespace, "delete", start, errors=len(keys))
+        raise
+    _record(namespace, "delete", start)
+    return deleted
+
+
+def gen_key(key, *attributes):
+    """Helper function that generates a key with attached attributes.
+
+    Args:
+        key: Original key.
+        attributes: Attributes that will be appended a key.
+
+    Returns:
+        Key that can be used with cache.
+    """
+    if not isinstance(key, basestring):
+        key = str(key)
+    key = key.encode('ascii', errors='xmlcharrefreplace')
+
+    for attr in attributes:
+        if not isinstance(attr, basestring):
+            attr = str(attr)
+        key += '_' + attr.encode('ascii', errors='xmlcharrefreplace')
+
+    key = key.replace(' ', '_')  # spaces are not allowed
+
+    return key
+
+
+def invalidate_namespace(namespace):
+    """Invalidates specified namespace.
+
+    Invalidation is done by incrementing version of the namespace. Items from
+    this namespace are also removed from L1 of the current worker. Other
+    workers will notice that version has changed during their next version
+    check.
+
+    Args:
+        namespace: Namespace that needs to be invalidated.
+    """
+    start = _time.time()
+    version_key = _glob_namespace + VERSION_KEY_PREFIX + namespace
+    version = _backend.incr(version_key)
+    if version is None:  # namespace isn't initialized
+        version = _new_namespace_version()
+        _backend.set(version_key, version)  # initializing the namespace
+    if _l1 is not None:
+        _l1.delete_namespace(namespace)
+        _l1_versions[namespace] = (version, _time.time())
+    _record(namespace, "invalidate", start)
+
+
+def memoized(namespace, time=0, stale_time=0, lock_time=30, beta=1.0):
+    """Decorator that caches results of a function.
+
+    Keys are generated from the name of the function and its arguments, so
+    all arguments need to have stable string representations. Results are
+    stored in a specified namespace; invalidate it to remove all of them.
+    Single result can be removed with `invalidate` function that is attached
+    to the decorated function and accepts the same arguments.
+
+    Only one worker recomputes an expired result. It holds a lock (added with
+    memcached `add` command) while doing that. To avoid all workers waiting
+    for the same result to expire, it might be recomputed a bit earlier. The
+    probability of that grows as expiration time gets closer and depends on
+    how long it took to compute the result last time (see "Optimal
+    Probabilistic Cache Stampede Prevention" by Vattani et al.).
+
+    Args:
+        namespace: Namespace in which results are stored.
+        time: Number of seconds after which result is recomputed. If set to
+            0, result is stored "forever".
+        stale_time: Number of seconds after expiration during which the
+            previous result is still returned by other workers while one of
+            them recomputes it (stale-while-revalidate).
+        lock_time: Max number of seconds recomputation is expected to take.
+            If it takes longer, another worker can start recomputing.
+        beta: Factor of probabilistic early expiration. Values greater than
+            1 favor earlier recomputation, 0 disables it.
+    """
+    def decorator(f):
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            key = _memoized_key(f, args, kwargs)
+            lock_key = gen_key(key, "lock")
+
+            cached = get(key, namespace)
+            if cached is not None:
+                value, expires, delta = cached
+                if not time or _time.time() - delta * beta * math.log(1 - random.random()) < expires:
+                    return value
+                locked = add(lock_key, True, lock_time, namespace)
+                if not locked:
+                    # Another worker is already recomputing the result
+                    return value
+            else:
+                locked = add(lock_key, True, lock_time, namespace)
+                if not locked:
+                    for _ in range(MEMOIZED_WAIT_ATTEMPTS):
+                        _time.sleep(MEMOIZED_WAIT_INTERVAL)
+                        cached = get(key, namespace)
+                        if cached is not None:
+                            return cached[0]
+                    # Giving up on waiting, computing the result without the lock
+
+            try:
+                start = _time.time()
+                value = f(*args, **kwargs)
+                end = _time.time()
+                set(key, [value, end + time, end - start],
+                    time + stale_time if time else 0, namespace)
+            finally:
+                if locked:
+                    delete(lock_key, namespace)
+            return value
+
+        def invalidate(*args, **kwargs):
+            """Removes cached result of a function call with specified arguments."""
+            delete(_memoized_key(f, args, kwargs), namespace)
+
+        decorated.invalidate = invalidate
+        return decorated
+
+    return decorator
+
+
+def flush_all():
+    _backend.flush_all()
+    if _l1 is not None:
+        _l1.clear()
+        _l1_versions.clear()
+
+
+def collect_stats():
+    """Collects statistics of cache operations from all workers.
+
+    Returns:
+        Tuple with two items. First is a dictionary with counters for each
+        namespace and operation (see metabrainz.cache.stats module). Second
+        is a number of workers that reported their statistics.
+    """
+    stats.flush(_backend, _glob_namespace, _stats_flush_interval or stats.DEFAULT_FLUSH_INTERVAL)
+    return stats.collect(_backend, _glob_namespace)
+
+
+def get_stats():
+    """Returns numbers of hits and misses for each cache tier.
+
+    Counters are kept separately in each process.
+
+    Returns:
+        Dictionary with tier names as keys. Values are dictionaries with
+        "hits" and "misses" counters.
+    """
+    return dict((tier, dict(counters)) for tier, counters in _stats.iteritems())
+
+
+def _record(namespace, operation, start, **counts):
+    """Records statistics of an operation that started at a specified time."""
+    stats.record(namespace, operation, _time.time() - start, **counts)
+    if stats.should_flush(_stats_flush_interval):
+        try:
+            stats.flush(_backend, _glob_namespace, _stats_flush_interval)
+        except Exception as e:
+            logging.warning("Failed to save cache statistics: %s", e)
+
+
+def _encode(mapping):
+    """Serializes values and splits large ones into chunks.
+
+    Args:
+        mapping: Dictionary with prepared keys and values.
+
+    Returns:
+        Tuple with three items: dictionary of items that need to be stored in
+        the backend, dictionary that maps keys of chunks to keys of their
+        values, and total size of serialized values in bytes.
+    """
+    items, chunk_owners, size = {}, {}, 0
+    for key, value in mapping.iteritems():
+        data = _serializer.dumps(value)
+        size += len(data)
+        if len(data) > _max_item_size:
+            data, chunks = serialization.split(key, data, _max_item_size)
+            items.update(chunks)
+            chunk_owners.update((chunk_key, key) for chunk_key in chunks)
+        items[key] = data
+    return items, chunk_owners, size
+
+
+def _decode(fetched):
+    """Retrieves chunks of chunked items and deserializes values.
+
+    Items that are missing some of their chunks or can't be deserialized
+    are treated as missing.
+
+    Args:
+        fetched: Dictionary with items retrieved from the backend.
+
+    Returns:
+        Tuple with two items: dictionary with deserialized values and total
+        size of serialized values in bytes.
+    """
+    chunked = dict((key, serialization.chunk_keys(key, data))
+                   for key, data in fetched.iteritems() if serialization.is_chunked(data))
+    if chunked:
+        chunks = _backend.get_multi([chunk_key for keys in chunked.itervalues() for chunk_key in keys])
+        for key, keys in chunked.iteritems():
+            fetched[key] = serialization.join(keys, chunks)
+
+    result, size = {}, 0
+    for key, data in fetched.iteritems():
+        if data is None:
+            continue
+        try:
+            result[key] = _serializer.loads(data)
+        except Exception as e:
+            logging.warning("Failed to deserialize cached value of %s: %s", key, e)
+            continue
+        if isinstance(data, str):
+            size += len(data)
+    return result, size
+
+
+def _memoized_key(f, args, kwargs):
+    """Generates a key for the result of a function call."""
+    attributes = list(args) + ["%s=%s" % item for item in sorted(kwargs.items())]
+    return gen_key("%s.%s" % (f.__module__, f.__name__), *attributes)
+
+
+def _get_l1_time(namespace, time=0):
+    """Returns number of seconds items from a specified namespace can be kept
+    in L1 or 0 if they shouldn't be stored there.
+
+    Only items from namespaces are stored in L1, because that's the only way
+    to invalidate them in all workers.
+
+    Args:
+        namespace: Namespace of the item.
+        time: Expiration time of the item in memcached (see `set` function).
+    """
+    if _l1 is None or not namespace:
+        return 0
+    l1_time = _l1_namespace_times.get(namespace, _l1_time)
+    if time:
+        if time > MAX_RELATIVE_TIME:
+            time = max(time - _time.time(), 0)
+        l1_time = min(l1_time, time)
+    return l1_time
+
+
+def _get_namespace_version(namespace):
+    if _l1 is not None and namespace in _l1_versions:
+        version, checked = _l1_versions[namespace]
+        if _time.time() - checked < _l1_version_check_interval:
+            return version
+    version_key = _glob_namespace + VERSION_KEY_PREFIX + namespace
+    version = _backend.get(version_key)
+    if version is None:  # namespace isn't initialized
+        version = _new_namespace_version()
+        if not _backend.add(version_key, version):  # initializing the namespace
+            # Another worker has initialized it first
+            version = _backend.get(version_key) or version
+    if _l1 is not None:
+        if namespace in _l1_versions and _l1_versions[namespace][0] != version:
+            # Namespace has been invalidated by another worker
+            _l1.delete_namespace(namespace)
+        _l1_versions[namespace] = (version, _time.time())
+    return version
+
+
+def _new_namespace_version():
+    """Returns initial version of a namespace.
+
+    Version is based on current time, so that a namespace whose version has
+    been lost (evicted or stored on a server that went down) doesn't get a
+    version that might still have items stored with it.
+    """
+    return int(_time.time() * 1000)
+
+
+def _prep_key(key, namespace=None, version=None):
+    """Prepares a key for use with memcached."""
+    if namespace:
+        if version is None:
+            version = _get_namespace_version(namespace)
+        key = "%s:%s:%s" % (namespace, version, key)
+    return _glob_namespace + hashlib.sha1(key).hexdigest()
+
+
+def _prep_list(l, namespace=None):
+    """Wrapper for _prep_key function that works with lists."""
+    version = _get_namespace_version(namespace) if namespace else None
+    return [_prep_key(k, namespace, version) for k in l]
+
+
+def _prep_dict(dictionary, namespace=None):
+    """Wrapper for _prep_key function that works with dictionaries.
+
+    Returns:
+        Dictionary with prepared keys as keys and original keys as values.
+    """
+    version = _get_namespace_version(namespace) if namespace else None
+    return dict((_prep_key(key, namespace, version), key) for key in dictionary)
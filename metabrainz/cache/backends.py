@@ -0,0 +1,238 @@
+"""
+Storage backends for the cache module.
+
+Backends operate on keys that are already prepared by the cache module (they
+include global namespace and have a valid format). Each backend implements
+the same subset of memcached commands:
+
+- MemcachedBackend uses python-memcached client and is what should be used
+  in production. Keys are distributed between servers using consistent
+  hashing (see metabrainz.cache.ring module).
+- LocalBackend keeps everything in memory of the current process. It can be
+  used in tests and single-process deployments that don't have memcached.
+- NullBackend doesn't store anything.
+"""
+from metabrainz.cache.lru import LRUCache
+from metabrainz.cache.ring import KetamaClient
+import cPickle as pickle
+import threading
+import time as _time
+
+BACKEND_MEMCACHED = "memcached"
+BACKEND_LOCAL = "local"
+BACKEND_NULL = "null"
+
+# Memcached treats expiration times larger than this as absolute unix timestamps.
+MAX_RELATIVE_TIME = 60 * 60 * 24 * 30
+
+DEFAULT_LOCAL_MAX_ITEMS = 10000
+
+# Number of seconds after which memcached server that couldn't be contacted
+# is tried again.
+DEFAULT_DEAD_RETRY = 30
+
+
+class Backend(object):
+    """Interface of cache backends.
+
+    Expiration time arguments have the same meaning as in memcached: either a
+    delta number of seconds, or an absolute unix time-since-the-epoch value.
+    If set to 0, value is stored "forever".
+    """
+
+    def get(self, key):
+        return self.get_multi([key]).get(key)
+
+    def set(self, key, value, time=0):
+        return len(self.set_multi({key: value}, time)) == 0
+
+    def get_multi(self, keys):
+        """Returns a dictionary with key/value pairs that were found."""
+        raise NotImplementedError
+
+    def set_multi(self, mapping, time=0):
+        """Returns a list of keys that failed to be stored."""
+        raise NotImplementedError
+
+    def add(self, key, value, time=0):
+        """Sets a key to a given value only if it doesn't exist yet.
+
+        Returns:
+            True if value was stored, False otherwise.
+        """
+        raise NotImplementedError
+
+    def incr(self, key, delta=1):
+        """Increments integer value of an existing item.
+
+        Returns:
+            New value or None if item doesn't exist.
+        """
+        raise NotImplementedError
+
+    def delete_multi(self, keys):
+        """Returns True if all keys have been deleted, False otherwise."""
+        raise NotImplementedError
+
+    def flush_all(self):
+        raise NotImplementedError
+
+
+class MemcachedBackend(Backend):
+
+    def __init__(self, servers, debug=0, dead_retry=DEFAULT_DEAD_RETRY, pinned_prefixes=()):
+        self.client = KetamaClient(servers, pinned_prefixes=pinned_prefixes, debug=debug, dead_retry=dead_retry)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, time=0):
+        return bool(self.client.set(key, value, time))
+
+    def get_multi(self, keys):
+        return self.client.get_multi(keys)
+
+    def set_multi(self, mapping, time=0):
+        return self.client.set_multi(mapping, time)
+
+    def add(self, key, value, time=0):
+        return bool(self.client.add(key, value, time))
+
+    def incr(self, key, delta=1):
+        return self.client.incr(key, delta)
+
+    def delete_multi(self, keys):
+        return self.client.delete_multi(keys) == 1
+
+    def flush_all(self):
+        self.client.flush_all()
+
+
+class LocalBackend(Backend):
+    """Thread-safe in-process backend that mimics memcached.
+
+    Values are pickled when stored, so modifying a retrieved object doesn't
+    change the cached one, just like with memcached. Least recently used
+    items are evicted when `max_items` limit is reached.
+    """
+
+    def __init__(self, max_items=DEFAULT_LOCAL_MAX_ITEMS):
+        self._items = LRUCache(max_items)  # key -> (expiration time, pickled value)
+        self._lock = threading.RLock()
+
+    def get_multi(self, keys):
+        result = {}
+        with self._lock:
+            for key in keys:
+                found, item = self._get_item(key)
+                if found:
+                    result[key] = pickle.loads(item[1])
+        return result
+
+    def set_multi(self, mapping, time=0):
+        expires = _expiration_time(time)
+        with self._lock:
+            for key, value in mapping.iteritems():
+                self._items.set(key, (expires, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+        return []
+
+    def add(self, key, value, time=0):
+        with self._lock:
+            if self._get_item(key)[0]:
+                return False
+            return self.set(key, value, time)
+
+    def incr(self, key, delta=1):
+        with self._lock:
+            found, item = self._get_item(key)
+            if not found:
+                return None
+            value = pickle.loads(item[1])
+            if not isinstance(value, (int, long)):
+                raise ValueError("Cannot increment non-numeric value of %s" % key)
+            value += delta
+            self._items.set(key, (item[0], pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+            return value
+
+    def delete_multi(self, keys):
+        with self._lock:
+            for key in keys:
+                self._items.delete(key)
+        return True
+
+    def flush_all(self):
+        self._items.clear()
+
+    def _get_item(self, key):
+        found, item = self._items.get(key)
+        if found and item[0] is not None and item[0] <= _time.time():
+            self._items.delete(key)
+            return False, None
+        return found, item
+
+
+class NullBackend(Backend):
+    """Backend that doesn't store anything.
+
+    Adding an item always succeeds, so that locks built on top of the `add`
+    command never block.
+    """
+
+    def get_multi(self, keys):
+        return {}
+
+    def set_multi(self, mapping, time=0):
+        return list(mapping)
+
+    def add(self, key, value, time=0):
+        return True
+
+    def incr(self, key, delta=1):
+        return None
+
+    def delete_multi(self, keys):
+        return False
+
+    def flush_all(self):
+        pass
+
+
+def create_backend(name=None, servers=None, debug=0, local_max_items=DEFAULT_LOCAL_MAX_ITEMS,
+                   dead_retry=DEFAULT_DEAD_RETRY, pinned_prefixes=()):
+    """Creates cache backend.
+
+    Args:
+        name: Name of the backend: "memcached", "local", or "null". If it's
+            not specified, memcached is used when server addresses are
+            provided, null backend otherwise.
+        servers: List of memcached server addresses (strings in "host:port"
+            format) or tuples with an address and weight of the server.
+        debug: Whether memcached client should display error messages when
+            a server can't be contacted.
+        local_max_items: Max number of items stored by the local backend.
+        dead_retry: Number of seconds during which memcached server that
+            couldn't be contacted is skipped.
+        pinned_prefixes: Prefixes of keys that are never moved to another
+            memcached server when their server is unavailable.
+    """
+    if name is None:
+        name = BACKEND_MEMCACHED if servers else BACKEND_NULL
+    if name == BACKEND_MEMCACHED:
+        return MemcachedBackend(servers, debug=debug, dead_retry=dead_retry, pinned_prefixes=pinned_prefixes)
+    elif name == BACKEND_LOCAL:
+        return LocalBackend(local_max_items)
+    elif name == BACKEND_NULL:
+        return NullBackend()
+    else:
+        raise ValueError("Unknown cache backend: %s" % name)
+
+
+def _expiration_time(time):
+    """Converts expiration time in memcached format into an absolute
+    timestamp or None if item doesn't expire.
+    """
+    if not time:
+        return None
+    if time > MAX_RELATIVE_TIME:
+        return time
+    return _time.time() + time
@@ -0,0 +1,67 @@
+from unittest import TestCase
+from metabrainz.cache.backends import LocalBackend, NullBackend, create_backend, BACKEND_LOCAL
+import time
+
+
+class LocalBackendTestCase(TestCase):
+
+    def setUp(self):
+        self.backend = LocalBackend()
+
+    def test_get_set(self):
+        self.assertIsNone(self.backend.get("key"))
+        self.assertTrue(self.backend.set("key", {"a": 1}))
+        self.assertEqual(self.backend.get("key"), {"a": 1})
+
+    def test_values_are_copied(self):
+        value = [1, 2]
+        self.backend.set("key", value)
+        value.append(3)
+        self.backend.get("key").append(4)
+        self.assertEqual(self.backend.get("key"), [1, 2])
+
+    def test_multi(self):
+        self.assertEqual(self.backend.set_multi({"a": 1, "b": 2}), [])
+        self.assertEqual(self.backend.get_multi(["a", "b", "c"]), {"a": 1, "b": 2})
+        self.assertTrue(self.backend.delete_multi(["a", "c"]))
+        self.assertEqual(self.backend.get_multi(["a", "b"]), {"b": 2})
+
+    def test_expiration(self):
+        self.backend.set("relative", 1, time=1)
+        self.backend.set("absolute", 1, time=int(time.time()) - 1)
+        self.assertEqual(self.backend.get_multi(["relative", "absolute"]), {"relative": 1})
+
+    def test_add(self):
+        self.assertTrue(self.backend.add("key", 1))
+        self.assertFalse(self.backend.add("key", 2))
+        self.assertEqual(self.backend.get("key"), 1)
+
+    def test_incr(self):
+        self.assertIsNone(self.backend.incr("key"))
+        self.backend.set("key", 1)
+        self.assertEqual(self.backend.incr("key"), 2)
+        self.assertEqual(self.backend.incr("key", 5), 7)
+        self.assertEqual(self.backend.get("key"), 7)
+
+    def test_flush_all(self):
+        self.backend.set("key", 1)
+        self.backend.flush_all()
+        self.assertIsNone(self.backend.get("key"))
+
+
+class NullBackendTestCase(TestCase):
+
+    def test_nothing_is_stored(self):
+        backend = NullBackend()
+        self.assertFalse(backend.set("key", 1))
+        self.assertIsNone(backend.get("key"))
+        self.assertIsNone(backend.incr("key"))
+        self.assertTrue(backend.add("key", 1))
+
+
+class CreateBackendTestCase(TestCase):
+
+    def test_create_backend(self):
+        self.assertIsInstance(create_backend(), NullBackend)
+        self.assertIsInstance(create_backend(BACKEND_LOCAL), LocalBackend)
+        self.assertRaises(ValueError, create_backend, "missing")
@@ -0,0 +1,67 @@
+"""
+Benchmark of cache backends.
+
+It measures how many operations per second the cache module can do with each
+backend, using key patterns that the website uses: single values in the
+global namespace (access log alerts), multiple values from a namespace, and
+memoized function results.
+"""
+from metabrainz import cache
+from metabrainz.cache.backends import BACKEND_MEMCACHED, BACKEND_LOCAL, BACKEND_NULL
+import time
+
+NAMESPACE = "benchmark"
+MULTI_KEYS_COUNT = 20
+
+
+def run(iterations=10000, servers=None):
+    """Runs benchmark for all available backends.
+
+    Memcached backend is only benchmarked if server addresses are specified.
+
+    Returns:
+        List of (backend name, operation name, operations per second) tuples.
+    """
+    backends = [BACKEND_NULL, BACKEND_LOCAL]
+    if servers:
+        backends.append(BACKEND_MEMCACHED)
+
+    results = []
+    for backend in backends:
+        cache.init(servers, namespace="MeB-benchmark", backend=backend)
+        cache.invalidate_namespace(NAMESPACE)
+        for name, operation in _get_operations():
+            results.append((backend, name, _measure(operation, iterations)))
+        cache.invalidate_namespace(NAMESPACE)
+    return results
+
+
+def _get_operations():
+    value = {"id": 1, "name": u"Tester", "amount": 42.5}
+    keys = ["key_%s" % i for i in range(MULTI_KEYS_COUNT)]
+
+    @cache.memoized(namespace=NAMESPACE, time=60)
+    def memoized_function(arg):
+        return value
+
+    def get_multi():
+        cache.get_multi(keys, namespace=NAMESPACE)
+
+    def set_multi():
+        cache.set_multi(dict((key, value) for key in keys), time=60, namespace=NAMESPACE)
+
+    return [
+        ("set", lambda: cache.set("alert_sent_token", True, 3600)),
+        ("get (hit)", lambda: cache.get("alert_sent_token")),
+        ("get (miss)", lambda: cache.get("missing_key")),
+        ("set_multi (%s keys)" % MULTI_KEYS_COUNT, set_multi),
+        ("get_multi (%s keys)" % MULTI_KEYS_COUNT, get_multi),
+        ("memoized", lambda: memoized_function(1)),
+    ]
+
+
+def _measure(operation, iterations):
+    start = time.time()
+    for _ in xrange(iterations):
+        operation()
+    return iterations / (time.time() - start)
@@ -0,0 +1,98 @@
+from unittest import TestCase
+from metabrainz import cache
+import datetime
+
+
+class CacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.init(backend="local")
+
+    def tearDown(self):
+        cache.init()
+
+    def test_get_set(self):
+        self.assertIsNone(cache.get("key"))
+        self.assertTrue(cache.set("key", "value"))
+        self.assertEqual(cache.get("key"), "value")
+        self.assertTrue(cache.delete("key"))
+        self.assertIsNone(cache.get("key"))
+
+    def test_multi(self):
+        cache.set_multi({"a": 1, "b": 2}, namespace="test")
+        self.assertEqual(cache.get_multi(["a", "b", "c"], namespace="test"), {"a": 1, "b": 2})
+
+    def test_namespace(self):
+        cache.set("key", "value", namespace="test")
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.get("key", namespace="test"), "value")
+        cache.invalidate_namespace("test")
+        self.assertIsNone(cache.get("key", namespace="test"))
+
+    def test_add(self):
+        self.assertTrue(cache.add("lock", True, namespace="test"))
+        self.assertFalse(cache.add("lock", True, namespace="test"))
+
+    def test_incr(self):
+        self.assertEqual(cache.incr("counter", namespace="test"), 1)
+        self.assertEqual(cache.incr("counter", 2, namespace="test"), 3)
+        cache.invalidate_namespace("test")
+        self.assertEqual(cache.incr("counter", namespace="test"), 1)
+
+    def test_chunks(self):
+        cache.init(backend="local", compression=None, max_item_size=100)
+        value = "a" * 1000
+        self.assertTrue(cache.set("key", value, namespace="test"))
+        self.assertEqual(cache.get("key", namespace="test"), value)
+        self.assertTrue(cache.add("lock", value, namespace="test"))
+        self.assertEqual(cache.get("lock", namespace="test"), value)
+
+    def test_serializer(self):
+        cache.init(backend="local", serializer="json")
+        cache.set("key", {u"a": [1, 2]}, namespace="test")
+        cache.set("date", datetime.date(2015, 6, 1), namespace="test")
+        self.assertEqual(cache.get_multi(["key", "date"], namespace="test"),
+                         {"key": {u"a": [1, 2]}, "date": datetime.date(2015, 6, 1)})
+
+    def test_l1(self):
+        cache.init(backend="local", l1_size=10, l1_version_check_interval=60)
+        cache.set("key", "value", namespace="test")
+        self.assertEqual(cache.get("key", namespace="test"), "value")
+        self.assertEqual(cache.get_stats()[cache.TIER_L1]["hits"], 1)
+
+        # Simulating invalidation by another worker
+        cache._backend.incr(cache._glob_namespace + cache.VERSION_KEY_PREFIX + "test")
+        self.assertEqual(cache.get("key", namespace="test"), "value")  # version isn't checked yet
+        cache._l1_versions.clear()
+        self.assertIsNone(cache.get("key", namespace="test"))
+
+    def test_memoized(self):
+        calls = []
+
+        @cache.memoized(namespace="test", time=60)
+        def func(a, b=1):
+            calls.append(a)
+            return a + b
+
+        self.assertEqual(func(1), 2)
+        self.assertEqual(func(1), 2)
+        self.assertEqual(func(1, b=2), 3)
+        self.assertEqual(calls, [1, 1])
+
+        func.invalidate(1)
+        self.assertEqual(func(1), 2)
+        self.assertEqual(calls, [1, 1, 1])
+
+    def test_memoized_stale(self):
+        calls = []
+
+        @cache.memoized(namespace="test", time=-1, stale_time=60, beta=0)
+        def func():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(func(), 1)
+        # Another worker is recomputing expired result
+        cache.add(cache.gen_key(cache._memoized_key(func, (), {}), "lock"), True, namespace="test")
+        self.assertEqual(func(), 1)
+        self.assertEqual(len(calls), 1)
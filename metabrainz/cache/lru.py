@@ -0,0 +1,71 @@
+from collections import OrderedDict
+import threading
+import time as _time
+
+
+class LRUCache(object):
+    """Size-bound in-process cache that evicts least recently used items first.
+
+    Each item has its own expiration time and can belong to a namespace, so
+    that all items from a namespace can be removed at once.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()  # key -> (expiration time, namespace, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """Retrieve an item.
+
+        Returns:
+            Tuple with two items. First is True if item was found, False
+            otherwise. Second is the stored value.
+        """
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return False, None
+            if item[0] <= _time.time():  # expired
+                return False, None
+            self._items[key] = item  # moving to the most recently used position
+            return True, item[2]
+
+    def set(self, key, value, time=None, namespace=None):
+        """Set a key to a given value.
+
+        Args:
+            key: Key of the item.
+            value: Item's value.
+            time: Number of seconds after which the item expires. If set to
+                None, item is kept until it's evicted.
+            namespace: Optional namespace of the item.
+        """
+        expires = _time.time() + time if time is not None else float("inf")
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (expires, namespace, value)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        """Delete an item.
+
+        Returns:
+            True if item existed, False otherwise.
+        """
+        with self._lock:
+            return self._items.pop(key, None) is not None
+
+    def delete_namespace(self, namespace):
+        """Remove all items from a specified namespace."""
+        with self._lock:
+            for key in [k for k, item in self._items.iteritems() if item[1] == namespace]:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
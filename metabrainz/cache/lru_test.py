@@ -0,0 +1,39 @@
+from unittest import TestCase
+from metabrainz.cache.lru import LRUCache
+import time
+
+
+class LRUCacheTestCase(TestCase):
+
+    def test_get_set(self):
+        lru = LRUCache(10)
+        self.assertEqual(lru.get("key"), (False, None))
+        lru.set("key", "value", 60)
+        self.assertEqual(lru.get("key"), (True, "value"))
+        lru.delete("key")
+        self.assertEqual(lru.get("key"), (False, None))
+
+    def test_expiration(self):
+        lru = LRUCache(10)
+        lru.set("key", "value", 0.01)
+        time.sleep(0.02)
+        self.assertEqual(lru.get("key"), (False, None))
+
+    def test_eviction(self):
+        lru = LRUCache(2)
+        lru.set("first", 1, 60)
+        lru.set("second", 2, 60)
+        lru.get("first")  # "second" is least recently used now
+        lru.set("third", 3, 60)
+        self.assertEqual(len(lru), 2)
+        self.assertEqual(lru.get("second"), (False, None))
+        self.assertEqual(lru.get("first"), (True, 1))
+        self.assertEqual(lru.get("third"), (True, 3))
+
+    def test_delete_namespace(self):
+        lru = LRUCache(10)
+        lru.set("first", 1, 60, namespace="test")
+        lru.set("second", 2, 60, namespace="other")
+        lru.delete_namespace("test")
+        self.assertEqual(lru.get("first"), (False, None))
+        self.assertEqual(lru.get("second"), (True, 2))
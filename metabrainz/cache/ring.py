@@ -0,0 +1,130 @@
+"""
+Consistent hashing of keys onto memcached servers.
+
+python-memcached picks a server by taking hash of the key modulo number of
+servers, so adding or removing a server remaps almost every key. This module
+implements ketama-compatible consistent hashing instead: each server is
+represented by a number of points (virtual nodes) on a ring of 32-bit hashes,
+and a key belongs to the first point that follows its hash. Changing the set
+of servers only remaps keys that belonged to points of that server.
+"""
+import bisect
+import hashlib
+import memcache
+
+# Number of points on the ring for a server with weight 1. Ketama uses 160.
+DEFAULT_REPLICAS = 160
+
+
+class HashRing(object):
+    """Ring of nodes with consistent hashing.
+
+    Args:
+        nodes: List of (name, node) tuples or (name, node, weight) tuples.
+            Names identify positions of nodes on the ring, so they need to
+            be the same in all processes (for example, "host:port").
+        replicas: Number of points for a node with weight 1.
+    """
+
+    def __init__(self, nodes, replicas=DEFAULT_REPLICAS):
+        self._nodes = []
+        points = []
+        for item in nodes:
+            name, node = item[0], item[1]
+            weight = item[2] if len(item) > 2 else 1
+            self._nodes.append(node)
+            # Each MD5 digest gives four points on the ring, like in ketama
+            for i in xrange(int(replicas * weight) // 4):
+                digest = hashlib.md5("%s-%s" % (name, i)).digest()
+                for j in xrange(4):
+                    points.append((_unpack(digest, j * 4), len(self._nodes) - 1))
+        points.sort()
+        self._hashes = [point for point, _ in points]
+        self._indexes = [index for _, index in points]
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def get_node(self, key):
+        """Returns node that a key belongs to or None if the ring is empty."""
+        for node in self.iterate_nodes(key):
+            return node
+        return None
+
+    def iterate_nodes(self, key):
+        """Generates distinct nodes in the order they follow the key on the
+        ring. The first one is the node that the key belongs to, the rest can
+        be used if it's not available.
+        """
+        if not self._hashes:
+            return
+        position = bisect.bisect(self._hashes, hash_key(key))
+        seen = set()
+        for i in xrange(len(self._hashes)):
+            index = self._indexes[(position + i) % len(self._hashes)]
+            if index not in seen:
+                seen.add(index)
+                yield self._nodes[index]
+                if len(seen) == len(self._nodes):
+                    return
+
+
+class KetamaClient(memcache.Client):
+    """Memcached client that distributes keys using consistent hashing.
+
+    Server that can't be contacted is marked as dead for `dead_retry` seconds
+    (see memcache.Client). During that time its keys are moved to the next
+    server on the ring, after that connection is retried.
+
+    Keys that start with one of `pinned_prefixes` are never moved to another
+    server. If their server is dead, operations on them fail. This is used for
+    namespace versions: a version that is stored on two different servers
+    could make a namespace appear to have been invalidated and then return
+    to its previous state.
+
+    When a dead server comes back, it is flushed (`flush_on_reconnect`), so
+    that items modified while it was unavailable aren't returned from it.
+    """
+
+    def __init__(self, servers, pinned_prefixes=(), replicas=DEFAULT_REPLICAS, **kwargs):
+        self.pinned_prefixes = tuple(pinned_prefixes)
+        self.replicas = replicas
+        kwargs.setdefault("flush_on_reconnect", 1)
+        super(KetamaClient, self).__init__(servers, **kwargs)
+
+    def _init_buckets(self):
+        super(KetamaClient, self)._init_buckets()
+        self.ring = HashRing([(_server_name(server), server, server.weight) for server in self.servers],
+                             self.replicas)
+
+    def _get_server(self, key):
+        if isinstance(key, tuple):
+            _, key = key
+        if not len(self.ring):
+            return None, None
+        if key.startswith(self.pinned_prefixes):
+            server = self.ring.get_node(key)
+            return (server, key) if server.connect() else (None, None)
+        for i, server in enumerate(self.ring.iterate_nodes(key)):
+            if i >= memcache.Client._SERVER_RETRIES:
+                break
+            if server.connect():
+                return server, key
+        return None, None
+
+
+def hash_key(key):
+    """Returns position of a key on the ring."""
+    return _unpack(hashlib.md5(key).digest(), 0)
+
+
+def _unpack(digest, offset):
+    """Converts four bytes of digest into an integer (little-endian, as in ketama)."""
+    return (ord(digest[offset + 3]) << 24 | ord(digest[offset + 2]) << 16 |
+            ord(digest[offset + 1]) << 8 | ord(digest[offset]))
+
+
+def _server_name(server):
+    if isinstance(server.address, tuple):
+        return "%s:%s" % server.address
+    return server.address
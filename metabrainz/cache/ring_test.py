@@ -0,0 +1,64 @@
+from unittest import TestCase
+from metabrainz.cache.ring import HashRing, KetamaClient
+
+
+class HashRingTestCase(TestCase):
+
+    def setUp(self):
+        self.keys = ["key%s" % i for i in xrange(10000)]
+
+    def _distribution(self, ring):
+        result = {}
+        for key in self.keys:
+            node = ring.get_node(key)
+            result[node] = result.get(node, 0) + 1
+        return result
+
+    def test_empty(self):
+        self.assertIsNone(HashRing([]).get_node("key"))
+
+    def test_distribution(self):
+        ring = HashRing([("a", "a"), ("b", "b"), ("c", "c")])
+        for count in self._distribution(ring).values():
+            self.assertGreater(count, len(self.keys) / 5)
+
+    def test_weights(self):
+        distribution = self._distribution(HashRing([("a", "a", 1), ("b", "b", 3)]))
+        self.assertGreater(distribution["b"], distribution["a"] * 2)
+
+    def test_adding_node(self):
+        before = HashRing([("a", "a"), ("b", "b"), ("c", "c")])
+        after = HashRing([("a", "a"), ("b", "b"), ("c", "c"), ("d", "d")])
+        moved = [key for key in self.keys if before.get_node(key) != after.get_node(key)]
+        # Only keys that now belong to the new node are moved
+        self.assertTrue(all(after.get_node(key) == "d" for key in moved))
+        self.assertLess(len(moved), len(self.keys) / 2)
+
+    def test_iterate_nodes(self):
+        ring = HashRing([("a", "a"), ("b", "b"), ("c", "c")])
+        nodes = list(ring.iterate_nodes("key"))
+        self.assertEqual(sorted(nodes), ["a", "b", "c"])
+        self.assertEqual(nodes[0], ring.get_node("key"))
+
+
+class KetamaClientTestCase(TestCase):
+
+    def setUp(self):
+        self.client = KetamaClient(["127.0.0.1:11211", "127.0.0.1:11212"], pinned_prefixes=["pinned:"])
+        self.alive = set(self.client.servers)
+        for server in self.client.servers:
+            server.connect = (lambda s: lambda: s in self.alive)(server)
+
+    def test_failover(self):
+        server, _ = self.client._get_server("key")
+        self.assertIsNotNone(server)
+        self.alive.remove(server)
+        other, _ = self.client._get_server("key")
+        self.assertIsNotNone(other)
+        self.assertNotEqual(server, other)
+
+    def test_pinned(self):
+        server, key = self.client._get_server("pinned:key")
+        self.assertEqual(key, "pinned:key")
+        self.alive.remove(server)
+        self.assertEqual(self.client._get_server("pinned:key"), (None, None))
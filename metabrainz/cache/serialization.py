@@ -0,0 +1,212 @@
+"""
+Serialization of cached values.
+
+Values are converted into byte strings before they are stored in the backend,
+so that their size can be controlled. Each string starts with a two byte
+header: the first byte identifies serializer, the second one - compression.
+Values are always decoded according to their header, so changing
+configuration doesn't break items that are already stored.
+
+Plain data (None, booleans, numbers, strings, lists, and dictionaries) can be
+stored in JSON or msgpack format, which are more compact and faster to load
+than pickle. Everything else (tuples, dates, model objects, etc.) falls back
+to pickle. Serialized values larger than a threshold are compressed with zlib
+or zstd (if `zstandard` package is installed).
+
+Values that are still larger than the max size of an item in memcached are
+split into chunks (see `split` and `join` functions).
+"""
+import cPickle as pickle
+import json
+import uuid
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SERIALIZER_PICKLE = "pickle"
+SERIALIZER_JSON = "json"
+SERIALIZER_MSGPACK = "msgpack"
+
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_ZSTD = "zstd"
+
+DEFAULT_COMPRESS_THRESHOLD = 1024  # bytes
+
+# Memcached doesn't store items larger than 1 MB by default. Some space is
+# left for the key and item header.
+DEFAULT_MAX_ITEM_SIZE = 1000 * 1000  # bytes
+
+_FORMAT_PICKLE = "p"
+_FORMAT_JSON = "j"
+_FORMAT_MSGPACK = "m"
+_FORMAT_CHUNKED = "c"
+
+_COMPRESSION_NONE = "-"
+_COMPRESSION_ZLIB = "z"
+_COMPRESSION_ZSTD = "s"
+
+_HEADER_LENGTH = 2
+
+_SCALAR_TYPES = frozenset([type(None), bool, int, long, float, unicode])
+
+
+class Serializer(object):
+    """Encodes values into byte strings and decodes them back.
+
+    Args:
+        serializer: Format of plain data: "pickle", "json", or "msgpack".
+        compression: "zlib", "zstd", or None to disable compression.
+        compress_threshold: Min size of serialized value (in bytes) that is
+            compressed.
+    """
+
+    def __init__(self, serializer=SERIALIZER_PICKLE, compression=COMPRESSION_ZLIB,
+                 compress_threshold=DEFAULT_COMPRESS_THRESHOLD):
+        if serializer == SERIALIZER_MSGPACK and msgpack is None:
+            raise ValueError("msgpack serializer requires msgpack package")
+        if serializer not in (SERIALIZER_PICKLE, SERIALIZER_JSON, SERIALIZER_MSGPACK):
+            raise ValueError("Unknown serializer: %s" % serializer)
+        if compression == COMPRESSION_ZSTD and zstandard is None:
+            raise ValueError("zstd compression requires zstandard package")
+        if compression not in (COMPRESSION_ZLIB, COMPRESSION_ZSTD, None):
+            raise ValueError("Unknown compression: %s" % compression)
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        if compression == COMPRESSION_ZSTD:
+            self._zstd_compressor = zstandard.ZstdCompressor()
+            self._zstd_decompressor = zstandard.ZstdDecompressor()
+
+    def dumps(self, value):
+        """Encodes a value into a byte string."""
+        data = None
+        if self.serializer == SERIALIZER_JSON and _is_plain(value, allow_bytes=False):
+            format, data = _FORMAT_JSON, json.dumps(value, separators=(",", ":"))
+        elif self.serializer == SERIALIZER_MSGPACK and _is_plain(value, allow_bytes=True):
+            try:
+                format, data = _FORMAT_MSGPACK, msgpack.packb(value, use_bin_type=True)
+            except (OverflowError, TypeError, ValueError):
+                pass  # numbers that don't fit into 64 bits, etc.
+        if data is None:
+            format, data = _FORMAT_PICKLE, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+        compression = _COMPRESSION_NONE
+        if self.compression and len(data) >= self.compress_threshold:
+            if self.compression == COMPRESSION_ZSTD:
+                compressed = self._zstd_compressor.compress(data)
+            else:
+                compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                compression = _COMPRESSION_ZSTD if self.compression == COMPRESSION_ZSTD else _COMPRESSION_ZLIB
+                data = compressed
+
+        return format + compression + data
+
+    def loads(self, data):
+        """Decodes a value that has been encoded by `dumps`.
+
+        Values that are not strings are returned as is, so that items stored
+        before serialization was introduced are still readable.
+
+        Raises:
+            ValueError if value can't be decoded.
+        """
+        if not isinstance(data, str):
+            return data
+        format, compression, data = data[0:1], data[1:_HEADER_LENGTH], data[_HEADER_LENGTH:]
+
+        if compression == _COMPRESSION_ZLIB:
+            data = zlib.decompress(data)
+        elif compression == _COMPRESSION_ZSTD:
+            if zstandard is None:
+                raise ValueError("zstandard package is required to decompress value")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        elif compression != _COMPRESSION_NONE:
+            raise ValueError("Unknown compression of cached value")
+
+        if format == _FORMAT_PICKLE:
+            return pickle.loads(data)
+        elif format == _FORMAT_JSON:
+            return json.loads(data)
+        elif format == _FORMAT_MSGPACK:
+            if msgpack is None:
+                raise ValueError("msgpack package is required to decode value")
+            return msgpack.unpackb(data, raw=False)
+        raise ValueError("Unknown format of cached value")
+
+
+def split(key, data, max_size=DEFAULT_MAX_ITEM_SIZE):
+    """Splits serialized value into chunks that can be stored separately.
+
+    Chunk keys contain a random token, so chunks of different versions of
+    the same value never get mixed up.
+
+    Args:
+        key: Key of the value.
+        data: Serialized value.
+        max_size: Max size of an item in bytes.
+
+    Returns:
+        Tuple with two items. First is a byte string that needs to be stored
+        under the original key instead of the value. Second is a dictionary
+        with chunks (chunk key -> chunk).
+    """
+    token = uuid.uuid4().hex[:8]
+    count = (len(data) + max_size - 1) // max_size
+    main = _FORMAT_CHUNKED + _COMPRESSION_NONE + "%s:%s" % (token, count)
+    return main, dict((_chunk_key(key, token, i), data[i * max_size:(i + 1) * max_size])
+                      for i in xrange(count))
+
+
+def is_chunked(data):
+    return isinstance(data, str) and data[0:1] == _FORMAT_CHUNKED
+
+
+def chunk_keys(key, data):
+    """Returns keys of chunks referenced by an item created by `split`."""
+    token, count = data[_HEADER_LENGTH:].split(":")
+    return [_chunk_key(key, token, i) for i in xrange(int(count))]
+
+
+def join(keys, chunks):
+    """Joins chunks back into serialized value.
+
+    Args:
+        keys: Keys of chunks returned by `chunk_keys`.
+        chunks: Dictionary with chunks that have been retrieved.
+
+    Returns:
+        Serialized value or None if some chunks are missing.
+    """
+    if not all(key in chunks for key in keys):
+        return None
+    return "".join(chunks[key] for key in keys)
+
+
+def _chunk_key(key, token, index):
+    return "%s:%s:%s" % (key, token, index)
+
+
+def _is_plain(value, allow_bytes):
+    """Checks if value consists only of types that JSON and msgpack can
+    represent without losing information.
+    """
+    value_type = type(value)
+    if value_type in _SCALAR_TYPES:
+        return True
+    if value_type is str:
+        return allow_bytes
+    if value_type is list:
+        return all(_is_plain(item, allow_bytes) for item in value)
+    if value_type is dict:
+        return all((type(k) is unicode or (allow_bytes and type(k) is str)) and _is_plain(v, allow_bytes)
+                   for k, v in value.iteritems())
+    return False
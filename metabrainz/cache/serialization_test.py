@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+from metabrainz.cache import serialization
+import datetime
+
+
+class SerializerTestCase(TestCase):
+
+    def test_pickle(self):
+        serializer = serialization.Serializer(serialization.SERIALIZER_PICKLE)
+        value = {"date": datetime.date(2015, 6, 1), "tuple": (1, 2)}
+        data = serializer.dumps(value)
+        self.assertIsInstance(data, str)
+        self.assertEqual(serializer.loads(data), value)
+
+    def test_json(self):
+        serializer = serialization.Serializer(serialization.SERIALIZER_JSON)
+        value = {u"name": u"MetaBrainz Ω", u"count": 2, u"items": [1.5, None, True]}
+        data = serializer.dumps(value)
+        self.assertTrue(data.startswith("j"))
+        self.assertEqual(serializer.loads(data), value)
+
+        # Values that JSON can't represent are pickled
+        for value in [(1, 2), {"key": "value"}, datetime.date(2015, 6, 1)]:
+            data = serializer.dumps(value)
+            self.assertTrue(data.startswith("p"))
+            self.assertEqual(serializer.loads(data), value)
+            self.assertEqual(type(serializer.loads(data)), type(value))
+
+    def test_compression(self):
+        serializer = serialization.Serializer(serialization.SERIALIZER_PICKLE, compress_threshold=100)
+        self.assertEqual(serializer.dumps("a" * 10)[1], "-")
+        data = serializer.dumps("a" * 1000)
+        self.assertEqual(data[1], "z")
+        self.assertLess(len(data), 1000)
+        self.assertEqual(serializer.loads(data), "a" * 1000)
+
+        # Values stored with a different configuration can still be decoded
+        self.assertEqual(serialization.Serializer(compression=None).loads(data), "a" * 1000)
+
+    def test_legacy_values(self):
+        self.assertEqual(serialization.Serializer().loads(42), 42)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, serialization.Serializer, "yaml")
+        self.assertRaises(ValueError, serialization.Serializer, compression="lzma")
+
+    def test_split_join(self):
+        data = "abcdefghij"
+        main, chunks = serialization.split("key", data, max_size=4)
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(serialization.is_chunked(main))
+        self.assertFalse(serialization.is_chunked(data))
+        keys = serialization.chunk_keys("key", main)
+        self.assertEqual(sorted(keys), sorted(chunks.keys()))
+        self.assertEqual(serialization.join(keys, chunks), data)
+        del chunks[keys[1]]
+        self.assertIsNone(serialization.join(keys, chunks))
@@ -0,0 +1,179 @@
+"""
+Instrumentation of the cache module.
+
+Each worker counts hits, misses, sets, errors, and serialized bytes, and
+keeps a histogram of latencies for every combination of namespace and
+operation. Counters are plain dictionaries that are updated without locks,
+so that recording is cheap (an occasional lost increment from concurrent
+threads is acceptable).
+
+Periodically every worker stores a snapshot of its counters in the cache
+backend. Snapshots from all workers that are still alive are summed up by
+`collect` function.
+"""
+import socket
+import os
+import time as _time
+
+# Upper bounds of latency histogram buckets in milliseconds. The last bucket
+# counts everything else.
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+GLOBAL_NAMESPACE = ""  # used for keys that are not in any namespace
+
+DEFAULT_FLUSH_INTERVAL = 60  # seconds
+
+_WORKERS_KEY = "stats:workers"
+_WORKER_KEY = "stats:worker:%s"
+
+_counters = {}  # namespace -> operation -> counters
+_last_flush = _time.time()
+
+
+def record(namespace, operation, latency, hits=0, misses=0, sets=0, errors=0, size=0):
+    """Records a cache operation.
+
+    Args:
+        namespace: Namespace of the operation or None.
+        operation: Name of the operation (get, set, delete, etc.)
+        latency: Duration of the operation in seconds.
+        hits: Number of keys that have been found.
+        misses: Number of keys that haven't been found.
+        sets: Number of keys that have been stored.
+        errors: Number of keys that failed to be processed.
+        size: Size of serialized values that have been read or written (in
+            bytes).
+    """
+    operations = _counters.get(namespace or GLOBAL_NAMESPACE)
+    if operations is None:
+        operations = _counters.setdefault(namespace or GLOBAL_NAMESPACE, {})
+    counters = operations.get(operation)
+    if counters is None:
+        counters = operations.setdefault(operation, _empty_counters())
+    counters["calls"] += 1
+    counters["hits"] += hits
+    counters["misses"] += misses
+    counters["sets"] += sets
+    counters["errors"] += errors
+    counters["bytes"] += size
+    counters["time"] += latency
+    counters["latency"][_bucket_index(latency * 1000)] += 1
+
+
+def get_local():
+    """Returns counters of the current worker."""
+    return _copy(_counters)
+
+
+def reset():
+    """Resets counters of the current worker."""
+    _counters.clear()
+
+
+def should_flush(interval):
+    return interval and _time.time() - _last_flush >= interval
+
+
+def flush(backend, key_prefix, interval=DEFAULT_FLUSH_INTERVAL):
+    """Stores snapshot of counters of the current worker in the backend.
+
+    Args:
+        backend: Cache backend.
+        key_prefix: Prefix that is added to keys used for storing snapshots.
+        interval: Number of seconds between flushes. Snapshots of workers
+            that haven't been updated for a few intervals are ignored.
+    """
+    global _last_flush
+    _last_flush = _time.time()
+    expiration = interval * 3
+    worker_id = _get_worker_id()
+    backend.set(key_prefix + _WORKER_KEY % worker_id, get_local(), expiration)
+
+    workers = backend.get(key_prefix + _WORKERS_KEY) or {}
+    workers = dict((worker, seen) for worker, seen in workers.iteritems()
+                   if seen > _last_flush - expiration)
+    workers[worker_id] = _last_flush
+    backend.set(key_prefix + _WORKERS_KEY, workers)
+
+
+def collect(backend, key_prefix):
+    """Sums up counters of all active workers.
+
+    Returns:
+        Tuple with two items. First is a dictionary with counters (namespace
+        -> operation -> counters). Second is a number of workers that
+        reported their counters.
+    """
+    workers = backend.get(key_prefix + _WORKERS_KEY) or {}
+    snapshots = backend.get_multi([key_prefix + _WORKER_KEY % w for w in workers])
+    total = {}
+    for snapshot in snapshots.itervalues():
+        for namespace, operations in snapshot.iteritems():
+            for operation, counters in operations.iteritems():
+                _add(total.setdefault(namespace, {}).setdefault(operation, _empty_counters()), counters)
+    return total, len(snapshots)
+
+
+def percentile(latency, q):
+    """Estimates percentile of latency from a histogram.
+
+    Args:
+        latency: List with counts of operations in each latency bucket.
+        q: Percentile (between 0 and 100).
+
+    Returns:
+        Upper bound of the bucket (in milliseconds) that contains requested
+        percentile, None if it's in the last bucket or there's no data.
+    """
+    total = sum(latency)
+    if not total:
+        return None
+    threshold = total * q / 100.0
+    count = 0
+    for i, bucket_count in enumerate(latency):
+        count += bucket_count
+        if count >= threshold:
+            return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else None
+
+
+def _get_worker_id():
+    # Process ID is not cached because workers can be forked after import.
+    return "%s:%s" % (socket.gethostname(), os.getpid())
+
+
+def _empty_counters():
+    return {
+        "calls": 0,
+        "hits": 0,
+        "misses": 0,
+        "sets": 0,
+        "errors": 0,
+        "bytes": 0,
+        "time": 0.0,
+        "latency": [0] * (len(LATENCY_BUCKETS) + 1),
+    }
+
+
+def _bucket_index(latency_ms):
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if latency_ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS)
+
+
+def _add(total, counters):
+    for name, value in counters.iteritems():
+        if name == "latency":
+            total[name] = [a + b for a, b in zip(total[name], value)]
+        else:
+            total[name] = total.get(name, 0) + value
+
+
+def _copy(counters):
+    result = {}
+    for namespace, operations in counters.items():
+        for operation, values in operations.items():
+            copy = dict(values)
+            copy["latency"] = list(values["latency"])
+            result.setdefault(namespace, {})[operation] = copy
+    return result
@@ -0,0 +1,40 @@
+from unittest import TestCase
+from metabrainz.cache import stats
+from metabrainz.cache.backends import LocalBackend
+
+
+class StatsTestCase(TestCase):
+
+    def setUp(self):
+        stats.reset()
+
+    def tearDown(self):
+        stats.reset()
+
+    def test_record(self):
+        stats.record("test", "get", 0.0001, hits=1, misses=2)
+        stats.record("test", "get", 2.0, hits=1)
+        stats.record(None, "set", 0.003, sets=1)
+        counters = stats.get_local()
+        self.assertEqual(counters["test"]["get"]["calls"], 2)
+        self.assertEqual(counters["test"]["get"]["hits"], 2)
+        self.assertEqual(counters["test"]["get"]["misses"], 2)
+        self.assertEqual(counters["test"]["get"]["latency"][0], 1)
+        self.assertEqual(counters["test"]["get"]["latency"][-1], 1)
+        self.assertEqual(counters[stats.GLOBAL_NAMESPACE]["set"]["sets"], 1)
+
+    def test_flush_collect(self):
+        backend = LocalBackend()
+        stats.record("test", "get", 0.001, hits=1)
+        stats.flush(backend, "prefix:")
+        counters, workers = stats.collect(backend, "prefix:")
+        self.assertEqual(workers, 1)
+        self.assertEqual(counters["test"]["get"]["hits"], 1)
+
+    def test_percentile(self):
+        self.assertIsNone(stats.percentile([0] * (len(stats.LATENCY_BUCKETS) + 1), 50))
+        latency = [0] * (len(stats.LATENCY_BUCKETS) + 1)
+        latency[0] = 90
+        latency[3] = 10
+        self.assertEqual(stats.percentile(latency, 50), stats.LATENCY_BUCKETS[0])
+        self.assertEqual(stats.percentile(latency, 99), stats.LATENCY_BUCKETS[3])
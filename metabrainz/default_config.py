@@ -35,3 +35,57 @@ NOTIFICATION_RECIPIENTS = []
 
 
 PREFERRED_URL_SCHEME = "http"
+
+
+# Mail (see metabrainz.mail)
+# Backend is either "smtp", "maildir" (messages are stored in MAIL_MAILDIR
+# directory instead of being sent), or "null". If it's not set, "null" is used
+# in testing mode and "smtp" otherwise.
+MAIL_BACKEND = None
+MAIL_MAILDIR = "mail"
+SMTP_SERVER = "localhost"
+SMTP_PORT = 25
+SMTP_USERNAME = None
+SMTP_PASSWORD = None
+SMTP_USE_TLS = False
+SMTP_TIMEOUT = 30  # seconds
+# Idle connections are closed after this many seconds. Should be lower than
+# the timeout of the server.
+SMTP_IDLE_TIMEOUT = 60
+SMTP_POOL_SIZE = 4
+
+
+# Cache (see metabrainz.cache)
+# Backend is either "memcached", "local", or "null". If it's not set, memcached
+# is used when MEMCACHED_SERVERS are specified.
+CACHE_BACKEND = None
+CACHE_LOCAL_MAX_ITEMS = 10000
+MEMCACHED_NAMESPACE = "MeB"
+# Number of seconds during which memcached server that couldn't be contacted
+# is skipped (its keys are moved to the next server on the hash ring).
+MEMCACHED_DEAD_RETRY = 30
+
+# In-process cache in front of the backend
+CACHE_L1_SIZE = 0  # disabled
+CACHE_L1_TIME = 60
+# Number of seconds for specific namespaces, 0 disables L1 for a namespace.
+CACHE_L1_NAMESPACE_TIMES = {}
+CACHE_L1_VERSION_CHECK_INTERVAL = 5
+
+# Number of seconds between saving cache statistics of each worker, 0 disables
+CACHE_STATS_FLUSH_INTERVAL = 60
+
+# Serialization of cached values. Plain data can be stored as "json" or
+# "msgpack" (requires msgpack package), everything else is pickled. Values
+# larger than CACHE_COMPRESS_THRESHOLD bytes are compressed with "zlib" or
+# "zstd" (requires zstandard package). Values larger than CACHE_MAX_ITEM_SIZE
+# bytes are split into multiple items.
+CACHE_SERIALIZER = "pickle"
+CACHE_COMPRESSION = "zlib"
+CACHE_COMPRESS_THRESHOLD = 1024
+CACHE_MAX_ITEM_SIZE = 1000 * 1000
+
+
+# Database queries made by each request (see metabrainz.model.query_counter)
+QUERY_COUNT_HEADER = False  # whether to return the count in X-Query-Count header
+QUERY_COUNT_WARNING_THRESHOLD = 50  # requests that make more queries are logged
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of donation receipt generation.
+
+It compares the current implementation (shared styles and static paragraphs,
+output into memory) with the way receipts used to be generated: all styles
+and paragraphs created for each receipt, PDF written into a temporary file
+that was then read again when the email was composed.
+"""
+from reportlab.platypus import SimpleDocTemplate, Spacer, Paragraph
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
+from metabrainz.donations import receipts
+import tempfile
+import time
+
+_RECEIPT_ARGS = (u"tester@example.org", u"2015-06-01", u"$42.50", u"Tester Testov", u"tester")
+
+
+def run(iterations=200):
+    """Runs benchmark of both implementations.
+
+    Returns:
+        List of (implementation name, receipts per second) tuples.
+    """
+    return [
+        ("tempfile (old)", _measure(_generate_receipt_tempfile, iterations)),
+        ("in-memory", _measure(lambda: receipts.generate_receipt(*_RECEIPT_ARGS), iterations)),
+    ]
+
+
+def _generate_receipt_tempfile():
+    """Previous implementation of `receipts.generate_receipt`, including
+    reading of the file by `send_mail`.
+    """
+    def style(name, font, size, alignment):
+        s = ParagraphStyle(name)
+        s.fontName, s.fontSize, s.alignment = font, size, alignment
+        return s
+
+    email, date, amount, name, editor_name = _RECEIPT_ARGS
+    story = [
+        Spacer(0, 20),
+        Paragraph(receipts._ADDRESS_TEXT, style("address", receipts._PRIMARY_FONT, 12, TA_RIGHT)),
+        Spacer(0, 30),
+        Paragraph(receipts._NOTE_TEXT % (email, name), style("note", receipts._PRIMARY_FONT, 12, TA_LEFT)),
+        Paragraph(receipts._DETAILS_TEXT % (date, amount, editor_name),
+                  style("details", receipts._PRIMARY_FONT, 12, TA_CENTER)),
+        Spacer(0, 40),
+        Paragraph(receipts._THANKS_TEXT, style("thanks", receipts._PRIMARY_FONT_BOLD, 20, TA_CENTER)),
+    ]
+    file = tempfile.NamedTemporaryFile()
+    doc = SimpleDocTemplate(file.name, pagesize=receipts._PAGE_SIZE,
+                            leftMargin=52, rightMargin=44)
+    doc.build(story, onFirstPage=receipts._create_header)
+    data = file.read()
+    file.close()
+    return data
+
+
+def _measure(operation, iterations):
+    operation()  # warm up (font loading, etc.)
+    start = time.time()
+    for _ in xrange(iterations):
+        operation()
+    return iterations / (time.time() - start)
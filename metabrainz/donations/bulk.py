@@ -0,0 +1,251 @@
+"""
+Bulk sending of donation receipts and year-end statements.
+
+Donations are read with a server-side cursor, so memory usage doesn't depend
+on the number of donations in the date range. PDFs are generated and sent by
+a pool of worker processes. Each worker reuses its SMTP connection for all
+messages that it sends (see metabrainz.mail).
+
+Progress can be saved into a checkpoint file. If a run is interrupted, it is
+resumed from the last item that has been processed when the same command is
+executed again. Keys of items that have failed are saved too, so they are
+retried first when the run is resumed.
+"""
+from metabrainz.model import db
+from metabrainz.model.donation import Donation, get_donor_name
+from metabrainz.donations import receipts
+from metabrainz import mail
+from multiprocessing.util import Finalize
+import multiprocessing
+import itertools
+import logging
+import json
+import time
+import os
+
+MODE_RECEIPTS = 'receipts'  # receipt for each donation
+MODE_STATEMENTS = 'statements'  # one statement with all donations of each donor
+
+FETCH_SIZE = 1000  # number of rows fetched from the cursor at once
+BATCH_SIZE = 500  # number of items that are handed over to workers at once
+REPORT_INTERVAL = 100  # number of items between progress reports
+
+_DATE_FORMAT = '%Y-%m-%d'
+
+# State of a worker process (see `_init_worker`)
+_mode = None
+_dry_run = False
+_app_context = None
+
+
+def run(start, end, mode=MODE_RECEIPTS, processes=None, dry_run=False,
+        checkpoint_path=None, app_factory=None, progress=None):
+    """Sends receipts or statements for donations made during a period.
+
+    Args:
+        start: First date of the period.
+        end: Date after the last date of the period.
+        mode: MODE_RECEIPTS or MODE_STATEMENTS.
+        processes: Number of worker processes (number of CPUs by default).
+            If 0, everything is done in the current process.
+        dry_run: If True, PDFs are generated, but not sent.
+        checkpoint_path: Path to a file where progress is saved.
+        app_factory: Function that creates an application, which is used in
+            worker processes.
+        progress: Function that is called with number of processed items,
+            number of failed items, and number of seconds since the start
+            every REPORT_INTERVAL items and at the end.
+
+    Returns:
+        Tuple with number of processed items, number of failed items, and
+        number of seconds it took.
+    """
+    if mode not in (MODE_RECEIPTS, MODE_STATEMENTS):
+        raise ValueError("Unknown mode: %s" % mode)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    checkpoint = {
+        'mode': mode,
+        'start': start.strftime(_DATE_FORMAT),
+        'end': end.strftime(_DATE_FORMAT),
+        'last_key': None,
+        'failed_keys': [],
+    }
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        checkpoint = _load_checkpoint(checkpoint_path, checkpoint)
+        logging.info("Resuming after %s, retrying %s failed items.",
+                     checkpoint['last_key'], len(checkpoint['failed_keys']))
+    retried_keys = set(checkpoint['failed_keys'])
+    failed_keys = set(retried_keys)
+
+    # Worker processes are forked before any database connections are opened
+    pool = None
+    if processes:
+        pool = multiprocessing.Pool(processes, _init_worker, (app_factory, mode, dry_run))
+    else:
+        _init_worker(None, mode, dry_run)
+
+    get_tasks = _get_statement_tasks if mode == MODE_STATEMENTS else _get_receipt_tasks
+    tasks = get_tasks(start, end, after_key=checkpoint['last_key'])
+    if retried_keys:
+        tasks = itertools.chain(get_tasks(start, end, keys=sorted(retried_keys)), tasks)
+
+    processed, failed = 0, 0
+    start_time = time.time()
+    try:
+        # Tasks are read in the current thread (sessions can't be shared
+        # between threads) and handed over to workers in batches.
+        while True:
+            batch = list(itertools.islice(tasks, BATCH_SIZE))
+            if not batch:
+                break
+            if pool:
+                results = pool.imap(_process_task, batch, chunksize=max(1, len(batch) // (processes * 4)))
+            else:
+                results = itertools.imap(_process_task, batch)
+            for key, error in results:  # results are returned in the same order as tasks
+                processed += 1
+                if error:
+                    failed += 1
+                    failed_keys.add(key)
+                    logging.error("Failed to send %s to %s: %s", mode, key, error)
+                else:
+                    failed_keys.discard(key)
+                if key not in retried_keys:
+                    checkpoint['last_key'] = key
+                if progress and processed % REPORT_INTERVAL == 0:
+                    progress(processed, failed, time.time() - start_time)
+            if checkpoint_path:
+                checkpoint['failed_keys'] = sorted(failed_keys)
+                _save_checkpoint(checkpoint_path, checkpoint)
+        if pool:
+            pool.close()
+    except BaseException:
+        if pool:
+            pool.terminate()
+        raise
+    finally:
+        if pool:
+            pool.join()
+        else:
+            _close_worker()
+        db.session.rollback()  # closes the cursor
+
+    elapsed = time.time() - start_time
+    if progress:
+        progress(processed, failed, elapsed)
+    return processed, failed, elapsed
+
+
+def get_period_name(start, end):
+    """Returns description of a period that is used in statements."""
+    if start.month == start.day == end.month == end.day == 1 and end.year == start.year + 1:
+        return str(start.year)
+    return "%s - %s" % (start.strftime(_DATE_FORMAT), end.strftime(_DATE_FORMAT))
+
+
+def _get_receipt_tasks(start, end, after_key=None, keys=None):
+    """Returns receipts that should be sent. Key of each receipt is ID of
+    the donation.
+
+    Args:
+        after_key: Only receipts with greater keys are returned.
+        keys: Only receipts with these keys are returned.
+    """
+    query = db.session.query(
+        Donation.id, Donation.email, Donation.payment_date, Donation.amount,
+        Donation.first_name, Donation.last_name, Donation.editor_name,
+    ).filter(Donation.payment_date >= start, Donation.payment_date < end)
+    if after_key is not None:
+        query = query.filter(Donation.id > after_key)
+    if keys is not None:
+        query = query.filter(Donation.id.in_(keys))
+    query = query.order_by(Donation.id).execution_options(stream_results=True).yield_per(FETCH_SIZE)
+    for id, email, date, amount, first_name, last_name, editor_name in query:
+        yield id, (email, date, amount, get_donor_name(first_name, last_name), editor_name)
+
+
+def _get_statement_tasks(start, end, after_key=None, keys=None):
+    """Returns statements that should be sent. Key of each statement is the
+    email address of the donor. Arguments are the same as in
+    `_get_receipt_tasks`.
+    """
+    query = db.session.query(
+        Donation.email, Donation.payment_date, Donation.amount, Donation.first_name, Donation.last_name,
+    ).filter(Donation.payment_date >= start, Donation.payment_date < end)
+    if after_key is not None:
+        query = query.filter(Donation.email > after_key)
+    if keys is not None:
+        query = query.filter(Donation.email.in_(keys))
+    query = query.order_by(Donation.email, Donation.payment_date, Donation.id) \
+        .execution_options(stream_results=True).yield_per(FETCH_SIZE)
+    period = get_period_name(start, end)
+    for email, rows in itertools.groupby(query, lambda row: row.email):
+        rows = list(rows)
+        # Name from the latest donation is used
+        yield email, (email, get_donor_name(rows[-1].first_name, rows[-1].last_name), period,
+                      [(row.payment_date, row.amount) for row in rows])
+
+
+def _init_worker(app_factory, mode, dry_run):
+    global _mode, _dry_run, _app_context
+    _mode, _dry_run = mode, dry_run
+    if app_factory:
+        _app_context = app_factory().app_context()
+        _app_context.push()
+        # Pool workers exit without running atexit handlers, but they run
+        # multiprocessing finalizers.
+        Finalize(None, _close_worker, exitpriority=0)
+
+
+def _close_worker():
+    mail.close()
+
+
+def _process_task(task):
+    """Generates and sends a single receipt or statement.
+
+    Returns:
+        Key of the task and error message or None if there was no error.
+    """
+    key, args = task
+    try:
+        if _dry_run:
+            if _mode == MODE_STATEMENTS:
+                receipts.generate_statement(*args)
+            else:
+                receipts.generate_receipt(*args)
+        else:
+            _send(args)
+    except Exception as e:
+        logging.debug("Failed to process %s.", key, exc_info=True)
+        return key, "%s: %s" % (type(e).__name__, e)
+    return key, None
+
+
+def _send(args):
+    if _mode == MODE_STATEMENTS:
+        receipts.send_statement(*args)
+    else:
+        receipts.send_receipt(*args)
+
+
+def _load_checkpoint(path, checkpoint):
+    with open(path) as f:
+        saved = json.load(f)
+    for key in ('mode', 'start', 'end'):
+        if saved.get(key) != checkpoint[key]:
+            raise ValueError("Checkpoint %s has been created for a different run (%s: %s)." %
+                             (path, key, saved.get(key)))
+    saved.setdefault('failed_keys', [])
+    return saved
+
+
+def _save_checkpoint(path, checkpoint):
+    # Writing into a temporary file first, so that the checkpoint isn't
+    # corrupted if the process is killed while it's being written.
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.rename(temp_path, path)
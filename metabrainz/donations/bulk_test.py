@@ -0,0 +1,93 @@
+from metabrainz.testing import FlaskTestCase
+from metabrainz.model.donation import Donation
+from metabrainz.model import db
+from metabrainz.donations import bulk, receipts
+from datetime import date, datetime
+import tempfile
+import shutil
+import json
+import os
+
+
+class BulkTestCase(FlaskTestCase):
+
+    def setUp(self):
+        super(BulkTestCase, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        for i, email in enumerate([u'b@example.org', u'a@example.org', u'b@example.org', u'c@example.org']):
+            db.session.add(Donation(first_name=u'Tester', last_name=unicode(i), email=email,
+                                    amount=10 + i, payment_date=datetime(2015, 3, i + 1)))
+        db.session.add(Donation(first_name=u'Tester', last_name=u'', email=u'a@example.org',
+                                amount=5, payment_date=datetime(2016, 1, 1)))
+        db.session.commit()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+        super(BulkTestCase, self).tearDown()
+
+    def test_receipts(self):
+        processed, failed, _ = bulk.run(date(2015, 1, 1), date(2016, 1, 1), processes=0)
+        self.assertEqual((processed, failed), (4, 0))
+
+    def test_statements(self):
+        tasks = list(bulk._get_statement_tasks(date(2015, 1, 1), date(2016, 1, 1)))
+        self.assertEqual([key for key, _ in tasks], [u'a@example.org', u'b@example.org', u'c@example.org'])
+        email, name, period, donations = tasks[1][1]
+        self.assertEqual(name, u'Tester 2')
+        self.assertEqual(period, '2015')
+        self.assertEqual([amount for _, amount in donations], [10, 12])
+
+        processed, failed, _ = bulk.run(date(2015, 1, 1), date(2016, 1, 1), mode=bulk.MODE_STATEMENTS,
+                                        processes=0, dry_run=True)
+        self.assertEqual((processed, failed), (3, 0))
+
+    def test_checkpoint(self):
+        path = os.path.join(self.temp_dir, 'checkpoint')
+        bulk.run(date(2015, 1, 1), date(2016, 1, 1), processes=0, dry_run=True, checkpoint_path=path)
+        with open(path) as f:
+            self.assertEqual(json.load(f)['last_key'], Donation.query.filter_by(last_name=u'3').one().id)
+
+        # Everything has been processed, so there's nothing to resume
+        processed, _, _ = bulk.run(date(2015, 1, 1), date(2016, 1, 1), processes=0, dry_run=True,
+                                   checkpoint_path=path)
+        self.assertEqual(processed, 0)
+
+        with self.assertRaises(ValueError):
+            bulk.run(date(2016, 1, 1), date(2017, 1, 1), processes=0, checkpoint_path=path)
+
+    def test_checkpoint_failed(self):
+        path = os.path.join(self.temp_dir, 'checkpoint')
+        failing = Donation.query.filter_by(last_name=u'1').one().id
+        generate_receipt = receipts.generate_receipt
+
+        def generate_failing_receipt(email, date, amount, *args):
+            if amount == 11:
+                raise RuntimeError("Test")
+            return generate_receipt(email, date, amount, *args)
+
+        receipts.generate_receipt = generate_failing_receipt
+        try:
+            processed, failed, _ = bulk.run(date(2015, 1, 1), date(2016, 1, 1), processes=0, dry_run=True,
+                                            checkpoint_path=path)
+        finally:
+            receipts.generate_receipt = generate_receipt
+        self.assertEqual((processed, failed), (4, 1))
+        with open(path) as f:
+            checkpoint = json.load(f)
+        self.assertEqual(checkpoint['failed_keys'], [failing])
+        self.assertEqual(checkpoint['last_key'], Donation.query.filter_by(last_name=u'3').one().id)
+
+        # Only the failed item is retried
+        processed, failed, _ = bulk.run(date(2015, 1, 1), date(2016, 1, 1), processes=0, dry_run=True,
+                                        checkpoint_path=path)
+        self.assertEqual((processed, failed), (1, 0))
+        with open(path) as f:
+            self.assertEqual(json.load(f)['failed_keys'], [])
+
+    def test_processes(self):
+        processed, failed, _ = bulk.run(date(2015, 1, 1), date(2017, 1, 1), processes=2, dry_run=True)
+        self.assertEqual((processed, failed), (5, 0))
+
+    def test_get_period_name(self):
+        self.assertEqual(bulk.get_period_name(date(2015, 1, 1), date(2016, 1, 1)), '2015')
+        self.assertEqual(bulk.get_period_name(date(2015, 1, 1), date(2015, 7, 1)), '2015-01-01 - 2015-07-01')
@@ -0,0 +1,92 @@
+"""
+Lookups of MusicBrainz editors for the donation form.
+
+The form checks if an editor exists while the donor is typing their name, so
+the same names are looked up over and over. Results are cached by lowercased
+name: existing editors for a day and missing ones only for a few minutes, so
+that new accounts are found soon after they are created.
+
+Only one request for a name is sent to MusicBrainz at a time. Workers that
+need the same name wait for its result to appear in the cache, the same way
+as in `cache.memoized`. Each client is also limited to a number of lookups
+per minute (see `check_rate_limit`).
+"""
+from metabrainz import cache, http_client
+from flask import current_app
+import time as _time
+
+CACHE_NAMESPACE = 'mb_editors'
+FOUND_CACHE_TIME = 60 * 60 * 24  # seconds
+NOT_FOUND_CACHE_TIME = 60 * 5  # seconds
+
+# Lookups that are in progress are expected to finish before the lock expires
+# (see http_client.musicbrainz_client timeouts).
+LOCK_TIME = 10  # seconds
+WAIT_ATTEMPTS = 50
+WAIT_INTERVAL = 0.1  # seconds
+
+MAX_LOOKUPS_PER_MINUTE = 60
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+def check_rate_limit(client_id):
+    """Counts a lookup made by a client.
+
+    Args:
+        client_id: Identifier of the client (IP address).
+
+    Raises:
+        RateLimitExceeded if client has made too many lookups during the
+        current minute.
+    """
+    window = int(_time.time() // 60)
+    count = cache.incr(cache.gen_key('rate', client_id, window), time=120, namespace=CACHE_NAMESPACE)
+    if count > MAX_LOOKUPS_PER_MINUTE:
+        raise RateLimitExceeded("Can't check more than %s editors per minute." % MAX_LOOKUPS_PER_MINUTE)
+
+
+def editor_exists(name):
+    """Checks if an editor with a specified name exists on MusicBrainz.
+
+    Names are compared case-insensitively.
+
+    Raises:
+        requests.exceptions.RequestException or ValueError if MusicBrainz
+        can't be reached or returns an invalid response.
+    """
+    # Key is hashed by the cache module, so it can contain any characters
+    key = 'editor:' + name.lower().encode('utf-8')
+    found = cache.get(key, CACHE_NAMESPACE)
+    if found is not None:
+        return found
+
+    lock_key = key + ':lock'
+    locked = cache.add(lock_key, True, LOCK_TIME, CACHE_NAMESPACE)
+    if not locked:
+        for _ in range(WAIT_ATTEMPTS):
+            _time.sleep(WAIT_INTERVAL)
+            found = cache.get(key, CACHE_NAMESPACE)
+            if found is not None:
+                return found
+        # Giving up on waiting, looking up without the lock
+
+    try:
+        found = _lookup(name)
+        cache.set(key, found, FOUND_CACHE_TIME if found else NOT_FOUND_CACHE_TIME, CACHE_NAMESPACE)
+    finally:
+        if locked:
+            cache.delete(lock_key, CACHE_NAMESPACE)
+    return found
+
+
+def _lookup(name):
+    response = http_client.musicbrainz_client.get(current_app.config['MUSICBRAINZ_BASE_URL'] + 'ws/js/editor/',
+                                                  params={'q': name})
+    response.raise_for_status()
+    for item in response.json():
+        if 'name' in item and item['name'].lower() == name.lower():
+            return True
+    return False
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from metabrainz.testing import FlaskTestCase
+from metabrainz.donations import editors
+from metabrainz import http_client
+from flask import url_for
+import requests
+
+
+class FakeResponse(object):
+
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeClient(object):
+    """Returns editors whose names start with the query."""
+
+    def __init__(self, names=(), error=None):
+        self.names = names
+        self.error = error
+        self.queries = []
+
+    def get(self, url, params=None, **kwargs):
+        self.queries.append(params['q'])
+        if self.error:
+            raise self.error
+        return FakeResponse([{'id': i, 'name': name} for i, name in enumerate(self.names)
+                             if name.lower().startswith(params['q'].lower())])
+
+
+class EditorsTestCase(FlaskTestCase):
+
+    def setUp(self):
+        super(EditorsTestCase, self).setUp()
+        self.original_client = http_client.musicbrainz_client
+        http_client.musicbrainz_client = FakeClient([u'Tester', u'Tester 2', u'Тестер'])
+
+    def tearDown(self):
+        http_client.musicbrainz_client = self.original_client
+        super(EditorsTestCase, self).tearDown()
+
+    def test_editor_exists(self):
+        self.assertTrue(editors.editor_exists(u'tester'))
+        self.assertTrue(editors.editor_exists(u'TESTER'))  # cached
+        self.assertTrue(editors.editor_exists(u'Тестер'))
+        self.assertFalse(editors.editor_exists(u'Test'))
+        self.assertFalse(editors.editor_exists(u'test'))  # cached
+        self.assertEqual(http_client.musicbrainz_client.queries, [u'tester', u'Тестер', u'Test'])
+
+    def test_editor_exists_error(self):
+        http_client.musicbrainz_client = FakeClient(error=requests.exceptions.Timeout())
+        with self.assertRaises(requests.exceptions.RequestException):
+            editors.editor_exists(u'Tester')
+        # Failures aren't cached
+        http_client.musicbrainz_client = FakeClient([u'Tester'])
+        self.assertTrue(editors.editor_exists(u'Tester'))
+
+    def test_check_rate_limit(self):
+        for _ in range(editors.MAX_LOOKUPS_PER_MINUTE):
+            editors.check_rate_limit('127.0.0.1')
+        with self.assertRaises(editors.RateLimitExceeded):
+            editors.check_rate_limit('127.0.0.1')
+        editors.check_rate_limit('127.0.0.2')
+
+    def test_check_editor_view(self):
+        response = self.client.get(url_for('donations.check_editor', q=u'Tester'))
+        self.assertEqual(response.json, {'editor': u'Tester', 'found': True})
+        self.assert400(self.client.get(url_for('donations.check_editor')))
+
+        http_client.musicbrainz_client = FakeClient(error=requests.exceptions.ConnectionError('down'))
+        response = self.client.get(url_for('donations.check_editor', q=u'Someone'))
+        self.assertEqual(response.json, {'error': 'down'})
+
+    def test_check_editor_view_without_gateway_header(self):
+        self.app.config['BEHIND_GATEWAY'] = True
+        self.app.config['REMOTE_ADDR_HEADER'] = 'X-MB-Remote-Addr'
+        for _ in range(editors.MAX_LOOKUPS_PER_MINUTE):
+            editors.check_rate_limit('127.0.0.1')
+        # Client address is used when the header is missing
+        response = self.client.get(url_for('donations.check_editor', q=u'Tester'),
+                                   environ_base={'REMOTE_ADDR': '127.0.0.1'})
+        self.assertEqual(response.status_code, 429)
+        response = self.client.get(url_for('donations.check_editor', q=u'Tester'),
+                                   headers={'X-MB-Remote-Addr': '127.0.0.2'})
+        self.assertEqual(response.json, {'editor': u'Tester', 'found': True})
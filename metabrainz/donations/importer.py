@@ -0,0 +1,243 @@
+"""
+Import of donations that have been received outside of payment processors
+(checks, bitcoin) from CSV files.
+
+The file is validated row by row while it's being read, and valid rows are
+converted into a temporary file in the format of PostgreSQL COPY command.
+If the whole file is valid, it is loaded into a staging table with COPY and
+moved into the donation table with a single INSERT ... SELECT statement in
+the same transaction. Donations that have already been recorded (with the
+same payment method and transaction ID) are skipped, so the same file can be
+imported again after a partial import. That's why transaction IDs are
+required and need to be unique within the file. Receipts are sent for all
+new donations.
+
+First line of the file needs to contain names of columns (see `COLUMNS`).
+"""
+from metabrainz.model import db
+from metabrainz.model.donation import Donation, PAYMENT_METHOD_CHECK, PAYMENT_METHOD_BITCOIN, JOB_SEND_RECEIPT
+from metabrainz import jobs
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import tempfile
+import time
+import csv
+
+# Columns that can be present in the file (name -> required)
+COLUMNS = [
+    ('first_name', True),
+    ('last_name', False),
+    ('email', True),
+    ('editor_name', False),
+    ('amount', True),
+    ('fee', False),
+    ('payment_method', True),
+    ('transaction_id', True),
+    ('payment_date', False),
+    ('anonymous', False),
+    ('can_contact', False),
+    ('address_street', False),
+    ('address_city', False),
+    ('address_state', False),
+    ('address_postcode', False),
+    ('address_country', False),
+    ('memo', False),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+
+PAYMENT_METHODS = (PAYMENT_METHOD_CHECK, PAYMENT_METHOD_BITCOIN)
+
+MAX_REPORTED_ERRORS = 100
+
+_DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S')
+_TRUE_VALUES = ('yes', 'true', '1')
+_FALSE_VALUES = ('no', 'false', '0')
+
+
+class InvalidFileError(ValueError):
+    """File contains rows that can't be imported.
+
+    Attributes:
+        errors: List of error messages with line numbers.
+    """
+
+    def __init__(self, errors):
+        super(InvalidFileError, self).__init__("%s errors found in the file" % len(errors))
+        self.errors = errors
+
+
+def import_donations(file, dry_run=False):
+    """Imports donations from a CSV file.
+
+    Args:
+        file: File object with CSV data in UTF-8.
+        dry_run: If True, file is only validated.
+
+    Returns:
+        Tuple with number of rows in the file, number of imported donations,
+        and number of seconds it took.
+
+    Raises:
+        InvalidFileError if there are invalid rows. Nothing is imported in
+        that case.
+    """
+    start_time = time.time()
+    with tempfile.TemporaryFile() as copy_file:
+        row_count = _convert(file, copy_file)
+        if dry_run:
+            return row_count, 0, time.time() - start_time
+        copy_file.seek(0)
+        try:
+            imported = _load(copy_file)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return row_count, imported, time.time() - start_time
+
+
+def _convert(file, copy_file):
+    """Validates rows and writes them into a file that COPY can read.
+
+    Returns:
+        Number of rows.
+    """
+    reader = csv.reader(file)
+    errors = []
+
+    header = [name.strip().lower() for name in next(reader, [])]
+    unknown = set(header) - set(COLUMN_NAMES)
+    if unknown:
+        errors.append("line 1: unknown columns: %s" % ", ".join(sorted(unknown)))
+    missing = [name for name, required in COLUMNS if required and name not in header]
+    if missing:
+        errors.append("line 1: missing columns: %s" % ", ".join(missing))
+    if errors:
+        raise InvalidFileError(errors)
+
+    row_count = 0
+    seen = {}  # (payment method, transaction ID) -> line
+    for row in reader:
+        row_count += 1
+        line = reader.line_num
+        if len(row) != len(header):
+            errors.append("line %s: expected %s values, got %s" % (line, len(header), len(row)))
+        else:
+            try:
+                values = _validate(zip(header, row))
+            except ValueError as e:
+                errors.append("line %s: %s" % (line, e))
+            else:
+                key = (values['payment_method'], values['transaction_id'])
+                if key in seen:
+                    errors.append("line %s: duplicate transaction_id %s (see line %s)" %
+                                  (line, values['transaction_id'], seen[key]))
+                seen[key] = line
+                if not errors:  # no need to write anything if file won't be imported
+                    copy_file.write('\t'.join(_to_copy_value(values[name]) for name in COLUMN_NAMES) + '\n')
+        if len(errors) >= MAX_REPORTED_ERRORS:
+            break
+    if errors:
+        raise InvalidFileError(errors)
+    return row_count
+
+
+def _validate(row):
+    """Converts values of a row and checks that they are valid.
+
+    Args:
+        row: List of (column name, value) tuples.
+
+    Raises:
+        ValueError with description of the problem.
+    """
+    values = dict.fromkeys(COLUMN_NAMES)
+    try:
+        for name, value in row:
+            values[name] = value.decode('utf-8').strip() or None
+    except UnicodeDecodeError:
+        raise ValueError("invalid UTF-8")
+
+    if not values['first_name']:
+        raise ValueError("first_name is empty")
+    values['last_name'] = values['last_name'] or u''
+    if not values['email'] or '@' not in values['email']:
+        raise ValueError("invalid email: %s" % values['email'])
+    if values['payment_method'] not in PAYMENT_METHODS:
+        raise ValueError("payment_method must be one of: %s" % ", ".join(PAYMENT_METHODS))
+    if not values['transaction_id']:
+        raise ValueError("transaction_id is empty")
+
+    for name in ('amount', 'fee'):
+        if values[name] is not None:
+            try:
+                values[name] = Decimal(values[name].lstrip('$'))
+            except InvalidOperation:
+                raise ValueError("invalid %s: %s" % (name, values[name]))
+            if not values[name].is_finite():  # NaN can't be compared
+                raise ValueError("invalid %s: %s" % (name, values[name]))
+            if values[name] < 0 or values[name] >= 10 ** 9:
+                raise ValueError("%s is out of range: %s" % (name, values[name]))
+    if not values['amount']:
+        raise ValueError("amount must be positive")
+
+    if values['payment_date'] is None:
+        values['payment_date'] = datetime.utcnow()
+    else:
+        values['payment_date'] = _parse_date(values['payment_date'])
+
+    values['anonymous'] = _parse_bool('anonymous', values['anonymous'], False)
+    values['can_contact'] = _parse_bool('can_contact', values['can_contact'], True)
+    return values
+
+
+def _parse_date(value):
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    raise ValueError("invalid payment_date: %s" % value)
+
+
+def _parse_bool(name, value, default):
+    if value is None:
+        return default
+    if value.lower() in _TRUE_VALUES:
+        return True
+    if value.lower() in _FALSE_VALUES:
+        return False
+    raise ValueError("invalid %s: %s" % (name, value))
+
+
+def _to_copy_value(value):
+    """Converts a value into the text format of COPY."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, datetime):
+        return value.isoformat() + '+00:00'  # dates are in UTC
+    if isinstance(value, Decimal):
+        return str(value)
+    # NUL characters can't be stored in text columns
+    return value.encode('utf-8').translate(None, '\0').replace('\\', '\\\\').replace('\t', '\\t') \
+        .replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _load(copy_file):
+    """Loads validated rows into the donation table.
+
+    Returns:
+        Number of new donations.
+    """
+    connection = db.session.connection()
+    columns = ", ".join(COLUMN_NAMES)
+    connection.execute("CREATE TEMPORARY TABLE donation_import ON COMMIT DROP AS "
+                       "SELECT %s FROM donation WITH NO DATA" % columns)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert("COPY donation_import (%s) FROM STDIN" % columns, copy_file)
+
+    ids = Donation.insert_unique_from('donation_import', COLUMN_NAMES)
+    jobs.enqueue_many(JOB_SEND_RECEIPT, [{'donation_id': id} for id in ids])
+    return len(ids)
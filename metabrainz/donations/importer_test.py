@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from metabrainz.testing import FlaskTestCase
+from metabrainz.model.donation import Donation
+from metabrainz.model.job import Job
+from metabrainz.donations import importer
+from StringIO import StringIO
+
+CSV_HEADER = "first_name,last_name,email,editor_name,amount,payment_method,transaction_id,payment_date,anonymous\n"
+
+
+class ImporterTestCase(FlaskTestCase):
+
+    def test_import_donations(self):
+        data = CSV_HEADER + (
+            "Tëster,Testing,test@example.org,tester,42.50,check,1001,2015-06-01,no\n"
+            "\"Another\tTester\",,another@example.org,,$10,bitcoin,abc,,yes\n"
+            "Tester,Testing,test@example.org,tester,5,check,1002,2015-06-02 10:30,\n"
+        )
+        self.assertEqual(importer.import_donations(StringIO(data), dry_run=True)[:2], (3, 0))
+        self.assertEqual(Donation.query.count(), 0)
+
+        self.assertEqual(importer.import_donations(StringIO(data))[:2], (3, 3))
+
+        donations = Donation.query.order_by(Donation.id).all()
+        self.assertEqual(len(donations), 3)
+        self.assertEqual(donations[0].first_name, u'Tëster')
+        self.assertEqual(donations[0].payment_date.date().isoformat(), '2015-06-01')
+        self.assertEqual(donations[1].first_name, u'Another\tTester')
+        self.assertEqual(donations[1].last_name, u'')
+        self.assertIsNone(donations[1].editor_name)
+        self.assertTrue(donations[1].anonymous)
+        self.assertTrue(donations[1].can_contact)
+        self.assertEqual(Job.query.count(), 3)  # receipts
+        self.assertEqual(Donation.get_nag_days(u'tester')[0], 1)  # donor is known, time has passed
+
+    def test_import_twice(self):
+        data = CSV_HEADER + (
+            "Tester,Testing,test@example.org,tester,42.50,check,1001,,no\n"
+            "Tester,Testing,test@example.org,tester,5,bitcoin,1001,,no\n"
+        )
+        self.assertEqual(importer.import_donations(StringIO(data))[:2], (2, 2))
+        # Donations that have already been imported are skipped, even if
+        # their payment dates are filled in during the import
+        self.assertEqual(importer.import_donations(StringIO(data))[:2], (2, 0))
+        self.assertEqual(Donation.query.count(), 2)
+        self.assertEqual(Job.query.count(), 2)  # receipts are sent only once
+
+    def test_invalid_file(self):
+        data = CSV_HEADER + (
+            "Tester,Testing,test@example.org,tester,42.50,check,1001,2015-06-01,no\n"
+            "Tester,Testing,test@example.org,tester,-1,check,1002,2015-06-01,no\n"
+            "Tester,Testing,test@example.org,tester,1,stripe,1003,2015-06-01,no\n"
+            "Tester,Testing,test@example.org,tester,1,check,1004,yesterday,no\n"
+            "Tester,Testing,test@example.org,tester,1,check,,2015-06-01,no\n"
+            "Tester,Testing,test@example.org,tester,1,check,1001,2015-06-01,no\n"
+            "Tester,Testing,test@example.org,tester,NaN,check,1005,2015-06-01,no\n"
+            "Tester,Testing,test@example.org,tester,sNaN,check,1006,2015-06-01,no\n"
+            "Tester,Testing,test@example.org,tester,Infinity,check,1007,2015-06-01,no\n"
+        )
+        with self.assertRaises(importer.InvalidFileError) as context:
+            importer.import_donations(StringIO(data))
+        self.assertEqual([error.split(':')[0] for error in context.exception.errors],
+                         ['line 3', 'line 4', 'line 5', 'line 6', 'line 7', 'line 8', 'line 9', 'line 10'])
+        self.assertEqual(Donation.query.count(), 0)
+
+        with self.assertRaises(importer.InvalidFileError):
+            importer.import_donations(StringIO("first_name,unknown\nTester,1\n"))
@@ -0,0 +1,93 @@
+"""
+Processing of PayPal IPNs (Instant Payment Notifications).
+
+IPN endpoint only stores notifications and acknowledges them, so that slow
+responses from PayPal don't block web server workers. Each stored IPN is
+verified and processed by a background job (see metabrainz.jobs). If PayPal
+can't be reached, the job is retried later.
+
+Specifications are available at https://developer.paypal.com/docs/classic/ipn/integration-guide/IPNImplementation/.
+"""
+from metabrainz.model.donation import Donation
+from metabrainz.model.paypal_ipn import PayPalIPN, STATUS_VERIFIED, STATUS_INVALID
+from metabrainz import jobs, http_client
+from werkzeug.datastructures import ImmutableOrderedMultiDict
+from werkzeug.urls import url_decode
+from flask import current_app
+import requests
+import logging
+
+PAYPAL_URL_PRIMARY = 'https://www.paypal.com/cgi-bin/webscr'
+PAYPAL_URL_SANDBOX = 'https://www.sandbox.paypal.com/cgi-bin/webscr'
+
+JOB_PROCESS_IPN = 'process_paypal_ipn'
+
+
+class VerificationError(Exception):
+    """PayPal didn't give a valid response to verification request."""
+    pass
+
+
+def receive(data, form):
+    """Stores an IPN and schedules its processing.
+
+    Duplicate IPNs are ignored. Changes need to be committed.
+
+    Args:
+        data: Request body.
+        form: Parsed IPN variables.
+
+    Returns:
+        ID of the stored IPN or None if it's a duplicate.
+    """
+    ipn_id = PayPalIPN.add(data, form.get('txn_id'), form.get('payment_status'))
+    if ipn_id is None:
+        logging.info('PayPal IPN: Duplicate notification for transaction %s.', form.get('txn_id'))
+    else:
+        jobs.enqueue(JOB_PROCESS_IPN, {'ipn_id': ipn_id})
+    return ipn_id
+
+
+def verify(data):
+    """Checks that IPN has been sent by PayPal.
+
+    Args:
+        data: Request body of the IPN. It's sent back unchanged, as required
+            by PayPal.
+
+    Returns:
+        True if IPN is valid, False otherwise.
+
+    Raises:
+        VerificationError if PayPal can't be reached or gives an unexpected
+        response. Verification needs to be retried later in that case.
+    """
+    paypal_url = PAYPAL_URL_PRIMARY if current_app.config['PAYMENT_PRODUCTION'] else PAYPAL_URL_SANDBOX
+    try:
+        response = http_client.paypal_client.post(paypal_url, data='cmd=_notify-validate&' + data,
+                                                  headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        raise VerificationError("Verification request failed: %s" % e)
+    if response.text == 'VERIFIED':
+        return True
+    if response.text == 'INVALID':
+        return False
+    raise VerificationError("Unexpected verification response: %r" % response.text[:100])
+
+
+@jobs.handler(JOB_PROCESS_IPN)
+def _process_ipn(ipn_id):
+    ipn = PayPalIPN.query.get(ipn_id)
+    if not verify(ipn.data):
+        logging.warning('PayPal IPN #%s is invalid.', ipn_id)
+        ipn.status = STATUS_INVALID
+        return
+    ipn.status = STATUS_VERIFIED
+
+    form = url_decode(ipn.data, cls=ImmutableOrderedMultiDict)
+    # Some payment options don't return payment_status value.
+    if 'payment_status' not in form:
+        logging.warn('PayPal IPN: payment_status is missing.')
+        return
+    Donation.process_paypal_ipn(form)
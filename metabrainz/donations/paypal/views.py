@@ -1,38 +1,19 @@
-from flask import Blueprint, request, current_app
+from flask import Blueprint, request
 from werkzeug.datastructures import ImmutableOrderedMultiDict
-from metabrainz.model.donation import Donation
-from itertools import chain
-import requests
-import logging
+from metabrainz.model import db
+from metabrainz.donations.paypal import ipn as paypal_ipn
 
 donations_paypal_bp = Blueprint('donations_paypal', __name__)
 
-PAYPAL_URL_PRIMARY = 'https://www.paypal.com/cgi-bin/webscr'
-PAYPAL_URL_SANDBOX = 'https://www.sandbox.paypal.com/cgi-bin/webscr'
-
-IPN_VERIFY_EXTRA_PARAMS = ((u'cmd', u'_notify-validate'),)
-
 
 @donations_paypal_bp.route('/ipn', methods=['POST'])
 def ipn():
     """Endpoint that receives Instant Payment Notifications (IPNs) from PayPal.
 
-    Specifications are available at https://developer.paypal.com/docs/classic/ipn/integration-guide/IPNImplementation/.
+    IPNs are acknowledged as soon as they are stored. Verification and
+    processing are done in the background (see metabrainz.donations.paypal.ipn).
     """
     request.parameter_storage_class = ImmutableOrderedMultiDict
-
-    # Checking if data is legit
-    paypal_url = PAYPAL_URL_PRIMARY if current_app.config['PAYMENT_PRODUCTION'] else PAYPAL_URL_SANDBOX
-    verify_args = chain(IPN_VERIFY_EXTRA_PARAMS, request.form.iteritems())
-    verify_string = u'&'.join((u'%s=%s' % (param, value) for param, value in verify_args))
-    verification_response = requests.post(paypal_url, data=verify_string.encode('utf-8'))
-
-    # Some payment options don't return payment_status value.
-    if 'payment_status' not in request.form:
-        logging.warn('PayPal IPN: payment_status is missing.')
-        return '', 200
-
-    if verification_response.text == 'VERIFIED':
-        Donation.process_paypal_ipn(request.form)
-
+    paypal_ipn.receive(request.get_data(), request.form)
+    db.session.commit()
     return '', 200
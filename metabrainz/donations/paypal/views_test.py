@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 from metabrainz.testing import FlaskTestCase
 from metabrainz.model.donation import Donation
+from metabrainz.model.paypal_ipn import PayPalIPN, STATUS_VERIFIED, STATUS_INVALID
+from metabrainz.model.job import Job, STATUS_PENDING
+from metabrainz import jobs, http_client
 from flask import current_app, url_for
-from metabrainz.donations.paypal import views
 
 
 class FakeResponse(object):
@@ -11,19 +13,33 @@ class FakeResponse(object):
     def __init__(self, text):
         self.text = text
 
+    def raise_for_status(self):
+        pass
 
-class FakeRequests(object):
-    def post(self, url, *args, **kwargs):
-        """Always confirms verification as valid."""
+
+class FakeSession(object):
+
+    def __init__(self, text='VERIFIED'):
+        self.text = text
+        self.requests = []
+
+    def post(self, url, data, **kwargs):
+        """Confirms verification as valid unless told otherwise."""
+        self.requests.append(data)
         if url in ['https://www.paypal.com/cgi-bin/webscr',
                    'https://www.sandbox.paypal.com/cgi-bin/webscr']:
-            return FakeResponse('VERIFIED')
+            return FakeResponse(self.text)
 
 
 class DonationsPayPalViewsTestCase(FlaskTestCase):
     def setUp(self):
         super(DonationsPayPalViewsTestCase, self).setUp()
-        views.requests = FakeRequests()
+        self.original_client = http_client.paypal_client
+        http_client.paypal_client = FakeSession()
+
+    def tearDown(self):
+        http_client.paypal_client = self.original_client
+        super(DonationsPayPalViewsTestCase, self).tearDown()
 
     def test_paypal_ipn(self):
         ipn_data = {
@@ -57,9 +73,53 @@ class DonationsPayPalViewsTestCase(FlaskTestCase):
         )
         self.assert200(resp)
 
+        # IPN is verified and processed in the background
+        self.assertEqual(Donation.query.count(), 0)
+        self.assertEqual(jobs.run_pending(), 2)  # IPN and receipt
+        self.assertTrue(http_client.paypal_client.requests[0].startswith('cmd=_notify-validate&'))
+
         # Donation should be in the DB now
         self.assertEqual(len(Donation.query.all()), 1)
         self.assertEqual(Donation.query.all()[0].transaction_id, u'RANDOM-ID')
+        self.assertEqual(Donation.query.all()[0].address_city, u'Сан Хозе')
+        self.assertEqual(PayPalIPN.query.one().status, STATUS_VERIFIED)
+
+    def test_paypal_ipn_duplicate(self):
+        ipn_data = {
+            'txn_id': u'RANDOM-ID',
+            'payment_status': u'Pending',
+        }
+        for _ in range(2):
+            self.assert200(self.client.post(url_for('donations_paypal.ipn'), data=ipn_data))
+        self.assertEqual(PayPalIPN.query.count(), 1)
+
+        # Status of the transaction has changed
+        ipn_data['payment_status'] = u'Completed'
+        self.assert200(self.client.post(url_for('donations_paypal.ipn'), data=ipn_data))
+        self.assertEqual(PayPalIPN.query.count(), 2)
+        self.assertEqual(Job.query.count(), 2)
+
+    def test_paypal_ipn_invalid(self):
+        http_client.paypal_client = FakeSession('INVALID')
+        self.assert200(self.client.post(url_for('donations_paypal.ipn'), data={
+            'txn_id': u'RANDOM-ID',
+            'payment_status': u'Completed',
+        }))
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(PayPalIPN.query.one().status, STATUS_INVALID)
+        self.assertEqual(Donation.query.count(), 0)
+
+    def test_paypal_ipn_verification_error(self):
+        http_client.paypal_client = FakeSession('')
+        self.assert200(self.client.post(url_for('donations_paypal.ipn'), data={
+            'txn_id': u'RANDOM-ID',
+            'payment_status': u'Completed',
+        }))
+        self.assertEqual(jobs.run_pending(), 1)
+        # Verification is retried later
+        job = Job.query.one()
+        self.assertEqual((job.status, job.attempts), (STATUS_PENDING, 1))
+        self.assertIn('VerificationError', job.last_error)
 
     def test_paypal_ipn_without_address(self):
         ipn_data = {
@@ -87,6 +147,7 @@ class DonationsPayPalViewsTestCase(FlaskTestCase):
             data=ipn_data,
         )
         self.assert200(resp)
+        jobs.run_pending()
 
         # Donation should be in the DB now
         self.assertEqual(len(Donation.query.all()), 1)
@@ -3,17 +3,73 @@
 This module contains functions for donation receipt generation and receipt
 sending via email.
 """
-from reportlab.platypus import SimpleDocTemplate, Spacer
+from reportlab.platypus import SimpleDocTemplate, Spacer, Table, TableStyle
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.platypus import Paragraph
 from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
 from metabrainz.mail import send_mail
 from flask import current_app
-import tempfile
+from io import BytesIO
 
 _PRIMARY_FONT = 'Helvetica'
 _PRIMARY_FONT_BOLD = 'Helvetica-Bold'
 
+_PAGE_SIZE = (595, 792)
+
+# Styles are the same in every receipt, so they are created once. Paragraphs
+# keep state while a document is being built, so each document gets new ones.
+_ADDRESS_STYLE = ParagraphStyle("address", fontName=_PRIMARY_FONT, fontSize=12, alignment=TA_RIGHT)
+_NOTE_STYLE = ParagraphStyle("note", fontName=_PRIMARY_FONT, fontSize=12, alignment=TA_LEFT)
+_DETAILS_STYLE = ParagraphStyle("details", fontName=_PRIMARY_FONT, fontSize=12, alignment=TA_CENTER)
+_THANKS_STYLE = ParagraphStyle("thanks", fontName=_PRIMARY_FONT_BOLD, fontSize=20, alignment=TA_CENTER)
+
+_ADDRESS_TEXT = (
+    "3565 South Higuera St., Suite B<br/>"
+    "San Luis Obispo, CA 93401<br/><br/>"
+    "donations@metabrainz.org<br/>"
+    "http://metabrainz.org"
+)
+_NOTE_TEXT = (
+    "%s<br/><br/><br/>"
+    "Dear %s:<br/><br/>"
+    "Thank you very much for your donation to the MetaBrainz Foundation!<br/><br/>"
+    "Your donation will allow the MetaBrainz Foundation to continue operating "
+    "and improving the MusicBrainz project and its related projects. The "
+    "foundation depends on donations from the community and therefore deeply "
+    "appreciates your support.<br/><br/>"
+    "The MetaBrainz Foundation is a United States 501(c)(3) tax-exempt public charity. This "
+    "allows US taxpayers to deduct this donation from their taxes under section 170 of the "
+    "Internal Revenue Service code.<br/><br/>"
+    "<b>Please save a printed copy of this receipt for your records.</b>"
+)
+_DETAILS_TEXT = (
+    "<br/><br/><br/><b>"
+    "Donation date: %s<br/>"
+    "Donation amount: %s<br/>"
+    "Donation editor: %s"
+    "</b>"
+)
+_THANKS_TEXT = "Thank you for your support!"
+
+_STATEMENT_NOTE_TEXT = (
+    "%s<br/><br/><br/>"
+    "Dear %s:<br/><br/>"
+    "Thank you very much for your donations to the MetaBrainz Foundation in %s!<br/><br/>"
+    "This statement lists all donations that we have received from you during that period. "
+    "The MetaBrainz Foundation is a United States 501(c)(3) tax-exempt public charity. This "
+    "allows US taxpayers to deduct these donations from their taxes under section 170 of the "
+    "Internal Revenue Service code.<br/><br/>"
+    "<b>Please save a printed copy of this statement for your records.</b>"
+)
+_STATEMENT_TABLE_STYLE = TableStyle([
+    ('FONT', (0, 0), (-1, -1), _PRIMARY_FONT, 12),
+    ('FONT', (0, 0), (-1, 0), _PRIMARY_FONT_BOLD, 12),
+    ('FONT', (0, -1), (-1, -1), _PRIMARY_FONT_BOLD, 12),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('LINEBELOW', (0, 0), (-1, 0), 1, (0, 0, 0)),
+    ('LINEABOVE', (0, -1), (-1, -1), 1, (0, 0, 0)),
+])
+
 
 def send_receipt(email, date, amount, name, editor_name):
     text = (
@@ -31,7 +87,7 @@ def send_receipt(email, date, amount, name, editor_name):
     send_mail(
         subject='Receipt for your donation to the MetaBrainz Foundation',
         text=text,
-        attachments=[(generate_recript(email, date, amount, name, editor_name),
+        attachments=[(generate_receipt(email, date, amount, name, editor_name),
                       'pdf', 'metabrainz_donation.pdf')],
         recipients=[email],
         from_addr='donations@'+current_app.config['MAIL_FROM_DOMAIN'],
@@ -39,6 +95,31 @@ def send_receipt(email, date, amount, name, editor_name):
     )
 
 
+def send_statement(email, name, period, donations):
+    """Sends a statement with all donations of a donor during some period
+    (see `generate_statement`).
+    """
+    text = (
+        "Dear %s:\n\n"
+        "Thank you very much for your donations to the MetaBrainz Foundation in %s!\n\n"
+        "The attached PDF statement lists all donations that we have received "
+        "from you during that period. The MetaBrainz Foundation is a United "
+        "States 501(c)(3) tax-exempt public charity. This allows US taxpayers to "
+        "deduct these donations from their taxes under section 170 of the "
+        "Internal Revenue Service code.\n\n"
+        "Please save a printed copy of the attached statement for your records."
+    ) % (name, period)
+    send_mail(
+        subject='Statement of your donations to the MetaBrainz Foundation in %s' % period,
+        text=text,
+        attachments=[(generate_statement(email, name, period, donations),
+                      'pdf', 'metabrainz_donations_%s.pdf' % period)],
+        recipients=[email],
+        from_addr='donations@'+current_app.config['MAIL_FROM_DOMAIN'],
+        from_name='Donation Manager',
+    )
+
+
 def _create_header(canvas, document):
     # Adding metadata here just because that's the only place we have access to canvas :/
     canvas.setAuthor("MetaBrainz Foundation Inc.")
@@ -54,72 +135,59 @@ def _create_header(canvas, document):
     canvas.line(52, 695, 550, 695)
 
 
-def generate_recript(email, date, amount, name, editor_name):
+def generate_receipt(email, date, amount, name, editor_name):
     """This function generates PDF file with a receipt.
 
     Returns:
-        Temporary file that needs to be closed after all operations on it are complete.
+        Contents of the PDF file as a byte string.
     """
-    story = [Spacer(0, 20)]
-
-    address_style = ParagraphStyle("address")
-    address_style.fontName = _PRIMARY_FONT
-    address_style.fontSize = 12
-    address_style.alignment = TA_RIGHT
-    address_par = Paragraph(
-        "3565 South Higuera St., Suite B<br/>"
-        "San Luis Obispo, CA 93401<br/><br/>"
-        "donations@metabrainz.org<br/>"
-        "http://metabrainz.org",
-        address_style)
-    story.append(address_par)
-
-    story.append(Spacer(0, 30))
-
-    note_style = ParagraphStyle("note")
-    note_style.fontName = _PRIMARY_FONT
-    note_style.fontSize = 12
-    note_style.alignment = TA_LEFT
-    note_par = Paragraph(
-        "%s<br/><br/><br/>"
-        "Dear %s:<br/><br/>"
-        "Thank you very much for your donation to the MetaBrainz Foundation!<br/><br/>"
-        "Your donation will allow the MetaBrainz Foundation to continue operating "
-        "and improving the MusicBrainz project and its related projects. The "
-        "foundation depends on donations from the community and therefore deeply "
-        "appreciates your support.<br/><br/>"
-        "The MetaBrainz Foundation is a United States 501(c)(3) tax-exempt public charity. This "
-        "allows US taxpayers to deduct this donation from their taxes under section 170 of the "
-        "Internal Revenue Service code.<br/><br/>"
-        "<b>Please save a printed copy of this receipt for your records.</b>"
-        % (email, name),
-        note_style)
-    story.append(note_par)
-
-    details_style = ParagraphStyle("details")
-    details_style.fontName = _PRIMARY_FONT
-    details_style.fontSize = 12
-    details_style.alignment = TA_CENTER
-    details_par = Paragraph(
-        "<br/><br/><br/><b>"
-        "Donation date: %s<br/>"
-        "Donation amount: %s<br/>"
-        "Donation editor: %s"
-        "</b>" % (date, amount, editor_name),
-        details_style)
-    story.append(details_par)
-
-    story.append(Spacer(0, 40))
-
-    thanks_style = ParagraphStyle("thanks")
-    thanks_style.fontName = _PRIMARY_FONT_BOLD
-    thanks_style.fontSize = 20
-    thanks_style.alignment = TA_CENTER
-    thanks_par = Paragraph("Thank you for your support!", thanks_style)
-    story.append(thanks_par)
-
-    file = tempfile.NamedTemporaryFile()
-    doc = SimpleDocTemplate(file.name, pagesize=(595, 792),
+    story = [
+        Spacer(0, 20),
+        Paragraph(_ADDRESS_TEXT, _ADDRESS_STYLE),
+        Spacer(0, 30),
+        Paragraph(_NOTE_TEXT % (email, name), _NOTE_STYLE),
+        Paragraph(_DETAILS_TEXT % (date, amount, editor_name), _DETAILS_STYLE),
+        Spacer(0, 40),
+        Paragraph(_THANKS_TEXT, _THANKS_STYLE),
+    ]
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=_PAGE_SIZE,
+                            leftMargin=52, rightMargin=44)
+    doc.build(story, onFirstPage=_create_header)
+    return buffer.getvalue()
+
+
+def generate_statement(email, name, period, donations):
+    """This function generates PDF file with a statement of donations.
+
+    Args:
+        email: Email address of the donor.
+        name: Name of the donor.
+        period: Description of the period that statement is for (for
+            example, "2015").
+        donations: List of (date, amount) tuples.
+
+    Returns:
+        Contents of the PDF file as a byte string.
+    """
+    rows = [("Donation date", "Amount")]
+    rows.extend((date.strftime("%Y-%m-%d"), "$%.2f" % amount) for date, amount in donations)
+    rows.append(("Total", "$%.2f" % sum(amount for _, amount in donations)))
+
+    story = [
+        Spacer(0, 20),
+        Paragraph(_ADDRESS_TEXT, _ADDRESS_STYLE),
+        Spacer(0, 30),
+        Paragraph(_STATEMENT_NOTE_TEXT % (email, name, period), _NOTE_STYLE),
+        Spacer(0, 30),
+        Table(rows, colWidths=(200, 100), style=_STATEMENT_TABLE_STYLE, repeatRows=1),
+        Spacer(0, 40),
+        Paragraph(_THANKS_TEXT, _THANKS_STYLE),
+    ]
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=_PAGE_SIZE,
                             leftMargin=52, rightMargin=44)
     doc.build(story, onFirstPage=_create_header)
-    return file
+    return buffer.getvalue()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from metabrainz import create_app, mail
+from metabrainz.donations import receipts
+import unittest
+import tempfile
+import mailbox
+import shutil
+import os
+
+
+class ReceiptsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        app = create_app()
+        app.config['TESTING'] = True
+        app.config['MAIL_BACKEND'] = mail.BACKEND_MAILDIR
+        app.config['MAIL_MAILDIR'] = os.path.join(self.temp_dir, 'mail')
+        self.context = app.app_context()
+        self.context.push()
+
+    def tearDown(self):
+        self.context.pop()
+        shutil.rmtree(self.temp_dir)
+
+    def test_generate_receipt(self):
+        pdf = receipts.generate_receipt(u"tester@example.org", u"2015-06-01", u"$42.50",
+                                        u"Tëster", u"tester")
+        self.assertIsInstance(pdf, str)
+        self.assertTrue(pdf.startswith("%PDF-"))
+
+        # Following receipts are generated from scratch too
+        self.assertTrue(receipts.generate_receipt(u"another@example.org", u"2015-06-02", u"$5.00",
+                                                  u"Another", None).startswith("%PDF-"))
+
+    def test_send_receipt(self):
+        receipts.send_receipt(u"tester@example.org", u"2015-06-01", u"$42.50", u"Tester", u"tester")
+        messages = list(mailbox.Maildir(os.path.join(self.temp_dir, 'mail'), factory=None, create=False))
+        self.assertEqual(len(messages), 1)
+        message = messages[0]
+        self.assertEqual(message['Subject'], 'Receipt for your donation to the MetaBrainz Foundation')
+        self.assertIn('donations@', message['From'])
+        text, attachment = message.get_payload()
+        self.assertIn('Dear Tester:', text.get_payload(decode=True))
+        self.assertEqual(attachment.get_filename(), 'metabrainz_donation.pdf')
+        self.assertTrue(attachment.get_payload(decode=True).startswith('%PDF-'))
@@ -2,6 +2,7 @@ from flask import Blueprint, request, current_app, redirect, url_for
 from metabrainz.donations.forms import DonationForm
 from metabrainz.model.donation import Donation
 import stripe
+import logging
 
 donations_stripe_bp = Blueprint('donations_stripe', __name__)
 
@@ -41,6 +42,10 @@ def donate():
     except stripe.CardError:
         # The card has been declined
         return redirect(url_for('donations.error'))
+    except (stripe.APIConnectionError, stripe.APIError) as e:
+        # Stripe can't be reached or is failing (see metabrainz.http_client)
+        logging.warning('Stripe: Failed to create a charge: %s', e)
+        return redirect(url_for('donations.error'))
 
     Donation.log_stripe_charge(charge)
 
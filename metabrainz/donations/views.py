@@ -2,12 +2,16 @@ from __future__ import division
 from flask import Blueprint, request, render_template, url_for, redirect, current_app, flash, jsonify
 from metabrainz.model.donation import Donation
 from metabrainz.donations.forms import DonationForm
+from metabrainz.donations import editors
+from metabrainz.utils import get_remote_addr
 from math import ceil
-import requests
 from requests.exceptions import RequestException
 
 donations_bp = Blueprint('donations', __name__)
 
+# Max number of editors that can be checked in one request
+NAG_CHECK_MAX_EDITORS = 500
+
 
 @donations_bp.route('/donate')
 def index():
@@ -30,7 +34,17 @@ def donors():
 
     order = request.args.get('order', default='date')
     if order == 'date':
-        count, donations = Donation.get_recent_donations(limit=limit, offset=offset)
+        # Links to adjacent pages contain IDs of donations at the edges of
+        # the current page, so they don't need to use an offset.
+        older_than = request.args.get('older_than', type=int)
+        newer_than = request.args.get('newer_than', type=int)
+        if older_than is not None or newer_than is not None:
+            offset = None
+        count, donations = Donation.get_recent_donations(limit=limit, offset=offset,
+                                                         older_than=older_than, newer_than=newer_than)
+        if not donations and offset is None:
+            # Donation that was used as a cursor doesn't exist anymore
+            return redirect(url_for('.donors', page=page))
     elif order == 'amount':
         count, donations = Donation.get_biggest_donations(limit=limit, offset=offset)
     else:
@@ -50,6 +64,36 @@ def nag_check(editor):
     return '%s,%s\n' % (a, b)
 
 
+@donations_bp.route('/donations/nag-check', methods=['GET', 'POST'])
+def nag_check_multi():
+    """Batch version of nag_check endpoint.
+
+    Names of editors can be passed in the query string or form data, either
+    as multiple `editor` arguments or as a comma-separated `editors` argument.
+
+    Returns:
+        One line in "a,b" format (see `nag_check`) for each editor, in the
+        same order as names have been specified. If `format` argument is
+        "json", JSON object with a list of results is returned instead.
+    """
+    editor_names = request.values.getlist('editor')
+    if request.values.get('editors'):
+        editor_names.extend(request.values['editors'].split(','))
+    editor_names = [editor.strip() for editor in editor_names]
+    if not editor_names:
+        return 'No editors specified.\n', 400
+    if len(editor_names) > NAG_CHECK_MAX_EDITORS:
+        return 'Too many editors. Max number is %s.\n' % NAG_CHECK_MAX_EDITORS, 400
+
+    results = Donation.get_nag_days_multi(editor_names)
+    if request.values.get('format') == 'json':
+        return jsonify({'editors': [
+            {'editor': editor, 'nag': results[editor][0], 'days': float(results[editor][1])}
+            for editor in editor_names
+        ]})
+    return ''.join('%s,%s\n' % results[editor] for editor in editor_names)
+
+
 @donations_bp.route('/donate/check-editor/')
 def check_editor():
     """Endpoint for checking if editor exists."""
@@ -58,17 +102,14 @@ def check_editor():
         return jsonify({'error': 'Editor not specified.'}), 400
 
     try:
-        resp = requests.get(current_app.config['MUSICBRAINZ_BASE_URL'] +
-                            'ws/js/editor/?q=' + request.args.get('q')).json()
-    except RequestException as e:
-        return jsonify({'error': e})
-
-    found = False
-    for item in resp:
-        if 'name' in item:
-            if item['name'].lower() == editor.lower():
-                found = True
-                break
+        # Gateway header might be missing, in which case all clients would
+        # share the same limit.
+        editors.check_rate_limit(get_remote_addr() or request.remote_addr)
+        found = editors.editor_exists(editor)
+    except editors.RateLimitExceeded as e:
+        return jsonify({'error': unicode(e)}), 429
+    except (RequestException, ValueError) as e:
+        return jsonify({'error': unicode(e)})
 
     return jsonify({
         'editor': editor,
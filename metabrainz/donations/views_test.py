@@ -1,5 +1,17 @@
 from metabrainz.testing import FlaskTestCase
+from metabrainz.model.donation import Donation
+from metabrainz.model import db, donation
 from flask import url_for
+import time
+
+
+class FrozenTime(object):
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
 
 
 class DonationsViewsTestCase(FlaskTestCase):
@@ -10,3 +22,42 @@ class DonationsViewsTestCase(FlaskTestCase):
     def test_donors(self):
         response = self.client.get(url_for('donations.donors'))
         self.assert200(response)
+
+    def test_donors_cursor(self):
+        for i in range(35):
+            db.session.add(Donation(first_name=u'Tester', last_name=unicode(i),
+                                    email=u'test@example.org', amount=10))
+        db.session.commit()
+        first_page = Donation.get_recent_donations(limit=30)[1]
+        response = self.client.get(url_for('donations.donors', page=2, older_than=first_page[-1].id))
+        self.assert200(response)
+        self.assertEqual(len(response.data.split('<td>$10.00</td>')) - 1, 5)
+
+        # Cursor that doesn't exist
+        response = self.client.get(url_for('donations.donors', page=2, older_than=0))
+        self.assertRedirects(response, url_for('donations.donors', page=2))
+
+    def test_nag_check_multi(self):
+        db.session.add(Donation(first_name=u'Tester', last_name=u'Testing', email=u'test@example.org',
+                                editor_name=u'Tester', amount=10))
+        db.session.commit()
+
+        # Number of days depends on current time, which is the same for both calls
+        original_time = donation.time
+        donation.time = FrozenTime()
+        try:
+            response = self.client.get(url_for('donations.nag_check_multi', editors='nobody,tester'))
+            self.assert200(response)
+            lines = response.data.splitlines()
+            self.assertEqual(lines[0], '-1,0')
+            self.assertEqual(lines[1], '%s,%s' % Donation.get_nag_days(u'tester'))
+        finally:
+            donation.time = original_time
+
+        response = self.client.post(url_for('donations.nag_check_multi', format='json'),
+                                    data={'editor': [u'TESTER', u'nobody']})
+        self.assert200(response)
+        self.assertEqual([(r['editor'], r['nag']) for r in response.json['editors']],
+                         [(u'TESTER', 0), (u'nobody', -1)])
+
+        self.assert400(self.client.get(url_for('donations.nag_check_multi')))
@@ -1,8 +1,10 @@
 from metabrainz.donations import forms
 from flask import Blueprint, request, url_for, redirect, current_app
 from werkzeug.exceptions import BadRequest, InternalServerError
-from wepay import WePay
+from metabrainz.http_client import WePay
 from metabrainz.model.donation import Donation
+import requests
+import logging
 
 donations_wepay_bp = Blueprint('donations_wepay', __name__)
 
@@ -63,7 +65,11 @@ def donate():
         params['type'] = 'DONATION'
         params['short_description'] = 'Donation to MetaBrainz Foundation'
 
-    response = wepay.call('/%s/create' % operation_type, params)
+    try:
+        response = wepay.call('/%s/create' % operation_type, params)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.warning('WePay: Failed to create %s: %s', operation_type, e)
+        return redirect(url_for('donations.error'))
 
     if 'error' in response:
         return redirect(url_for('donations.error'))
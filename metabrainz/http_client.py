@@ -0,0 +1,252 @@
+"""
+Outbound HTTP requests to payment providers and MusicBrainz.
+
+Each provider has its own `Client` with a pool of keep-alive connections,
+default timeouts, latency histogram, and a circuit breaker. After a number of
+consecutive failures (connection errors, timeouts, or 5xx responses) the
+breaker opens and requests fail immediately with `CircuitOpenError` instead
+of tying up a worker until they time out. Once `reset_timeout` passes, a
+single trial request is let through; the breaker closes again if it succeeds.
+
+`CircuitOpenError` is a subclass of `requests.exceptions.ConnectionError`, so
+code that handles unreachable providers doesn't need to treat it specially.
+
+Statistics and breaker states are kept separately in each process (see
+`get_stats`).
+"""
+from stripe import http_client as stripe_http_client
+import wepay
+import requests
+import threading
+import logging
+import json
+import time
+import os
+
+# Upper bounds of latency histogram buckets in milliseconds. The last bucket
+# counts everything else.
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30  # seconds
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half-open'
+
+_clients = {}  # name -> Client
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Request hasn't been sent because the provider is considered down."""
+    pass
+
+
+class CircuitBreaker(object):
+    """Tracks consecutive failures of requests to a provider.
+
+    Args:
+        failure_threshold: Number of consecutive failures after which the
+            breaker opens.
+        reset_timeout: Number of seconds after which an open breaker lets
+            a trial request through. Another trial is let through if the
+            previous one doesn't finish within this time.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Checks if a request can be sent now."""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            # Another trial is let through if the outcome of the previous one
+            # hasn't been recorded in time
+            if self.state in (STATE_OPEN, STATE_HALF_OPEN) and \
+                    time.time() - self.opened_at >= self.reset_timeout:
+                self.state = STATE_HALF_OPEN  # only this request is let through until it finishes
+                self.opened_at = time.time()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = STATE_CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        """Records a failure.
+
+        Returns:
+            True if the breaker has been opened because of it.
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == STATE_HALF_OPEN or \
+                    (self.state == STATE_CLOSED and self.failures >= self.failure_threshold):
+                self.state = STATE_OPEN
+                self.opened_at = time.time()
+                return True
+            return False
+
+
+class Client(object):
+    """HTTP client for a single provider.
+
+    Args:
+        name: Name of the provider (used in statistics and logs).
+        timeout: Default timeout of requests: number of seconds or a tuple
+            with connect and read timeouts.
+        pool_size: Max number of connections that are kept open to each host.
+        failure_threshold: See `CircuitBreaker`.
+        reset_timeout: See `CircuitBreaker`.
+    """
+
+    def __init__(self, name, timeout, pool_size=DEFAULT_POOL_SIZE,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.counters = _empty_counters()
+        _clients[name] = self
+
+    def request(self, method, url, **kwargs):
+        """Sends a request. Accepts the same arguments as `requests.request`.
+
+        Responses with 5xx status codes are returned, but they count as
+        failures of the provider.
+
+        Raises:
+            CircuitOpenError if the provider has failed too many times
+            recently, or any other `requests.exceptions.RequestException`.
+        """
+        if not self.breaker.allow():
+            self.counters['rejected'] += 1
+            raise CircuitOpenError("Requests to %s are suspended after repeated failures." % self.name)
+
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        start = time.time()
+        failed = True  # any exception counts as a failure, so a trial request is always recorded
+        try:
+            response = self.session.request(method, url, **kwargs)
+            failed = response.status_code >= 500
+        finally:
+            self._record(start, failed)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+    def get_stats(self):
+        stats = dict(self.counters)
+        stats['latency'] = list(self.counters['latency'])
+        stats['state'] = self.breaker.state
+        return stats
+
+    def _record(self, start, failed):
+        latency = time.time() - start
+        self.counters['calls'] += 1
+        self.counters['time'] += latency
+        self.counters['latency'][_bucket_index(latency * 1000)] += 1
+        if failed:
+            self.counters['errors'] += 1
+            if self.breaker.record_failure():
+                logging.error("Too many failed requests to %s, suspending them for %s seconds.",
+                              self.name, self.breaker.reset_timeout)
+        else:
+            self.breaker.record_success()
+
+
+def get_stats():
+    """Returns statistics of requests sent by the current process.
+
+    Returns:
+        Dictionary with provider names as keys. Values are dictionaries with
+        "calls", "errors", "rejected" (by the circuit breaker) counters, total
+        "time" in seconds, "latency" histogram (see `LATENCY_BUCKETS`), and
+        "state" of the circuit breaker.
+    """
+    return dict((name, client.get_stats()) for name, client in _clients.iteritems())
+
+
+def _empty_counters():
+    return {
+        'calls': 0,
+        'errors': 0,
+        'rejected': 0,
+        'time': 0.0,
+        'latency': [0] * (len(LATENCY_BUCKETS) + 1),
+    }
+
+
+def _bucket_index(latency_ms):
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if latency_ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS)
+
+
+paypal_client = Client('paypal', timeout=(5, 30), pool_size=4)
+stripe_client = Client('stripe', timeout=(5, 30))
+wepay_client = Client('wepay', timeout=(5, 30))
+musicbrainz_client = Client('musicbrainz', timeout=(2, 5))
+
+
+class _StripeHTTPClient(stripe_http_client.RequestsClient):
+    """Sends requests of the Stripe library through `stripe_client`.
+
+    Errors are converted into `stripe.APIConnectionError` by the library.
+    """
+    name = 'metabrainz'
+
+    def request(self, method, url, headers, post_data=None):
+        if self._verify_ssl_certs:
+            verify = os.path.join(os.path.dirname(stripe_http_client.__file__), 'data/ca-certificates.crt')
+        else:
+            verify = False
+        try:
+            response = stripe_client.request(method, url, headers=headers, data=post_data, verify=verify)
+            return response.content, response.status_code
+        except Exception as e:
+            self._handle_request_error(e)
+
+
+# Stripe library creates a new HTTP client for every API call and doesn't
+# allow to specify a default one, so its factory is replaced.
+stripe_http_client.new_default_http_client = _StripeHTTPClient
+
+
+class WePay(wepay.WePay):
+    """WePay API client that sends requests through `wepay_client`.
+
+    Unlike the original, it doesn't hide errors of requests: the original
+    fails with a NameError when WePay can't be reached.
+    """
+
+    def call(self, uri, params=None, token=None):
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'WePay Python SDK',
+        }
+        if self.access_token or token:
+            headers['Authorization'] = 'Bearer ' + (token or self.access_token)
+        if self.api_version:
+            headers['Api-Version'] = self.api_version
+        response = wepay_client.post(self.api_endpoint + uri, data=json.dumps(params) if params else None,
+                                     headers=headers)
+        return response.json()
@@ -0,0 +1,113 @@
+from unittest import TestCase
+from metabrainz import http_client
+from metabrainz.http_client import Client, CircuitOpenError, STATE_CLOSED, STATE_OPEN
+import requests
+import stripe
+
+
+class FakeAdapter(requests.adapters.BaseAdapter):
+    """Transport adapter that returns responses with given status codes or
+    raises errors without sending anything.
+    """
+
+    def __init__(self):
+        super(FakeAdapter, self).__init__()
+        self.results = []
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append((request, kwargs))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        response = requests.Response()
+        response.status_code = result
+        response._content = '{}'
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class HTTPClientTestCase(TestCase):
+
+    def setUp(self):
+        self.client = Client('test', timeout=(1, 2), failure_threshold=2, reset_timeout=60)
+        self.adapter = FakeAdapter()
+        self.client.session.mount('https://', self.adapter)
+
+    def test_request(self):
+        self.adapter.results = [200, 200]
+        self.assertEqual(self.client.get('https://example.org/').status_code, 200)
+        self.assertEqual(self.adapter.requests[0][1]['timeout'], (1, 2))  # default timeout
+        self.client.post('https://example.org/', data='test', timeout=5)
+        self.assertEqual(self.adapter.requests[1][1]['timeout'], 5)
+
+        stats = http_client.get_stats()['test']
+        self.assertEqual((stats['calls'], stats['errors']), (2, 0))
+        self.assertEqual(sum(stats['latency']), 2)
+
+    def test_circuit_breaker(self):
+        self.adapter.results = [503, requests.exceptions.Timeout()]
+        self.assertEqual(self.client.get('https://example.org/').status_code, 503)
+        self.assertEqual(self.client.breaker.state, STATE_CLOSED)
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.client.get('https://example.org/')
+        self.assertEqual(self.client.breaker.state, STATE_OPEN)
+
+        # Requests fail without being sent
+        with self.assertRaises(CircuitOpenError):
+            self.client.get('https://example.org/')
+        self.assertEqual(len(self.adapter.requests), 2)
+        self.assertEqual(self.client.get_stats()['rejected'], 1)
+
+        # Trial request is let through after reset timeout
+        self.client.breaker.opened_at -= 60
+        self.adapter.results = [503, 200]
+        self.client.get('https://example.org/')
+        self.assertEqual(self.client.breaker.state, STATE_OPEN)  # failed again
+        self.client.breaker.opened_at -= 60
+        self.client.get('https://example.org/')
+        self.assertEqual(self.client.breaker.state, STATE_CLOSED)
+
+    def test_trial_with_unexpected_error(self):
+        self.adapter.results = [500, 500]
+        for _ in range(2):
+            self.client.get('https://example.org/')
+        self.assertEqual(self.client.breaker.state, STATE_OPEN)
+
+        self.client.breaker.opened_at -= 60
+        self.adapter.results = [ValueError("Unexpected error"), 200]
+        with self.assertRaises(ValueError):
+            self.client.get('https://example.org/')
+        self.assertEqual(self.client.breaker.state, STATE_OPEN)  # not stuck in half-open state
+        self.client.breaker.opened_at -= 60
+        self.client.get('https://example.org/')
+        self.assertEqual(self.client.breaker.state, STATE_CLOSED)
+
+    def test_half_open_expires(self):
+        self.client.breaker.record_failure()
+        self.client.breaker.record_failure()
+        self.client.breaker.opened_at -= 60
+        self.assertTrue(self.client.breaker.allow())
+        self.assertFalse(self.client.breaker.allow())  # trial is in progress
+        self.client.breaker.opened_at -= 60  # its outcome was never recorded
+        self.assertTrue(self.client.breaker.allow())
+
+    def test_failures_are_consecutive(self):
+        self.adapter.results = [500, 200, 500, 200]
+        for _ in range(4):
+            self.client.get('https://example.org/')
+        self.assertEqual(self.client.breaker.state, STATE_CLOSED)
+
+    def test_stripe(self):
+        original_client = http_client.stripe_client
+        http_client.stripe_client = self.client
+        try:
+            self.adapter.results = [requests.exceptions.ConnectionError()]
+            with self.assertRaises(stripe.APIConnectionError):
+                stripe.Charge.retrieve('ch_test', api_key='sk_test')
+            self.assertIn('/v1/charges/ch_test', self.adapter.requests[0][0].url)
+        finally:
+            http_client.stripe_client = original_client
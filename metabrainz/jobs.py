@@ -0,0 +1,213 @@
+"""
+This module provides a durable queue of background jobs.
+
+Jobs are stored in the database, so they can be added in the same transaction
+as data they refer to and aren't lost if a worker stops. Workers (see
+`manage.py worker` command) lock jobs one at a time with SELECT ... FOR UPDATE
+SKIP LOCKED, so multiple workers can process the queue without getting the
+same job. If a worker dies while performing a job, its transaction is rolled
+back and the job becomes available again.
+
+Failed jobs are retried with exponential backoff. Jobs that fail too many
+times are marked as dead and stay in the database until they are retried
+manually (see `retry_dead`).
+
+Each type of job needs a handler, which is registered with `handler`
+decorator. Handlers receive job payload as keyword arguments:
+
+    @jobs.handler('send_receipt')
+    def send_receipt(donation_id):
+        ...
+
+    jobs.enqueue('send_receipt', {'donation_id': donation.id})
+    db.session.commit()
+"""
+from metabrainz.model import db
+from metabrainz.model.job import Job, STATUS_PENDING, STATUS_DEAD
+from datetime import datetime, timedelta
+import multiprocessing
+import traceback
+import logging
+import random
+import json
+import pytz
+import time
+
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_POLL_INTERVAL = 1  # seconds
+
+# Delay before the first retry. It's doubled after each failed attempt.
+RETRY_DELAY = 30  # seconds
+MAX_RETRY_DELAY = 60 * 60 * 6  # seconds
+
+_handlers = {}
+
+
+def handler(job_type):
+    """Decorator that registers handler of a job type."""
+    def decorator(f):
+        _handlers[job_type] = f
+        return f
+    return decorator
+
+
+def enqueue(job_type, payload=None, delay=0, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Adds a job to the queue.
+
+    Job is added to the current database session, so it is stored only when
+    the session is committed.
+
+    Args:
+        job_type: Type of the job (see `handler`).
+        payload: Dictionary with arguments of the handler. Must be JSON
+            serializable.
+        delay: Number of seconds after which job can be performed.
+        max_attempts: Number of failed attempts after which job is marked as
+            dead.
+
+    Returns:
+        Job object.
+    """
+    job = Job(
+        type=job_type,
+        payload=payload or {},
+        run_at=datetime.now(pytz.utc) + timedelta(seconds=delay),
+        max_attempts=max_attempts,
+    )
+    db.session.add(job)
+    return job
+
+
+def enqueue_many(job_type, payloads, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Adds multiple jobs of the same type to the queue with a single
+    statement. Unlike `enqueue`, job objects are not created.
+
+    Args:
+        job_type: Type of the jobs (see `handler`).
+        payloads: List of payloads (one for each job).
+        max_attempts: Number of failed attempts after which job is marked as
+            dead.
+    """
+    if not payloads:
+        return
+    db.session.execute(
+        "INSERT INTO job (type, payload, status, created, run_at, attempts, max_attempts) "
+        "SELECT :type, CAST(payload AS json), :status, now(), now(), 0, :max_attempts "
+        "FROM unnest(CAST(:payloads AS text[])) AS payload",
+        {
+            'type': job_type,
+            'payloads': [json.dumps(payload) for payload in payloads],
+            'status': STATUS_PENDING,
+            'max_attempts': max_attempts,
+        }
+    )
+
+
+def process_next():
+    """Performs the next pending job.
+
+    Returns:
+        True if a job has been processed (successfully or not), False if
+        there are no jobs to perform.
+    """
+    job = Job.lock_next()
+    if job is None:
+        db.session.rollback()
+        return False
+
+    try:
+        job_handler = _handlers[job.type]
+        with db.session.begin_nested():  # changes made by the handler are discarded if it fails
+            job_handler(**job.payload)
+    except Exception:
+        job.attempts += 1
+        job.last_error = traceback.format_exc().decode('utf-8', 'replace')
+        if job.attempts >= job.max_attempts:
+            job.status = STATUS_DEAD
+            logging.exception("Job #%s (%s) failed and is dead after %s attempts.", job.id, job.type, job.attempts)
+        else:
+            job.run_at = datetime.now(pytz.utc) + timedelta(seconds=_get_retry_delay(job.attempts))
+            logging.warning("Job #%s (%s) failed, will be retried at %s.", job.id, job.type, job.run_at,
+                            exc_info=True)
+    else:
+        db.session.delete(job)
+    db.session.commit()
+    return True
+
+
+def run_pending():
+    """Performs all pending jobs that are due in the current process.
+
+    Returns:
+        Number of processed jobs.
+    """
+    count = 0
+    while process_next():
+        count += 1
+    return count
+
+
+def run_worker(poll_interval=DEFAULT_POLL_INTERVAL):
+    """Performs jobs until the process is stopped."""
+    logging.info("Worker started.")
+    while True:
+        try:
+            if not process_next():
+                time.sleep(poll_interval)
+        except Exception:
+            # Database errors shouldn't stop the worker
+            logging.exception("Failed to process jobs.")
+            db.session.rollback()
+            time.sleep(poll_interval)
+
+
+def run_workers(app_factory, concurrency=1, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Starts multiple worker processes and waits for them.
+
+    Args:
+        app_factory: Function that creates an application, which is used in
+            each worker process.
+        concurrency: Number of worker processes.
+        poll_interval: Number of seconds to wait when there are no jobs.
+    """
+    processes = [multiprocessing.Process(target=_worker_process, args=(app_factory, poll_interval))
+                 for _ in range(concurrency)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+def retry_dead():
+    """Makes dead jobs pending again.
+
+    Returns:
+        Number of jobs that will be retried.
+    """
+    count = Job.query.filter_by(status=STATUS_DEAD).update({
+        'status': STATUS_PENDING,
+        'attempts': 0,
+        'run_at': datetime.now(pytz.utc),
+    })
+    db.session.commit()
+    return count
+
+
+def _worker_process(app_factory, poll_interval):
+    with app_factory().app_context():
+        try:
+            run_worker(poll_interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def _get_retry_delay(attempts):
+    """Returns number of seconds before the next attempt (with some jitter,
+    so that jobs that failed together aren't retried together).
+    """
+    delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    return delay * random.uniform(0.8, 1.2)
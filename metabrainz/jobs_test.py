@@ -0,0 +1,56 @@
+from metabrainz.testing import FlaskTestCase
+from metabrainz.model.job import Job, STATUS_DEAD, STATUS_PENDING
+from metabrainz.model import db
+from metabrainz import jobs
+
+
+class JobsTestCase(FlaskTestCase):
+
+    def setUp(self):
+        super(JobsTestCase, self).setUp()
+        self.calls = []
+
+        @jobs.handler('test')
+        def test_handler(value, fail=False):
+            self.calls.append(value)
+            if fail:
+                raise ValueError("Failing on purpose")
+
+    def test_process(self):
+        jobs.enqueue('test', {'value': 1})
+        jobs.enqueue('test', {'value': 2})
+        db.session.commit()
+        self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual(self.calls, [1, 2])
+        self.assertEqual(Job.query.count(), 0)
+        self.assertFalse(jobs.process_next())
+
+    def test_delay(self):
+        jobs.enqueue('test', {'value': 1}, delay=60)
+        db.session.commit()
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_retry(self):
+        jobs.enqueue('test', {'value': 1, 'fail': True}, max_attempts=2)
+        db.session.commit()
+        self.assertEqual(jobs.run_pending(), 1)
+        job = Job.query.one()
+        self.assertEqual(job.status, STATUS_PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("Failing on purpose", job.last_error)
+
+        # Making it due again
+        job.run_at = db.func.now()
+        db.session.commit()
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(Job.query.one().status, STATUS_DEAD)
+        self.assertEqual(jobs.run_pending(), 0)
+
+        self.assertEqual(jobs.retry_dead(), 1)
+        self.assertEqual(Job.query.one().status, STATUS_PENDING)
+
+    def test_unknown_type(self):
+        jobs.enqueue('missing')
+        db.session.commit()
+        jobs.run_pending()
+        self.assertEqual(Job.query.one().attempts, 1)
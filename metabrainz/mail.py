@@ -1,10 +1,52 @@
 # -*- coding: utf-8 -*-
-"""This module provides a way to send emails."""
+"""
+This module provides a way to send emails.
+
+Messages are handed over to a transport that is selected with MAIL_BACKEND
+configuration option:
+
+- "smtp": Messages are sent to the SMTP server from the configuration.
+  Connections are kept in a pool and reused by following messages until they
+  have been idle for SMTP_IDLE_TIMEOUT seconds. If the server has closed a
+  connection in the meantime, message is sent again over a new one.
+- "maildir": Messages are stored in a Maildir directory (MAIL_MAILDIR)
+  instead of being sent. Useful for development and tests.
+- "null": Messages are discarded. This is the default when the application
+  is in testing mode (TESTING), so tests never send any emails.
+
+Each process keeps its own transport and statistics (see `get_stats`).
+"""
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from flask import current_app
+import threading
+import mailbox
 import smtplib
+import socket
+import time
+import os
+
+BACKEND_SMTP = 'smtp'
+BACKEND_MAILDIR = 'maildir'
+BACKEND_NULL = 'null'
+
+# Upper bounds of latency histogram buckets in milliseconds. The last bucket
+# counts everything else.
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Errors that are caused by a specific message. Connection can still be used
+# to send other messages after them.
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+_stats = {
+    'sent': 0,
+    'errors': 0,
+    'connects': 0,
+    'reconnects': 0,
+    'time': 0.0,
+    'latency': [0] * (len(LATENCY_BUCKETS) + 1),
+}
 
 
 def send_mail(subject, text, recipients, attachments=None,
@@ -16,34 +58,267 @@ def send_mail(subject, text, recipients, attachments=None,
         subject: Subject of the message.
         message: The message itself.
         recipients: List of recipients.
-        attachments: List of (file object, subtype, name) tuples. For example:
-            (<file_obj>, 'pdf', 'receipt.pdf').
+        attachments: List of (data, subtype, name) tuples, where data is a
+            byte string or a file object (closed after it's read). For example:
+            (<pdf_bytes>, 'pdf', 'receipt.pdf').
         from_name: Name of the sender.
         from_addr: Email address of the sender.
     """
+    if not recipients:
+        return
+    error = send_many([create_message(subject, text, recipients, attachments, from_name, from_addr)])[0]
+    if error is not None:
+        raise error
+
+
+def send_many(messages):
+    """Sends multiple messages over the same connection.
+
+    Args:
+        messages: List of messages created with `create_message`.
+
+    Returns:
+        List with None for each message that has been sent, or an exception
+        if the message has been rejected by the server.
+
+    Raises:
+        smtplib.SMTPException or socket.error if the server can't be reached.
+        Some of the messages might have been sent in that case.
+    """
+    if not messages:
+        return []
+    return get_transport().send(messages)
+
+
+def create_message(subject, text, recipients, attachments=None,
+                   from_name="MetaBrainz Notifications",
+                   from_addr=None):
+    """Creates a message that can be sent with `send_many`.
+
+    Arguments are the same as in `send_mail`.
+
+    Returns:
+        Tuple with sender's address, list of recipients, and the message
+        itself as a string.
+    """
     if attachments is None:
         attachments = []
     if from_addr is None:
         from_addr = 'noreply@' + current_app.config['MAIL_FROM_DOMAIN']
 
-    if current_app.config['TESTING']:  # Not sending any emails during the testing process
-        return
-
-    if not recipients:
-        return
-
     message = MIMEMultipart('mixed')
     message['Subject'] = subject
     message['From'] = "%s <%s>" % (from_name, from_addr)
     message.attach(MIMEText(text, _charset='utf-8'))
 
     for attachment in attachments:
-        file_obj, subtype, name = attachment
-        attachment = MIMEApplication(file_obj.read(), _subtype=subtype)
-        file_obj.close()  # FIXME(roman): This feels kind of hacky. Maybe there's a better way?
+        data, subtype, name = attachment
+        if hasattr(data, 'read'):
+            file_obj, data = data, data.read()
+            file_obj.close()
+        attachment = MIMEApplication(data, _subtype=subtype)
         attachment.add_header('content-disposition', 'attachment', filename=name)
         message.attach(attachment)
 
-    smtp_server = smtplib.SMTP(current_app.config['SMTP_SERVER'], current_app.config['SMTP_PORT'])
-    smtp_server.sendmail(from_addr, recipients, message.as_string())
-    smtp_server.quit()
+    return from_addr, recipients, message.as_string()
+
+
+def get_transport():
+    """Returns transport of the current application (see module description)."""
+    transport = current_app.extensions.get('mail_transport')
+    if transport is None:
+        transport = _create_transport(current_app.config)
+        current_app.extensions['mail_transport'] = transport
+    return transport
+
+
+def close():
+    """Closes connections that are kept open by the current application."""
+    transport = current_app.extensions.get('mail_transport')
+    if transport is not None:
+        transport.close()
+
+
+def get_stats():
+    """Returns statistics of messages sent by the current process.
+
+    Returns:
+        Dictionary with "sent", "errors", "connects", and "reconnects"
+        (after connection has been closed by the server) counters, total "time"
+        spent sending messages in seconds, and "latency" histogram of each
+        message (see `LATENCY_BUCKETS`).
+    """
+    stats = dict(_stats)
+    stats['latency'] = list(_stats['latency'])
+    return stats
+
+
+class SMTPTransport(object):
+    """Sends messages to an SMTP server, reusing connections.
+
+    Args:
+        server: Host name of the server.
+        port: Port of the server.
+        username: User name for authentication (optional).
+        password: Password for authentication.
+        use_tls: Whether STARTTLS needs to be used.
+        timeout: Number of seconds after which socket operations fail.
+        idle_timeout: Number of seconds after which unused connections are
+            closed instead of being reused. Should be lower than the timeout
+            of the server.
+        pool_size: Max number of idle connections that are kept open.
+    """
+
+    def __init__(self, server, port, username=None, password=None, use_tls=False,
+                 timeout=30, idle_timeout=60, pool_size=4):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.pool_size = pool_size
+        self._pool = []  # (connection, time when it was last used)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def send(self, messages):
+        connection = self._checkout()
+        results = []
+        try:
+            for from_addr, recipients, message in messages:
+                start = time.time()
+                try:
+                    try:
+                        connection.sendmail(from_addr, recipients, message)
+                    except (smtplib.SMTPServerDisconnected, socket.error):
+                        # Server might have closed the connection after we last used it
+                        _stats['reconnects'] += 1
+                        _quit(connection)
+                        connection = None
+                        connection = self._connect()
+                        connection.sendmail(from_addr, recipients, message)
+                except _MESSAGE_ERRORS as e:
+                    _record(start, failed=True)
+                    results.append(e)
+                    continue
+                except Exception:
+                    _record(start, failed=True)
+                    raise
+                _record(start)
+                results.append(None)
+        except Exception:
+            if connection is not None:
+                _quit(connection)
+            raise
+        self._checkin(connection)
+        return results
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, []
+        for connection, _ in pool:
+            _quit(connection)
+
+    def _checkout(self):
+        expired = []
+        connection = None
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connections of the parent process can't be shared with it
+                self._pool, self._pid = [], os.getpid()
+            while self._pool:
+                candidate, last_used = self._pool.pop()
+                if time.time() - last_used < self.idle_timeout:
+                    connection = candidate
+                    break
+                expired.append(candidate)
+        for candidate in expired:
+            _quit(candidate)
+        return connection or self._connect()
+
+    def _checkin(self, connection):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._pool) < self.pool_size:
+                self._pool.append((connection, time.time()))
+                return
+        _quit(connection)
+
+    def _connect(self):
+        _stats['connects'] += 1
+        connection = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+            connection.ehlo()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+
+class MaildirTransport(object):
+    """Stores messages in a Maildir directory instead of sending them."""
+
+    def __init__(self, path):
+        self.mailbox = mailbox.Maildir(path, factory=None, create=True)
+
+    def send(self, messages):
+        for _, _, message in messages:
+            start = time.time()
+            self.mailbox.add(message)
+            _record(start)
+        return [None] * len(messages)
+
+    def close(self):
+        pass
+
+
+class NullTransport(object):
+    """Discards messages."""
+
+    def send(self, messages):
+        return [None] * len(messages)
+
+    def close(self):
+        pass
+
+
+def _create_transport(config):
+    backend = config.get('MAIL_BACKEND')
+    if backend is None:
+        backend = BACKEND_NULL if config.get('TESTING') else BACKEND_SMTP
+    if backend == BACKEND_SMTP:
+        return SMTPTransport(
+            config['SMTP_SERVER'],
+            config['SMTP_PORT'],
+            username=config.get('SMTP_USERNAME'),
+            password=config.get('SMTP_PASSWORD'),
+            use_tls=config.get('SMTP_USE_TLS', False),
+            timeout=config.get('SMTP_TIMEOUT', 30),
+            idle_timeout=config.get('SMTP_IDLE_TIMEOUT', 60),
+            pool_size=config.get('SMTP_POOL_SIZE', 4),
+        )
+    if backend == BACKEND_MAILDIR:
+        return MaildirTransport(config['MAIL_MAILDIR'])
+    if backend == BACKEND_NULL:
+        return NullTransport()
+    raise ValueError("Unknown mail backend: %s" % backend)
+
+
+def _quit(connection):
+    try:
+        connection.quit()
+    except (smtplib.SMTPException, socket.error):
+        connection.close()
+
+
+def _record(start, failed=False):
+    latency = time.time() - start
+    _stats['errors' if failed else 'sent'] += 1
+    _stats['time'] += latency
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if latency * 1000 <= bound:
+            _stats['latency'][i] += 1
+            break
+    else:
+        _stats['latency'][-1] += 1
@@ -0,0 +1,98 @@
+from metabrainz.testing import FlaskTestCase
+from metabrainz import mail
+from flask import current_app
+import mailbox
+import smtplib
+import tempfile
+import shutil
+import os
+
+
+class FakeSMTP(object):
+    """SMTP connection that records messages instead of sending them."""
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.messages = []
+        self.closed = False
+        self.disconnect = False  # simulates connection closed by the server
+        FakeSMTP.instances.append(self)
+
+    def sendmail(self, from_addr, recipients, message):
+        if self.disconnect:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        if 'refused@example.org' in recipients:
+            raise smtplib.SMTPRecipientsRefused({'refused@example.org': (550, 'No such user')})
+        self.messages.append((from_addr, recipients, message))
+
+    def quit(self):
+        self.closed = True
+
+
+class MailTestCase(FlaskTestCase):
+
+    def setUp(self):
+        super(MailTestCase, self).setUp()
+        self.original_smtp = smtplib.SMTP
+        smtplib.SMTP = FakeSMTP
+        FakeSMTP.instances = []
+        self.transport = mail.SMTPTransport('localhost', 25, idle_timeout=60)
+
+    def tearDown(self):
+        smtplib.SMTP = self.original_smtp
+        super(MailTestCase, self).tearDown()
+
+    def _message(self, recipient=u'test@example.org'):
+        return mail.create_message(u'Test', u'Test message', [recipient])
+
+    def test_connection_reuse(self):
+        self.assertEqual(self.transport.send([self._message(), self._message()]), [None, None])
+        self.transport.send([self._message()])
+        self.assertEqual(len(FakeSMTP.instances), 1)
+        self.assertEqual(len(FakeSMTP.instances[0].messages), 3)
+
+        self.transport.close()
+        self.assertTrue(FakeSMTP.instances[0].closed)
+
+    def test_idle_timeout(self):
+        self.transport.send([self._message()])
+        self.transport._pool[0] = (self.transport._pool[0][0], self.transport._pool[0][1] - 60)
+        self.transport.send([self._message()])
+        self.assertEqual(len(FakeSMTP.instances), 2)
+        self.assertTrue(FakeSMTP.instances[0].closed)
+
+    def test_reconnect(self):
+        self.transport.send([self._message()])
+        FakeSMTP.instances[0].disconnect = True
+        self.assertEqual(self.transport.send([self._message()]), [None])
+        self.assertEqual(len(FakeSMTP.instances[1].messages), 1)
+
+    def test_rejected_message(self):
+        results = self.transport.send([self._message(u'refused@example.org'), self._message()])
+        self.assertIsInstance(results[0], smtplib.SMTPRecipientsRefused)
+        self.assertIsNone(results[1])
+        self.assertEqual(len(FakeSMTP.instances[0].messages), 1)
+        self.assertGreaterEqual(mail.get_stats()['errors'], 1)
+
+    def test_maildir(self):
+        path = tempfile.mkdtemp()
+        try:
+            current_app.config['MAIL_BACKEND'] = mail.BACKEND_MAILDIR
+            current_app.config['MAIL_MAILDIR'] = os.path.join(path, 'mail')  # created automatically
+            current_app.extensions.pop('mail_transport', None)
+            mail.send_mail(u'Test', u'Test message', [u'test@example.org'],
+                           attachments=[('data', 'pdf', 'test.pdf')])
+            mail.send_mail(u'Test', u'Test message', [])  # not sent
+            messages = list(mailbox.Maildir(os.path.join(path, 'mail'), factory=None, create=False))
+            self.assertEqual(len(messages), 1)
+            self.assertIsNone(messages[0]['To'])  # recipients are only in the envelope
+            self.assertEqual(messages[0].get_payload()[1].get_filename(), 'test.pdf')
+        finally:
+            shutil.rmtree(path)
+
+    def test_default_backend(self):
+        current_app.config['MAIL_BACKEND'] = None
+        current_app.extensions.pop('mail_transport', None)
+        self.assertIsInstance(mail.get_transport(), mail.NullTransport)  # in testing mode
+        current_app.config['TESTING'] = False
+        self.assertIsInstance(mail._create_transport(current_app.config), mail.SMTPTransport)
@@ -9,3 +9,7 @@ from .token_log import TokenLog
 from .access_log import AccessLog
 from .tier import Tier
 from .donation import Donation
+from .donor_summary import DonorSummary
+from .donation_rollup import DonationRollup
+from .job import Job
+from .paypal_ipn import PayPalIPN
@@ -1,13 +1,21 @@
 from __future__ import division
 from metabrainz.model import db
+from metabrainz.model.donor_summary import DonorSummary, get_identity
+from metabrainz.model.donation_rollup import DonationRollup, record_change
 from metabrainz.donations.receipts import send_receipt
 from metabrainz.admin import AdminModelView
-from sqlalchemy.sql import func, desc
+from metabrainz.http_client import WePay
+from metabrainz import cache, jobs
+from sqlalchemy import event, text, bindparam
+from sqlalchemy.sql import tuple_
+from sqlalchemy.orm import aliased, object_session, Session
+from sqlalchemy import inspect
 from flask import current_app
 from datetime import datetime
-from wepay import WePay
 import stripe
 import logging
+import time
+import uuid
 
 
 PAYMENT_METHOD_STRIPE = 'stripe'
@@ -16,19 +24,59 @@ PAYMENT_METHOD_WEPAY = 'wepay'
 PAYMENT_METHOD_BITCOIN = 'bitcoin'
 PAYMENT_METHOD_CHECK = 'check'
 
+JOB_SEND_RECEIPT = 'send_receipt'
+
+# Cache namespace for data that is derived from donations. It is invalidated
+# every time a donation is added or modified (see `invalidate_cache`).
+CACHE_NAMESPACE = 'donations'
+CACHE_TIME = 60 * 60  # seconds
+
+# Cache namespace for deadlines of nag checks. Keys are lowercased names of
+# editors together with a version of the editor's entry, which is changed
+# after donations of the editor are modified (see `_get_nag_cache_versions`).
+# Deadlines that have been read before the change can still be stored after
+# it, but they are stored under the old version, which isn't used anymore.
+NAG_CACHE_NAMESPACE = 'nag'
+NAG_VERSION_CACHE_NAMESPACE = 'nag_version'
+NAG_CACHE_TIME = 60 * 60 * 24  # seconds
+NAG_CACHE_NO_DONATIONS = False  # cached for editors that haven't donated
+
+# Key of `Session.info` that contains nag cache keys of editors whose
+# donations have been modified in the current transaction. It's present
+# whenever any donations have been modified.
+_MODIFIED_EDITORS_KEY = 'donation_modified_editors'
+
+# Key of `Session.info` that contains changes of donations made in the
+# current transaction that need to be added to rollups (see `DonationRollup`).
+_ROLLUP_CHANGES_KEY = 'donation_rollup_changes'
+
+# Columns that rollups are calculated from. They keep their previous values
+# when modified, so that changes can be subtracted from the previous period.
+_ROLLUP_COLUMNS = ('payment_date', 'payment_method', 'amount', 'fee')
+
 
 class Donation(db.Model):
     __tablename__ = 'donation'
+    __table_args__ = (
+        # Used for keyset pagination of recent donations
+        db.Index('donation_payment_date_id_idx', 'payment_date', 'id'),
+        # Used for recalculating summaries of donors
+        db.Index('donation_donor_idx', 'first_name', 'last_name'),
+        # Prevents recording the same payment twice (see `insert_unique`)
+        db.Index('donation_payment_method_transaction_id_idx', 'payment_method', 'transaction_id', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
     # Personal details
-    first_name = db.Column(db.Unicode, nullable=False)
-    last_name = db.Column(db.Unicode, nullable=False)
+    # Columns that identify donor keep their previous values when modified,
+    # so that summary of the previous donor can be updated (see DonorSummary).
+    first_name = db.column_property(db.Column(db.Unicode, nullable=False), active_history=True)
+    last_name = db.column_property(db.Column(db.Unicode, nullable=False), active_history=True)
     email = db.Column(db.Unicode, nullable=False)
-    editor_name = db.Column(db.Unicode)  # MusicBrainz username
+    editor_name = db.column_property(db.Column(db.Unicode), active_history=True)  # MusicBrainz username
     can_contact = db.Column(db.Boolean, nullable=False, default=True)
-    anonymous = db.Column(db.Boolean, nullable=False, default=False)
+    anonymous = db.column_property(db.Column(db.Boolean, nullable=False, default=False), active_history=True)
     address_street = db.Column(db.Unicode)
     address_city = db.Column(db.Unicode)
     address_state = db.Column(db.Unicode)
@@ -36,23 +84,91 @@ class Donation(db.Model):
     address_country = db.Column(db.Unicode)
 
     # Transaction details
-    payment_date = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
-    payment_method = db.Column(db.Enum(
+    # Columns that are included in rollups keep their previous values too.
+    payment_date = db.column_property(db.Column(db.DateTime(timezone=True), default=datetime.utcnow),
+                                      active_history=True)
+    payment_method = db.column_property(db.Column(db.Enum(
         PAYMENT_METHOD_STRIPE,
         PAYMENT_METHOD_PAYPAL,
         PAYMENT_METHOD_WEPAY,
         PAYMENT_METHOD_BITCOIN,
         PAYMENT_METHOD_CHECK,
         name='payment_method_types'
-    ))
+    )), active_history=True)
     transaction_id = db.Column(db.Unicode)
-    amount = db.Column(db.Numeric(11, 2), nullable=False)
-    fee = db.Column(db.Numeric(11, 2))
+    amount = db.column_property(db.Column(db.Numeric(11, 2), nullable=False), active_history=True)
+    fee = db.column_property(db.Column(db.Numeric(11, 2)), active_history=True)
     memo = db.Column(db.Unicode)
 
     def __unicode__(self):
         return 'Donation #%s' % self.id
 
+    def insert_unique(self):
+        """Inserts the donation unless a donation with the same payment
+        method and transaction ID has already been recorded.
+
+        This is done in a single INSERT ... ON CONFLICT DO NOTHING statement,
+        so concurrent notifications about the same payment can't both be
+        recorded. Donation isn't added to the session, but its ID is set.
+
+        Returns:
+            True if donation has been inserted, False if it's a duplicate.
+        """
+        columns = [column for column in self.__table__.columns if not column.primary_key]
+        values = {}
+        for column in columns:
+            value = getattr(self, column.key)
+            if value is None and column.default is not None:
+                value = column.default.arg(None) if column.default.is_callable else column.default.arg
+                setattr(self, column.key, value)
+            values[column.key] = value
+        self.id = db.session.execute(text(
+            "INSERT INTO donation (%s) VALUES (%s) "
+            "ON CONFLICT (payment_method, transaction_id) DO NOTHING "
+            "RETURNING id" % (", ".join(column.name for column in columns),
+                              ", ".join(":" + column.key for column in columns))
+        ).bindparams(*[bindparam(column.key, type_=column.type) for column in columns]), values).scalar()
+        if self.id is None:
+            return False
+        _on_donor_modified(db.session(), db.session.connection(), get_identity(self))
+        _record_rollup_change(db.session(), self.payment_date, self.payment_method, self.amount, self.fee, 1)
+        return True
+
+    @classmethod
+    def insert_unique_from(cls, table, columns):
+        """Bulk version of `insert_unique` that copies donations from another
+        table (for example, a temporary table that has been filled with COPY).
+
+        Args:
+            table: Name of the table.
+            columns: Names of columns that are copied.
+
+        Returns:
+            Sorted list of IDs of inserted donations.
+        """
+        connection = db.session.connection()
+        columns = ", ".join(columns)
+        inserted = connection.execute(
+            "INSERT INTO donation (%s) "
+            "SELECT %s FROM %s "
+            "ON CONFLICT (payment_method, transaction_id) DO NOTHING "
+            "RETURNING id, first_name, last_name, editor_name, anonymous, "
+            "payment_date, payment_method, amount, fee" % (columns, columns, table)
+        ).fetchall()
+        for identity in set(tuple(row)[1:5] for row in inserted):
+            _on_donor_modified(db.session(), connection, identity)
+        for row in inserted:
+            _record_rollup_change(db.session(), *(tuple(row)[5:] + (1,)))
+        return sorted(row[0] for row in inserted)
+
+    def enqueue_receipt(self):
+        """Adds a job that sends receipt for this donation to the donor.
+
+        Donation needs to be flushed first. Job is stored when the session is
+        committed.
+        """
+        jobs.enqueue(JOB_SEND_RECEIPT, {'donation_id': self.id})
+
     @classmethod
     def get_by_transaction_id(cls, transaction_id):
         return cls.query.filter_by(transaction_id=str(transaction_id)).first()
@@ -64,51 +180,83 @@ class Donation(db.Model):
         Returns:
             Two values. First one indicates if editor should be nagged:
             -1 = unknown person, 0 = no need to nag, 1 = should be nagged.
-            Second is...
+            Second is number of days until editor should be nagged (negative
+            if the time has passed).
         """
-        days_per_dollar = 7.5
-        result = db.session.execute(
-            "SELECT ((amount + COALESCE(fee, 0)) * :days_per_dollar) - "
-            "((extract(epoch from now()) - extract(epoch from payment_date)) / 86400) as nag "
-            "FROM donation "
-            "WHERE lower(editor_name) = lower(:editor) "
-            "ORDER BY nag DESC "
-            "LIMIT 1",
-            {'editor': editor, 'days_per_dollar': days_per_dollar}
-        ).fetchone()
-
-        if result is None:
-            return -1, 0
-        elif result[0] >= 0:
-            return 0, result[0]
-        else:
-            return 1, result[0]
+        return Donation.get_nag_days_multi([editor])[editor]
+
+    @staticmethod
+    def get_nag_days_multi(editors):
+        """Batch version of `get_nag_days`.
+
+        Returns:
+            Dictionary with names of editors as keys and values that
+            `get_nag_days` would return for them.
+        """
+        deadlines = _get_nag_deadlines(editors)
+        now = time.time()
+        return dict((editor, _get_nag_state(None if deadlines[editor] is NAG_CACHE_NO_DONATIONS
+                                            else (deadlines[editor] - now) / 86400))
+                    for editor in editors)
 
     @classmethod
-    def get_recent_donations(cls, limit=None, offset=None):
+    def get_recent_donations(cls, limit=None, offset=None, older_than=None, newer_than=None):
         """Getter for most recent donations.
 
+        Donations can be paginated either using an offset or using a donation
+        that ends (or starts) the previous page as a cursor. Cursors are
+        preferable for pages that are far from the beginning, because they
+        don't require the database to skip all the previous rows.
+
         Args:
             limit: Maximum number of donations to be returned.
             offset: Offset of the result.
+            older_than: ID of a donation. If specified, only donations that
+                follow it in the list are returned.
+            newer_than: ID of a donation. If specified, only donations that
+                precede it in the list are returned (closest first).
 
         Returns:
             Tuple with two items. First is total number if donations. Second
-            is a list of donations sorted by payment_date with a specified offset.
+            is a list of donations sorted by payment_date.
         """
-        query = cls.query.order_by(cls.payment_date.desc())
-        count = query.count()  # Total count should be calculated before limits
+        count = _get_donation_count()
+        order = (cls.payment_date.desc(), cls.id.desc())
+        reverse = False
+        query = cls.query
+
+        if older_than is not None or newer_than is not None:
+            cursor = aliased(cls)
+            cursor_id = older_than if older_than is not None else newer_than
+            cursor_date = db.session.query(cursor.payment_date).filter(cursor.id == cursor_id).as_scalar()
+            if older_than is not None:
+                query = query.filter(tuple_(cls.payment_date, cls.id) < tuple_(cursor_date, cursor_id))
+            else:
+                query = query.filter(tuple_(cls.payment_date, cls.id) > tuple_(cursor_date, cursor_id))
+                reverse = True
+        elif offset is not None and limit is not None and count // 2 < offset < count:
+            # Pages at the end of the list are cheaper to get from the other end
+            limit = min(limit, count - offset)
+            offset = count - offset - limit
+            reverse = True
+
+        if reverse:
+            order = (cls.payment_date.asc(), cls.id.asc())
+        query = query.order_by(*order)
         if limit is not None:
             query = query.limit(limit)
         if offset is not None:
             query = query.offset(offset)
-        return count, query.all()
+        donations = query.all()
+        if reverse:
+            donations.reverse()
+        return count, donations
 
     @classmethod
     def get_biggest_donations(cls, limit=None, offset=None):
         """Getter for biggest donations.
 
-        Donations from the same person are grouped.
+        Donations from the same person are grouped (see DonorSummary).
 
         Args:
             limit: Maximum number of donations to be returned.
@@ -116,20 +264,12 @@ class Donation(db.Model):
 
         Returns:
             Tuple with two items. First is total number if donations. Second
-            is a list of donations sorted by amount with a specified offset.
+            is a list of DonorSummary objects sorted by amount with a
+            specified offset.
         """
-        query = db.session.query(
-            cls.first_name.label("first_name"),
-            cls.last_name.label("last_name"),
-            cls.editor_name.label("editor_name"),
-            func.max(cls.payment_date).label("payment_date"),
-            func.sum(cls.amount).label("amount"),
-            func.sum(cls.fee).label("fee"),
-        )
-        query = query.filter(cls.anonymous == False)
-        query = query.group_by(cls.first_name, cls.last_name, cls.editor_name)
-        query = query.order_by(desc("amount"))
-        count = query.count()  # Total count should be calculated before limits
+        query = DonorSummary.query.filter(DonorSummary.anonymous == False)
+        query = query.order_by(DonorSummary.amount.desc(), DonorSummary.id)
+        count = _get_donor_count()
         if limit is not None:
             query = query.limit(limit)
         if offset is not None:
@@ -141,7 +281,8 @@ class Donation(db.Model):
         """Processor for PayPal IPNs (Instant Payment Notifications).
 
         Should be used only after IPN request is verified. See PayPal documentation for
-        more info about the process.
+        more info about the process. New donation is added to the current session,
+        which needs to be committed.
 
         Args:
             form: The form parameters from IPN request that contains IPN variables.
@@ -169,11 +310,6 @@ class Donation(db.Model):
             logging.info('PayPal: Tiny donation ($%s).', form['mc_gross'])
             return
 
-        # Checking that txn_id has not been previously processed
-        if cls.get_by_transaction_id(form['txn_id']) is not None:
-            logging.info('PayPal: Transaction ID %s has been used before.', form['txn_id'])
-            return
-
         new_donation = cls(
             first_name=form['first_name'],
             last_name=form['last_name'],
@@ -200,18 +336,12 @@ class Donation(db.Model):
                             form['option_name2'] == 'yes':
                 new_donation.can_contact = True
 
-        db.session.add(new_donation)
-        db.session.commit()
+        if not new_donation.insert_unique():
+            logging.info('PayPal: Transaction ID %s has been used before.', form['txn_id'])
+            return
+        new_donation.enqueue_receipt()
         logging.info('PayPal: Payment added. ID: %s.', new_donation.id)
 
-        send_receipt(
-            new_donation.email,
-            new_donation.payment_date,
-            new_donation.amount,
-            '%s %s' % (new_donation.first_name, new_donation.last_name),
-            new_donation.editor_name,
-        )
-
     @classmethod
     def verify_and_log_wepay_checkout(cls, checkout_id, editor, anonymous, can_contact):
         logging.debug('Processing WePay checkout...')
@@ -236,12 +366,6 @@ class Donation(db.Model):
 
         if details['state'] in ['settled', 'captured']:
             # Payment has been received
-
-            # Checking that txn_id has not been previously processed
-            if cls.get_by_transaction_id(details['checkout_id']) is not None:
-                logging.info('WePay: Transaction ID %s has been used before.', details['checkout_id'])
-                return
-
             new_donation = cls(
                 first_name=details['payer_name'],
                 last_name='',
@@ -268,18 +392,13 @@ class Donation(db.Model):
                 else:
                     new_donation.address_postcode = address['postcode']
 
-            db.session.add(new_donation)
+            if not new_donation.insert_unique():
+                logging.info('WePay: Transaction ID %s has been used before.', details['checkout_id'])
+                return
+            new_donation.enqueue_receipt()
             db.session.commit()
             logging.info('WePay: Payment added. ID: %s.', new_donation.id)
 
-            send_receipt(
-                new_donation.email,
-                new_donation.payment_date,
-                new_donation.amount,
-                '%s %s' % (new_donation.first_name, new_donation.last_name),
-                new_donation.editor_name,
-            )
-
         elif details['state'] in ['authorized', 'reserved']:
             # Payment is pending
             logging.info('WePay: Payment is pending. State: "%s".', details['state'])
@@ -331,17 +450,219 @@ class Donation(db.Model):
         if 'editor' in charge.metadata:
             new_donation.editor_name = charge.metadata.editor
 
-        db.session.add(new_donation)
+        if not new_donation.insert_unique():
+            logging.info('Stripe: Transaction ID %s has been used before.', charge.id)
+            return
+        new_donation.enqueue_receipt()
         db.session.commit()
         logging.info('Stripe: Payment added. ID: %s.', new_donation.id)
 
-        send_receipt(
-            new_donation.email,
-            new_donation.payment_date,
-            new_donation.amount,
-            new_donation.first_name,  # Last name is not used with Stripe
-            new_donation.editor_name,
-        )
+
+@jobs.handler(JOB_SEND_RECEIPT)
+def _send_receipt(donation_id):
+    donation = Donation.query.get(donation_id)
+    if donation is None:
+        logging.warning('Donation #%s has been removed, not sending a receipt.', donation_id)
+        return
+    send_receipt(
+        donation.email,
+        donation.payment_date,
+        donation.amount,
+        get_donor_name(donation.first_name, donation.last_name),
+        donation.editor_name,
+    )
+
+
+def get_donor_name(first_name, last_name):
+    """Returns full name of a donor that is used in receipts."""
+    # Last name is not used with Stripe and WePay
+    return '%s %s' % (first_name, last_name) if last_name else first_name
+
+
+def _get_nag_state(days):
+    """Converts number of days until editor should be nagged into values
+    returned by `Donation.get_nag_days`.
+    """
+    if days is None:
+        return -1, 0
+    elif days >= 0:
+        return 0, days
+    else:
+        return 1, days
+
+
+def _get_nag_deadlines(editors):
+    """Returns nag deadlines of editors (see `DonorSummary.get_nag_deadlines`).
+
+    Deadlines are cached, so that numbers of days can be calculated without
+    querying the database. Editors who haven't donated are cached too.
+
+    Returns:
+        Dictionary with names of editors as keys and timestamps or
+        NAG_CACHE_NO_DONATIONS as values.
+    """
+    keys = dict((editor, _get_nag_cache_key(editor)) for editor in editors)
+    versions = _get_nag_cache_versions(set(keys.values()))
+    keys = dict((editor, "%s:%s" % (versions[key], key)) for editor, key in keys.iteritems())
+    cached = cache.get_multi(list(set(keys.values())), namespace=NAG_CACHE_NAMESPACE)
+    missing = [editor for editor in editors if keys[editor] not in cached]
+    if missing:
+        fetched = DonorSummary.get_nag_deadlines(missing)
+        new = dict((keys[editor], fetched.get(editor, NAG_CACHE_NO_DONATIONS)) for editor in missing)
+        cache.set_multi(new, NAG_CACHE_TIME, namespace=NAG_CACHE_NAMESPACE)
+        cached.update(new)
+    return dict((editor, cached[keys[editor]]) for editor in editors)
+
+
+def _get_nag_cache_key(editor):
+    return editor.lower().encode('utf-8')
+
+
+def _get_nag_cache_versions(keys):
+    """Returns current versions of cached deadlines.
+
+    Editors that don't have a version yet get a new one. It's stored before
+    the deadline is read from the database, so that it can't replace a
+    version that has been set after donations have been modified.
+
+    Args:
+        keys: Nag cache keys of editors.
+
+    Returns:
+        Dictionary with keys as keys and versions as values.
+    """
+    versions = cache.get_multi(list(keys), namespace=NAG_VERSION_CACHE_NAMESPACE)
+    for key in keys:
+        if key not in versions:
+            version = _new_nag_cache_version()
+            if not cache.add(key, version, NAG_CACHE_TIME, namespace=NAG_VERSION_CACHE_NAMESPACE):
+                # Another process has set the version in the meantime
+                version = cache.get(key, namespace=NAG_VERSION_CACHE_NAMESPACE) or version
+            versions[key] = version
+    return versions
+
+
+def _new_nag_cache_version():
+    # Versions are random, so that an entry whose version has been evicted
+    # doesn't get a version that it has been stored with before.
+    return uuid.uuid4().hex
+
+
+def invalidate_cache():
+    """Invalidates cached data that is derived from donations.
+
+    It's called automatically after a transaction that adds, modifies, or
+    removes donations is committed (see `_invalidate_cache`).
+    """
+    cache.invalidate_namespace(CACHE_NAMESPACE)
+
+
+@cache.memoized(CACHE_NAMESPACE, time=CACHE_TIME)
+def _get_donation_count():
+    return Donation.query.count()
+
+
+@cache.memoized(CACHE_NAMESPACE, time=CACHE_TIME)
+def _get_donor_count():
+    """Returns number of rows in the list of biggest donations."""
+    return DonorSummary.query.filter(DonorSummary.anonymous == False).count()
+
+
+@event.listens_for(Donation, 'after_insert')
+@event.listens_for(Donation, 'after_update')
+@event.listens_for(Donation, 'after_delete')
+def _refresh_donor_summary(mapper, connection, donation):
+    """Keeps summary of the donor up to date in the same transaction."""
+    identity = get_identity(donation)
+    old_identity = get_identity(donation, old=True)
+    _on_donor_modified(object_session(donation), connection, identity)
+    if old_identity != identity:  # donation has been moved to a different donor
+        _on_donor_modified(object_session(donation), connection, old_identity)
+
+
+@event.listens_for(Donation, 'after_insert')
+def _record_inserted_donation(mapper, connection, donation):
+    _record_rollup_change(object_session(donation), *(_get_rollup_values(donation) + (1,)))
+
+
+@event.listens_for(Donation, 'after_update')
+def _record_updated_donation(mapper, connection, donation):
+    old_values = _get_rollup_values(donation, old=True)
+    values = _get_rollup_values(donation)
+    if old_values != values:
+        _record_rollup_change(object_session(donation), *(old_values + (-1,)))
+        _record_rollup_change(object_session(donation), *(values + (1,)))
+
+
+@event.listens_for(Donation, 'after_delete')
+def _record_deleted_donation(mapper, connection, donation):
+    _record_rollup_change(object_session(donation), *(_get_rollup_values(donation, old=True) + (-1,)))
+
+
+def _get_rollup_values(donation, old=False):
+    """Returns values of `_ROLLUP_COLUMNS` of a donation.
+
+    Args:
+        old: If True, values that have been replaced in the current flush are
+            returned instead of the current ones.
+    """
+    values = []
+    for column in _ROLLUP_COLUMNS:
+        value = getattr(donation, column)
+        if old:
+            history = inspect(donation).attrs[column].history
+            if history.deleted:
+                value = history.deleted[0]
+        values.append(value)
+    return tuple(values)
+
+
+def _on_donor_modified(session, connection, identity):
+    """Refreshes summary of a donor whose donations have been modified and
+    marks cached data for invalidation after the transaction ends.
+
+    Args:
+        identity: Identity of the donor (see `donor_summary.get_identity`).
+    """
+    DonorSummary.refresh(connection, *identity)
+    editors = session.info.setdefault(_MODIFIED_EDITORS_KEY, set())
+    editor = identity[2]
+    if editor:
+        editors.add(_get_nag_cache_key(editor))
+
+
+def _record_rollup_change(session, payment_date, payment_method, amount, fee, count):
+    record_change(session.info.setdefault(_ROLLUP_CHANGES_KEY, {}), payment_date, payment_method, amount, fee, count)
+
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_rollups(session):
+    """Adds changes of donations to rollups once per transaction, right
+    before it's committed.
+    """
+    session.flush()  # modifications are recorded during flush
+    changes = session.info.pop(_ROLLUP_CHANGES_KEY, None)
+    if changes:
+        DonationRollup.apply_changes(session.connection(), changes)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _invalidate_cache(session):
+    """Invalidates cached data after donations have been modified and
+    changes versions of cached nag deadlines of editors whose donations have
+    been modified. It's also done after rollback, because data might have
+    been cached from uncommitted changes.
+    """
+    session.info.pop(_ROLLUP_CHANGES_KEY, None)
+    editors = session.info.pop(_MODIFIED_EDITORS_KEY, None)
+    if editors is None:  # no donations have been modified
+        return
+    invalidate_cache()
+    if editors:
+        version = _new_nag_cache_version()
+        cache.set_multi(dict((key, version) for key in editors), NAG_CACHE_TIME,
+                        namespace=NAG_VERSION_CACHE_NAMESPACE)
 
 
 class DonationAdminView(AdminModelView):
@@ -391,10 +712,5 @@ class DonationAdminView(AdminModelView):
 
     def after_model_change(self, form, new_donation, is_created):
         if is_created:
-            send_receipt(
-                new_donation.email,
-                new_donation.payment_date,
-                new_donation.amount,
-                '%s %s' % (new_donation.first_name, new_donation.last_name),
-                new_donation.editor_name,
-            )
+            new_donation.enqueue_receipt()
+            self.session.commit()
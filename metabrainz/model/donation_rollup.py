@@ -0,0 +1,240 @@
+from metabrainz.model import db
+from sqlalchemy import func, text
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+import pytz
+
+PERIOD_MONTH = 'month'
+PERIOD_YEAR = 'year'
+
+# Name that is used instead of payment method of donations that don't have it
+PAYMENT_METHOD_OTHER = 'other'
+
+# Periods are calendar months and years in UTC
+_PERIOD_START = "CAST(date_trunc(:period, payment_date AT TIME ZONE 'UTC') AS date)"
+_ROLLUP_SELECT = """
+    SELECT %s,
+           CASE WHEN GROUPING(payment_method) = 0
+                THEN COALESCE(CAST(payment_method AS text), :other) END,
+           %%s
+      FROM donation
+     WHERE %%s
+  GROUP BY %s, GROUPING SETS ((payment_method), ())
+""" % (_PERIOD_START, _PERIOD_START)
+_ROLLUP_INSERT = """
+    INSERT INTO donation_rollup (period, start, payment_method, amount, fee, donation_count, donor_count)
+    SELECT CAST(:period AS donation_rollup_period_types), *
+      FROM (%s) AS totals
+""" % (_ROLLUP_SELECT % ("sum(amount), sum(fee), count(*), count(DISTINCT lower(email))",
+                         "payment_date IS NOT NULL"))
+
+# Adds changes to existing totals. Number of donors can't be updated this
+# way, so it's cleared and counted again the next time totals are read (see
+# `_update_donor_counts`).
+_ROLLUP_UPSERT = """
+    INSERT INTO donation_rollup AS rollup (period, start, payment_method, amount, fee, donation_count)
+         VALUES %s
+    ON CONFLICT (period, start, COALESCE(payment_method, '')) DO UPDATE
+            SET amount = rollup.amount + EXCLUDED.amount,
+                fee = CASE WHEN EXCLUDED.fee IS NULL THEN rollup.fee
+                           ELSE COALESCE(rollup.fee, 0) + EXCLUDED.fee END,
+                donation_count = rollup.donation_count + EXCLUDED.donation_count,
+                donor_count = NULL
+      RETURNING id, donation_count
+"""
+_DONOR_COUNT_SELECT = _ROLLUP_SELECT % ("count(DISTINCT lower(email))",
+                                        "payment_date >= :start AND payment_date < :end")
+
+_CENT = Decimal('0.01')
+
+
+class DonationRollup(db.Model):
+    """Totals of donations received during each month and year.
+
+    There's a row for each payment method that has been used during a period
+    and a row with totals of all donations (`payment_method` is None). Changes
+    of donations are added to the totals at the end of every transaction that
+    modifies them (see `record_change` and `apply_changes`), so rows shouldn't
+    be modified directly.
+    """
+    __tablename__ = 'donation_rollup'
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.Enum(
+        PERIOD_MONTH,
+        PERIOD_YEAR,
+        name='donation_rollup_period_types'
+    ), nullable=False)
+    start = db.Column(db.Date, nullable=False)  # first day of the period
+    payment_method = db.Column(db.Unicode)
+
+    amount = db.Column(db.Numeric(11, 2), nullable=False)
+    fee = db.Column(db.Numeric(11, 2))
+    donation_count = db.Column(db.Integer, nullable=False)
+    # Distinct email addresses. None if donations have been modified since
+    # they were counted.
+    donor_count = db.Column(db.Integer)
+
+    def __unicode__(self):
+        return 'Donation rollup #%s' % self.id
+
+    def to_dict(self):
+        return {
+            'start': self.start.isoformat(),
+            'amount': float(self.amount),
+            'fee': float(self.fee) if self.fee is not None else None,
+            'donations': self.donation_count,
+            'donors': self.donor_count,
+        }
+
+    @classmethod
+    def apply_changes(cls, connection, changes):
+        """Adds changes recorded with `record_change` to the totals.
+
+        Needs to be executed in the same transaction that modifies donations.
+        Only the affected rows are updated (a single upsert), so concurrent
+        transactions only wait for each other if they modify the same periods.
+        Rows that no longer include any donations are removed.
+
+        Args:
+            connection: Connection that is used for the transaction.
+            changes: Dictionary filled by `record_change`.
+        """
+        values, params = [], {}
+        # Rows are always locked in the same order
+        for i, (key, change) in enumerate(sorted(changes.iteritems())):
+            values.append("(CAST(:period_{0} AS donation_rollup_period_types), :start_{0}, :payment_method_{0}, "
+                          ":amount_{0}, :fee_{0}, :donation_count_{0})".format(i))
+            params.update({'period_%s' % i: key[0], 'start_%s' % i: key[1], 'payment_method_%s' % i: key[2],
+                           'amount_%s' % i: change[0], 'fee_%s' % i: change[1], 'donation_count_%s' % i: change[2]})
+        if not values:
+            return
+        rows = connection.execute(text(_ROLLUP_UPSERT % ", ".join(values)), **params).fetchall()
+        empty = [row_id for row_id, donation_count in rows if donation_count <= 0]
+        if empty:
+            connection.execute(text("DELETE FROM donation_rollup WHERE id = ANY(:ids)"), ids=empty)
+
+    @classmethod
+    def rebuild(cls):
+        """Recalculates all totals from scratch."""
+        db.session.execute("LOCK TABLE donation_rollup IN EXCLUSIVE MODE")
+        db.session.execute("DELETE FROM donation_rollup")
+        for period in (PERIOD_MONTH, PERIOD_YEAR):
+            db.session.execute(_ROLLUP_INSERT, {'period': period, 'other': PAYMENT_METHOD_OTHER})
+        db.session.commit()
+
+    @classmethod
+    def get_totals(cls, period):
+        """Returns totals of all periods of a type in chronological order.
+
+        Donors of periods that have been modified since they were last
+        counted are counted from the donation table first, and the counts are
+        stored, so only the first read after a modification needs to do that.
+
+        Args:
+            period: PERIOD_MONTH or PERIOD_YEAR.
+
+        Returns:
+            List of dictionaries with totals of all donations received during
+            each period. Totals for each payment method are in the
+            `payment_methods` dictionary.
+        """
+        # Rows are converted first, because storing donor counts commits the
+        # session, which expires loaded objects.
+        rollups = [(rollup.start, rollup.payment_method, rollup.to_dict())
+                   for rollup in cls.query.filter(cls.period == period)
+                   .order_by(cls.start, func.coalesce(cls.payment_method, ''))]
+        donor_counts = _update_donor_counts(period, set(start for start, _, total in rollups
+                                                        if total['donors'] is None))
+        totals = []
+        for start, payment_method, total in rollups:
+            if total['donors'] is None:
+                total['donors'] = donor_counts.get((start, payment_method), 0)
+            # Total of all payment methods comes first in each period
+            if payment_method is None:
+                totals.append(dict(total, payment_methods={}))
+            else:
+                totals[-1]['payment_methods'][payment_method] = total
+        return totals
+
+
+db.Index('donation_rollup_period_start_idx', DonationRollup.period, DonationRollup.start,
+         func.coalesce(DonationRollup.payment_method, ''), unique=True)
+
+
+def record_change(changes, payment_date, payment_method, amount, fee, count):
+    """Records a change of donations that needs to be added to totals of
+    periods that include the payment date (see `DonationRollup.apply_changes`).
+
+    Args:
+        changes: Dictionary in which changes of a transaction are collected.
+        payment_date: Payment date of the donations. Donations without it are
+            not included in totals.
+        payment_method: Payment method of the donations.
+        amount: Amount of one donation.
+        fee: Fee of one donation.
+        count: Number of donations that have been added (negative if they
+            have been removed).
+    """
+    if payment_date is None:
+        return
+    if payment_date.tzinfo is not None:
+        payment_date = payment_date.astimezone(pytz.utc)
+    amount = _to_decimal(amount) * count
+    fee = _to_decimal(fee) * count if fee is not None else None
+    for period, start in ((PERIOD_MONTH, date(payment_date.year, payment_date.month, 1)),
+                          (PERIOD_YEAR, date(payment_date.year, 1, 1))):
+        for method in (payment_method or PAYMENT_METHOD_OTHER, None):
+            change = changes.setdefault((period, start, method), [Decimal(0), None, 0])
+            change[0] += amount
+            if fee is not None:
+                change[1] = (change[1] or 0) + fee
+            change[2] += count
+
+
+def _update_donor_counts(period, starts):
+    """Counts distinct donors of periods in the donation table and stores
+    the counts in rollups that don't have them.
+
+    Rows are locked before donors are counted, so transactions that modify
+    donations of these periods either have been committed and are counted,
+    or clear the stored count again when they are committed. Rows that are
+    locked by such a transaction are skipped (their counts are returned, but
+    not stored), so reading totals never waits for them.
+
+    Returns:
+        Dictionary with tuples of start of the period and payment method
+        (None for all donations) as keys and numbers of donors as values.
+    """
+    if not starts:
+        return {}
+    counts = {}
+    for start in sorted(starts):
+        locked = dict(db.session.execute(
+            "SELECT payment_method, id FROM donation_rollup "
+            "WHERE period = :period AND start = :start AND donor_count IS NULL "
+            "FOR UPDATE SKIP LOCKED", {'period': period, 'start': start}
+        ).fetchall())
+        end = date(start.year + 1, 1, 1) if period == PERIOD_YEAR else \
+            date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        for row_start, payment_method, count in db.session.execute(_DONOR_COUNT_SELECT, {
+            'period': period,
+            'other': PAYMENT_METHOD_OTHER,
+            'start': _to_datetime(start),
+            'end': _to_datetime(end),
+        }):
+            counts[(row_start, payment_method)] = count
+            if payment_method in locked:
+                db.session.execute("UPDATE donation_rollup SET donor_count = :count WHERE id = :id",
+                                   {'count': count, 'id': locked[payment_method]})
+    db.session.commit()
+    return counts
+
+
+def _to_decimal(value):
+    # Values are rounded the same way as in numeric columns
+    return Decimal(str(value)).quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def _to_datetime(value):
+    return datetime(value.year, value.month, value.day, tzinfo=pytz.utc)
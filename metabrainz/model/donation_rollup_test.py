@@ -0,0 +1,105 @@
+from metabrainz.testing import FlaskTestCase
+from metabrainz.model.donation import Donation, PAYMENT_METHOD_PAYPAL, PAYMENT_METHOD_STRIPE
+from metabrainz.model.donation_rollup import DonationRollup, PERIOD_MONTH, PERIOD_YEAR
+from metabrainz.model import db
+from datetime import datetime
+from decimal import Decimal
+import pytz
+
+
+class DonationRollupTestCase(FlaskTestCase):
+
+    def _add(self, amount, payment_date, payment_method=PAYMENT_METHOD_PAYPAL, email=u'test@example.org'):
+        new = Donation(first_name=u'Tester', last_name=u'Testing', email=email, amount=amount, fee=1,
+                       payment_method=payment_method, payment_date=payment_date)
+        db.session.add(new)
+        return new
+
+    def test_refresh(self):
+        self._add(10, datetime(2015, 1, 31, 23, 59))
+        self._add(20, datetime(2015, 2, 1), email=u'TEST@example.org')
+        self._add(5, datetime(2015, 2, 10), PAYMENT_METHOD_STRIPE, email=u'other@example.org')
+        db.session.commit()
+
+        months = DonationRollup.get_totals(PERIOD_MONTH)
+        self.assertEqual([month['start'] for month in months], ['2015-01-01', '2015-02-01'])
+        self.assertEqual(months[1]['amount'], 25)
+        self.assertEqual(months[1]['fee'], 2)
+        self.assertEqual(months[1]['donations'], 2)
+        self.assertEqual(months[1]['donors'], 2)
+        self.assertEqual(sorted(months[1]['payment_methods']), [PAYMENT_METHOD_PAYPAL, PAYMENT_METHOD_STRIPE])
+        self.assertEqual(months[1]['payment_methods'][PAYMENT_METHOD_STRIPE]['amount'], 5)
+
+        years = DonationRollup.get_totals(PERIOD_YEAR)
+        self.assertEqual(len(years), 1)
+        self.assertEqual(years[0]['amount'], 35)
+        self.assertEqual(years[0]['donors'], 2)  # emails are compared case-insensitively
+
+    def test_refresh_modified(self):
+        donation = self._add(10, datetime(2015, 1, 15))
+        db.session.commit()
+
+        # Both the old and the new periods are recalculated
+        donation.payment_date = datetime(2016, 3, 1, tzinfo=pytz.utc)
+        donation.amount = 15
+        db.session.commit()
+        self.assertEqual([(year['start'], year['amount']) for year in DonationRollup.get_totals(PERIOD_YEAR)],
+                         [('2016-01-01', 15)])
+
+        db.session.delete(donation)
+        db.session.commit()
+        self.assertEqual(DonationRollup.get_totals(PERIOD_MONTH), [])
+
+    def test_incremental(self):
+        donation = self._add(10, datetime(2015, 1, 15))
+        self._add(Decimal('2.50'), datetime(2015, 1, 20), PAYMENT_METHOD_STRIPE)
+        db.session.commit()
+
+        # Changes are added to existing totals
+        donation.amount = 12.345
+        donation.payment_method = PAYMENT_METHOD_STRIPE
+        donation.fee = None
+        db.session.commit()
+        month = DonationRollup.get_totals(PERIOD_MONTH)[0]
+        self.assertEqual(month['amount'], 14.85)
+        self.assertEqual(month['fee'], 1)
+        self.assertEqual(month['donations'], 2)
+        self.assertEqual(month['payment_methods'].keys(), [PAYMENT_METHOD_STRIPE])
+        self.assertEqual(month['payment_methods'][PAYMENT_METHOD_STRIPE]['amount'], 14.85)
+
+    def test_donor_count(self):
+        self._add(10, datetime(2015, 1, 15))
+        db.session.commit()
+        rollup = DonationRollup.query.filter_by(period=PERIOD_YEAR, payment_method=None).one()
+        self.assertIsNone(rollup.donor_count)  # not counted when donations are modified
+        self.assertEqual(DonationRollup.get_totals(PERIOD_YEAR)[0]['donors'], 1)
+        # Count is stored when totals are read
+        rollup = DonationRollup.query.filter_by(period=PERIOD_YEAR, payment_method=None).one()
+        self.assertEqual(rollup.donor_count, 1)
+        rollup = DonationRollup.query.filter_by(period=PERIOD_MONTH, payment_method=None).one()
+        self.assertIsNone(rollup.donor_count)  # months haven't been read
+
+        self._add(5, datetime(2015, 2, 1), email=u'other@example.org')
+        db.session.commit()
+        self.assertEqual(DonationRollup.get_totals(PERIOD_YEAR)[0]['donors'], 2)
+
+        DonationRollup.rebuild()
+        rollup = DonationRollup.query.filter_by(period=PERIOD_MONTH, payment_method=None).first()
+        self.assertEqual(rollup.donor_count, 1)
+
+    def test_insert_unique(self):
+        self.assertTrue(Donation(first_name=u'Tester', last_name=u'Testing', email=u'test@example.org',
+                                 amount=10, transaction_id=u'TEST', payment_method=PAYMENT_METHOD_PAYPAL,
+                                 payment_date=datetime(2015, 5, 5)).insert_unique())
+        db.session.commit()
+        self.assertEqual(DonationRollup.get_totals(PERIOD_MONTH)[0]['start'], '2015-05-01')
+
+    def test_rebuild(self):
+        self._add(10, datetime(2015, 1, 1))
+        db.session.commit()
+        db.session.execute("DELETE FROM donation_rollup")
+        db.session.commit()
+
+        DonationRollup.rebuild()
+        self.assertEqual(DonationRollup.get_totals(PERIOD_YEAR)[0]['amount'], 10)
+        self.assertEqual(DonationRollup.query.count(), 4)  # month and year, total and PayPal
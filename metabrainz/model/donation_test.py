@@ -3,8 +3,10 @@ from metabrainz.testing import FlaskTestCase
 from metabrainz.model import donation
 from metabrainz.model.donation import Donation
 from metabrainz.model import db
+from metabrainz import jobs
 from stripe import convert_to_stripe_object
 from flask import url_for, current_app
+from datetime import datetime, timedelta
 
 
 class FakeWePay(object):
@@ -114,6 +116,62 @@ class DonationModelTestCase(FlaskTestCase):
         bad_result = Donation.get_by_transaction_id(u'MISSING')
         self.assertIsNone(bad_result)
 
+    def test_insert_unique(self):
+        def create(payment_method):
+            return Donation(first_name=u'Tester', last_name=u'Testing', email=u'test@example.org',
+                            editor_name=u'tester', amount=10, transaction_id=u'TEST',
+                            payment_method=payment_method)
+
+        new = create(donation.PAYMENT_METHOD_PAYPAL)
+        self.assertTrue(new.insert_unique())
+        self.assertIsNotNone(new.id)
+        self.assertFalse(create(donation.PAYMENT_METHOD_PAYPAL).insert_unique())
+        # Transaction IDs of different payment methods don't conflict
+        self.assertTrue(create(donation.PAYMENT_METHOD_STRIPE).insert_unique())
+        db.session.commit()
+
+        self.assertEqual(Donation.query.count(), 2)
+        inserted = Donation.query.get(new.id)
+        self.assertFalse(inserted.anonymous)  # defaults are applied
+        self.assertIsNotNone(inserted.payment_date)
+        self.assertEqual(Donation.get_biggest_donations()[1][0].amount, 20)
+        self.assertEqual(Donation.get_nag_days(u'tester')[0], 0)
+
+    def _add_donations(self, count):
+        for i in range(count):
+            db.session.add(Donation(
+                first_name=u'Tester %s' % i,
+                last_name=u'Testing',
+                email=u'test@example.org',
+                amount=10,
+                payment_date=datetime(2015, 1, 1) + timedelta(days=i // 2),  # some dates are the same
+            ))
+        db.session.commit()
+
+    def test_get_recent_donations(self):
+        self._add_donations(25)
+        count, all_donations = Donation.get_recent_donations()
+        self.assertEqual(count, 25)
+        self.assertEqual(len(all_donations), 25)
+
+        count, page = Donation.get_recent_donations(limit=10, offset=10)
+        self.assertEqual(page, all_donations[10:20])
+        count, page = Donation.get_recent_donations(limit=10, offset=20)  # fetched from the end
+        self.assertEqual(page, all_donations[20:])
+
+        count, page = Donation.get_recent_donations(limit=10, older_than=all_donations[9].id)
+        self.assertEqual(page, all_donations[10:20])
+        count, page = Donation.get_recent_donations(limit=10, newer_than=all_donations[20].id)
+        self.assertEqual(page, all_donations[10:20])
+
+    def test_count_invalidation(self):
+        self._add_donations(2)
+        self.assertEqual(Donation.get_recent_donations()[0], 2)
+        self.assertEqual(Donation.get_biggest_donations()[0], 2)
+        Donation.verify_and_log_wepay_checkout(12345, 'Tester', False, True)
+        self.assertEqual(Donation.get_recent_donations()[0], 3)
+        self.assertEqual(Donation.get_biggest_donations()[0], 3)
+
     def test_process_paypal_ipn(self):
         # This is not a complete list:
         good_form = {
@@ -140,9 +198,12 @@ class DonationModelTestCase(FlaskTestCase):
             'option_selection2': u'yes',
         }
         Donation.process_paypal_ipn(good_form)
+        db.session.commit()
         # Donation should be in the DB now
         self.assertEqual(len(Donation.query.all()), 1)
         self.assertEqual(Donation.query.all()[0].transaction_id, 'TEST1')
+        # Receipt is sent in the background
+        self.assertEqual(jobs.run_pending(), 1)
 
         relatively_bad_form = good_form
         relatively_bad_form['txn_id'] = 'TEST2'
@@ -0,0 +1,130 @@
+from metabrainz.model import db
+from sqlalchemy import func, text, inspect
+
+# Each dollar donated (including fees) lets editor avoid being nagged for
+# this many days.
+NAG_DAYS_PER_DOLLAR = 7.5
+
+_IDENTITY_COLUMNS = ('first_name', 'last_name', 'editor_name', 'anonymous')
+
+# Donations without MusicBrainz username have either NULL or an empty string
+# in editor_name (depending on where they come from). Both belong to the same
+# donor, whose summary has NULL there.
+_SUMMARY_SELECT = """
+    SELECT first_name, last_name, NULLIF(editor_name, ''), anonymous,
+           sum(amount), sum(fee), count(*), max(payment_date),
+           max(payment_date + (amount + COALESCE(fee, 0)) * :days_per_dollar * interval '1 day')
+      FROM donation
+"""
+_SUMMARY_GROUP_BY = " GROUP BY first_name, last_name, NULLIF(editor_name, ''), anonymous"
+_SUMMARY_INSERT = """
+    INSERT INTO donor_summary (first_name, last_name, editor_name, anonymous,
+                               amount, fee, donation_count, payment_date, nag_deadline)
+"""
+
+
+class DonorSummary(db.Model):
+    """Aggregated donations of each donor.
+
+    Donor is identified by their name, MusicBrainz username, and whether they
+    want to remain anonymous. Rows are recalculated from the donation table
+    every time a donation of that donor is added, modified, or removed (see
+    `refresh`), so they shouldn't be modified directly.
+    """
+    __tablename__ = 'donor_summary'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    first_name = db.Column(db.Unicode, nullable=False)
+    last_name = db.Column(db.Unicode, nullable=False)
+    editor_name = db.Column(db.Unicode)
+    anonymous = db.Column(db.Boolean, nullable=False)
+
+    amount = db.Column(db.Numeric(11, 2), nullable=False)
+    fee = db.Column(db.Numeric(11, 2))
+    donation_count = db.Column(db.Integer, nullable=False)
+    payment_date = db.Column(db.DateTime(timezone=True))  # latest donation
+
+    # Time until which the donor shouldn't be nagged (based on the donation
+    # that gives the latest time).
+    nag_deadline = db.Column(db.DateTime(timezone=True))
+
+    def __unicode__(self):
+        return 'Donor summary #%s' % self.id
+
+    @classmethod
+    def refresh(cls, connection, first_name, last_name, editor_name, anonymous):
+        """Recalculates summary of a single donor.
+
+        Needs to be executed in the same transaction that modifies donations.
+        Concurrent refreshes of the same donor are serialized with an advisory
+        lock, so that the summary always includes all committed donations.
+
+        Args:
+            connection: Connection that is used for the transaction.
+        """
+        editor_name = editor_name or None  # see _SUMMARY_SELECT
+        identity = dict(first_name=first_name, last_name=last_name,
+                        editor_name=editor_name or u'', anonymous=anonymous)
+        condition = ("first_name = :first_name AND last_name = :last_name AND anonymous = :anonymous AND "
+                     "COALESCE(editor_name, '') = :editor_name")
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+                           key=u"donor_summary:%s:%s:%s:%s" % (first_name, last_name, editor_name, anonymous))
+        connection.execute(text("DELETE FROM donor_summary WHERE " + condition), **identity)
+        connection.execute(text(_SUMMARY_INSERT + _SUMMARY_SELECT + " WHERE " + condition + _SUMMARY_GROUP_BY),
+                           days_per_dollar=NAG_DAYS_PER_DOLLAR, **identity)
+
+    @classmethod
+    def rebuild(cls):
+        """Recalculates summaries of all donors from scratch."""
+        db.session.execute("LOCK TABLE donor_summary IN EXCLUSIVE MODE")
+        db.session.execute("DELETE FROM donor_summary")
+        db.session.execute(_SUMMARY_INSERT + _SUMMARY_SELECT + _SUMMARY_GROUP_BY,
+                           {'days_per_dollar': NAG_DAYS_PER_DOLLAR})
+        db.session.commit()
+
+    @classmethod
+    def get_nag_deadlines(cls, editors):
+        """Returns times (as unix timestamps) until which editors shouldn't be
+        nagged. Editors are matched case-insensitively.
+
+        Returns:
+            Dictionary with names of editors who have donated (as specified in
+            `editors`) as keys and timestamps as values.
+        """
+        if not editors:
+            return {}
+        rows = db.session.execute(
+            "SELECT editor, extract(epoch from max(nag_deadline)) "
+            "FROM unnest(:editors) AS editor "
+            "JOIN donor_summary ON lower(editor_name) = lower(editor) "
+            "GROUP BY editor",
+            {'editors': list(editors)}
+        ).fetchall()
+        return dict((editor, float(deadline)) for editor, deadline in rows if deadline is not None)
+
+
+db.Index('donor_summary_identity_idx', DonorSummary.first_name, DonorSummary.last_name,
+         func.coalesce(DonorSummary.editor_name, ''), DonorSummary.anonymous, unique=True)
+db.Index('donor_summary_amount_idx', DonorSummary.amount.desc(), postgresql_where=~DonorSummary.anonymous)
+db.Index('donor_summary_lower_editor_name_idx', func.lower(DonorSummary.editor_name))
+
+
+def get_identity(donation, old=False):
+    """Returns identity of the donor of a donation as a tuple of values of
+    `_IDENTITY_COLUMNS`.
+
+    Args:
+        donation: Donation object.
+        old: If True, values that have been replaced in the current flush are
+            returned instead of the current ones.
+    """
+    identity = []
+    for column in _IDENTITY_COLUMNS:
+        value = getattr(donation, column)
+        if old:
+            history = inspect(donation).attrs[column].history
+            if history.deleted:
+                value = history.deleted[0]
+        identity.append(value)
+    return tuple(identity)
@@ -0,0 +1,108 @@
+from metabrainz.testing import FlaskTestCase
+from metabrainz.model.donor_summary import DonorSummary
+from metabrainz.model.donation import Donation
+from metabrainz.model import donation
+from metabrainz import cache
+from metabrainz.model import db
+from datetime import datetime, timedelta
+
+
+class DonorSummaryModelTestCase(FlaskTestCase):
+
+    def _add_donation(self, first_name=u'Tester', editor_name=u'tester', amount=10, anonymous=False, **kwargs):
+        donation = Donation(first_name=first_name, last_name=u'Testing', email=u'test@example.org',
+                            editor_name=editor_name, amount=amount, anonymous=anonymous, **kwargs)
+        db.session.add(donation)
+        db.session.commit()
+        return donation
+
+    def test_refresh(self):
+        self._add_donation(amount=10, fee=1)
+        self._add_donation(amount=5)
+        self._add_donation(amount=100, anonymous=True)
+        summaries = DonorSummary.query.order_by(DonorSummary.amount).all()
+        self.assertEqual(len(summaries), 2)
+        self.assertEqual(summaries[0].amount, 15)
+        self.assertEqual(summaries[0].fee, 1)
+        self.assertEqual(summaries[0].donation_count, 2)
+        self.assertTrue(summaries[1].anonymous)
+
+    def test_edit(self):
+        donation = self._add_donation(amount=10)
+        donation.first_name = u'Renamed'
+        donation.amount = 20
+        db.session.commit()
+        summaries = DonorSummary.query.all()
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0].first_name, u'Renamed')
+        self.assertEqual(summaries[0].amount, 20)
+
+        db.session.delete(donation)
+        db.session.commit()
+        self.assertEqual(DonorSummary.query.count(), 0)
+
+    def test_empty_editor_name(self):
+        self._add_donation(editor_name=None, amount=10)
+        donation = self._add_donation(editor_name=u'', amount=5)
+        summary = DonorSummary.query.one()  # both donations belong to the same donor
+        self.assertIsNone(summary.editor_name)
+        self.assertEqual(summary.amount, 15)
+
+        db.session.delete(donation)
+        db.session.commit()
+        self.assertEqual(DonorSummary.query.one().amount, 10)
+
+        self._add_donation(editor_name=u'', amount=5)
+        DonorSummary.rebuild()
+        self.assertEqual(DonorSummary.query.one().amount, 15)
+
+    def test_get_nag_days(self):
+        self.assertEqual(Donation.get_nag_days(u'tester'), (-1, 0))
+        self._add_donation(amount=10, payment_date=datetime.utcnow() - timedelta(days=100))
+        self.assertEqual(Donation.get_nag_days(u'Tester')[0], 1)
+        self._add_donation(amount=10)
+        nag, days = Donation.get_nag_days(u'TESTER')
+        self.assertEqual(nag, 0)
+        self.assertAlmostEqual(days, 75, places=2)
+
+    def _get_cached_deadline(self, editor):
+        version = cache.get(editor, namespace=donation.NAG_VERSION_CACHE_NAMESPACE)
+        return cache.get('%s:%s' % (version, editor), namespace=donation.NAG_CACHE_NAMESPACE)
+
+    def test_nag_cache(self):
+        self.assertEqual(Donation.get_nag_days(u'Tester'), (-1, 0))  # cached as unknown
+        self.assertIs(self._get_cached_deadline('tester'), donation.NAG_CACHE_NO_DONATIONS)
+        self._add_donation(amount=10)
+        self.assertIsNone(self._get_cached_deadline('tester'))
+        self.assertEqual(Donation.get_nag_days(u'Tester')[0], 0)
+        self.assertIsNotNone(self._get_cached_deadline('tester'))
+
+        # Moving donation to another editor
+        new = Donation.query.one()
+        new.editor_name = u'Other'
+        db.session.commit()
+        self.assertEqual(Donation.get_nag_days(u'tester'), (-1, 0))
+        self.assertEqual(Donation.get_nag_days_multi([u'OTHER', u'tester'])[u'OTHER'][0], 0)
+
+    def test_nag_cache_concurrent_read(self):
+        version = donation._get_nag_cache_versions(['tester'])['tester']
+        self._add_donation(amount=10)
+        # Deadline that has been read before the donation was committed is
+        # stored after the cache has been invalidated.
+        cache.set('%s:tester' % version, donation.NAG_CACHE_NO_DONATIONS, namespace=donation.NAG_CACHE_NAMESPACE)
+        self.assertEqual(Donation.get_nag_days(u'Tester')[0], 0)
+
+    def test_get_biggest_donations(self):
+        self._add_donation(first_name=u'Small', amount=5)
+        self._add_donation(first_name=u'Big', amount=50)
+        self._add_donation(first_name=u'Anonymous', amount=500, anonymous=True)
+        count, donors = Donation.get_biggest_donations(limit=10, offset=0)
+        self.assertEqual(count, 2)
+        self.assertEqual([donor.first_name for donor in donors], [u'Big', u'Small'])
+
+    def test_rebuild(self):
+        self._add_donation(amount=10)
+        db.session.execute("DELETE FROM donor_summary")
+        db.session.commit()
+        DonorSummary.rebuild()
+        self.assertEqual(DonorSummary.query.one().amount, 10)
@@ -0,0 +1,53 @@
+from metabrainz.model import db
+from sqlalchemy import text
+from sqlalchemy.dialects import postgres
+from datetime import datetime
+
+STATUS_PENDING = 'pending'
+STATUS_DEAD = 'dead'  # failed too many times, needs to be checked manually
+
+
+class Job(db.Model):
+    """Job that needs to be performed in the background (see metabrainz.jobs).
+
+    Jobs are removed after they are completed successfully.
+    """
+    __tablename__ = 'job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.Unicode, nullable=False)
+    payload = db.Column(postgres.JSON, nullable=False)
+    status = db.Column(db.Enum(
+        STATUS_PENDING,
+        STATUS_DEAD,
+        name='job_status_types'
+    ), nullable=False, default=STATUS_PENDING)
+    created = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    run_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    last_error = db.Column(db.UnicodeText)
+
+    def __unicode__(self):
+        return 'Job #%s (%s)' % (self.id, self.type)
+
+    @classmethod
+    def lock_next(cls):
+        """Finds the next pending job that is due and locks it until the end
+        of the current transaction.
+
+        Jobs that are locked by other workers are skipped.
+
+        Returns:
+            Job object or None if there are no jobs to perform.
+        """
+        return cls.query.from_statement(text(
+            "SELECT * FROM job "
+            "WHERE status = :status AND run_at <= now() "
+            "ORDER BY run_at, id "
+            "LIMIT 1 "
+            "FOR UPDATE SKIP LOCKED"
+        ).params(status=STATUS_PENDING)).first()
+
+
+db.Index('job_pending_run_at_idx', Job.run_at, Job.id, postgresql_where=Job.status == STATUS_PENDING)
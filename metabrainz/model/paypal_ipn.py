@@ -0,0 +1,59 @@
+from metabrainz.model import db
+from sqlalchemy import text
+from datetime import datetime
+
+STATUS_RECEIVED = 'received'
+STATUS_VERIFIED = 'verified'
+STATUS_INVALID = 'invalid'  # PayPal didn't confirm that IPN has been sent by them
+
+
+class PayPalIPN(db.Model):
+    """Instant Payment Notification received from PayPal.
+
+    IPNs are stored as soon as they are received and verified later in the
+    background (see metabrainz.donations.paypal.ipn).
+    """
+    __tablename__ = 'paypal_ipn'
+
+    id = db.Column(db.Integer, primary_key=True)
+    txn_id = db.Column(db.Unicode)
+    payment_status = db.Column(db.Unicode)
+    data = db.Column(db.LargeBinary, nullable=False)  # request body as sent by PayPal
+    status = db.Column(db.Enum(
+        STATUS_RECEIVED,
+        STATUS_VERIFIED,
+        STATUS_INVALID,
+        name='paypal_ipn_status_types'
+    ), nullable=False, default=STATUS_RECEIVED)
+    received = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+
+    def __unicode__(self):
+        return 'PayPal IPN #%s' % self.id
+
+    @classmethod
+    def add(cls, data, txn_id, payment_status):
+        """Stores an IPN unless the same notification has already been
+        received.
+
+        PayPal sends a notification again until it's acknowledged and sends
+        a new one every time status of a transaction changes, so IPNs with the
+        same transaction ID and payment status are duplicates.
+
+        Returns:
+            ID of the new IPN or None if it's a duplicate.
+        """
+        return db.session.execute(text(
+            "INSERT INTO paypal_ipn (txn_id, payment_status, data, status, received) "
+            "VALUES (:txn_id, :payment_status, :data, :status, now()) "
+            "ON CONFLICT (txn_id, payment_status) WHERE txn_id IS NOT NULL DO NOTHING "
+            "RETURNING id"
+        ).bindparams(db.bindparam('data', type_=db.LargeBinary)), {
+            'txn_id': txn_id,
+            'payment_status': payment_status,
+            'data': data,
+            'status': STATUS_RECEIVED,
+        }).scalar()
+
+
+db.Index('paypal_ipn_txn_id_payment_status_idx', PayPalIPN.txn_id, PayPalIPN.payment_status,
+         unique=True, postgresql_where=PayPalIPN.txn_id != None)
@@ -0,0 +1,46 @@
+"""
+Counting of database queries made while handling each request.
+
+Views that make a separate query for each item of a list (N+1 queries) are
+easy to miss, because they are fast with little data. When QUERY_COUNT_HEADER
+is enabled, number of queries is returned in the X-Query-Count header of each
+response, so tests can check it. Requests that make more than
+QUERY_COUNT_WARNING_THRESHOLD queries are logged.
+"""
+from flask import g, request, current_app, has_request_context
+from sqlalchemy.engine import Engine
+from sqlalchemy import event
+import logging
+
+HEADER = 'X-Query-Count'
+
+
+def init_app(app):
+    app.before_request(_reset)
+    app.after_request(_after_request)
+
+
+def get_count():
+    """Returns number of queries made during the current request."""
+    return getattr(g, '_query_count', 0)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._query_count = get_count() + 1
+
+
+def _reset():
+    # Application context (and `g`) might be shared by multiple requests in tests
+    g._query_count = 0
+
+
+def _after_request(response):
+    count = get_count()
+    if current_app.config.get('QUERY_COUNT_HEADER'):
+        response.headers[HEADER] = str(count)
+    threshold = current_app.config.get('QUERY_COUNT_WARNING_THRESHOLD')
+    if threshold and count > threshold:
+        logging.warning("%s %s made %s database queries.", request.method, request.path, count)
+    return response
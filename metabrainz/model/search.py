@@ -0,0 +1,89 @@
+"""
+Helpers for substring search in text columns.
+
+Searches like `ILIKE '%value%'` can't use regular indexes. They are sped up
+with GIN indexes from the pg_trgm extension, which also provides similarity
+of strings that is used to rank results. The extension needs to be installed
+by a superuser (see `model.utils.init_postgres` and schema update 18), so it
+is optional: without it indexes aren't created and results are ranked by
+simpler rules (see `match_score`).
+"""
+from sqlalchemy import event, func, cast, case, or_, literal
+from sqlalchemy.schema import DDL
+from metabrainz.model import db
+from decimal import Decimal, InvalidOperation
+
+_trigram_support = {}  # database URL -> whether pg_trgm is installed
+
+
+def has_trigram_support(bind=None):
+    """Checks if pg_trgm extension is installed in the database."""
+    if bind is None:
+        bind = db.engine
+    url = str(bind.engine.url)
+    if url not in _trigram_support:
+        _trigram_support[url] = bind.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+        ).scalar()
+    return _trigram_support[url]
+
+
+def add_trigram_index(table, name, column):
+    """Creates a trigram GIN index together with the table, if the database
+    supports it.
+    """
+    ddl = DDL('CREATE INDEX %s ON %%(fullname)s USING gin (%s gin_trgm_ops)' % (name, column))
+    event.listen(table, 'after_create',
+                 ddl.execute_if(callable_=lambda ddl, target, bind, **kw: has_trigram_support(bind)))
+
+
+def escape_like(value):
+    """Escapes characters that have a special meaning in LIKE patterns."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def contains_any(columns, value):
+    """Condition that matches rows where any of the columns contains a value
+    (case-insensitive).
+    """
+    pattern = '%' + escape_like(value) + '%'
+    return or_(*[column.ilike(pattern) for column in columns])
+
+
+def match_score(columns, value):
+    """Expression that ranks how well the columns match a value.
+
+    Score is a number between 0 and 1 with 3 decimal places, so that it can
+    be compared exactly when used in keyset pagination. With pg_trgm it is
+    the highest similarity of the value to any of the columns. Otherwise
+    exact matches get 1, prefix matches 0.5, and everything else 0.
+    """
+    if has_trigram_support():
+        return func.round(cast(func.greatest(*[func.similarity(column, value) for column in columns]),
+                               db.Numeric), 3)
+    prefix = escape_like(value) + '%'
+    return func.greatest(*[case([
+        (func.lower(column) == value.lower(), literal(Decimal('1.000'))),
+        (column.ilike(prefix), literal(Decimal('0.500'))),
+    ], else_=literal(Decimal('0.000'))) for column in columns])
+
+
+def format_position(score, key):
+    """Formats position of the last row on a page of ranked results."""
+    return '%s:%s' % (score, key)
+
+
+def parse_position(position, key_type=int):
+    """Parses position created with `format_position`.
+
+    Returns:
+        Score and key of the row.
+
+    Raises:
+        ValueError if position is invalid.
+    """
+    try:
+        score, key = position.split(':', 1)
+        return Decimal(score), key_type(key)
+    except (ValueError, InvalidOperation):
+        raise ValueError("Invalid position: %s" % position)
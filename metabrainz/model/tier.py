@@ -1,6 +1,8 @@
 from metabrainz.model import db
-from metabrainz.model.user import User
+from metabrainz.model.user import User, mark_featured_modified
 from metabrainz.admin import AdminModelView
+from sqlalchemy.orm import object_session
+from sqlalchemy import event
 
 
 class Tier(db.Model):
@@ -64,6 +66,15 @@ class Tier(db.Model):
         return User.get_featured(tier_id=self.id, **kwargs)
 
 
+@event.listens_for(Tier, 'after_insert')
+@event.listens_for(Tier, 'after_update')
+@event.listens_for(Tier, 'after_delete')
+def _on_tier_modified(mapper, connection, tier):
+    # Featured users include details of their tiers. Cached pages with tiers
+    # are also stored in the namespace of featured users.
+    mark_featured_modified(object_session(tier))
+
+
 class TierAdminView(AdminModelView):
     column_labels = dict(
         id='ID',
@@ -1,11 +1,15 @@
 from metabrainz.model import db
-from metabrainz.model import token_log
+from metabrainz.model import token_log, search
 from metabrainz.model.token_log import TokenLog
 from metabrainz.utils import generate_string
 from datetime import datetime, timedelta
 
 TOKEN_LENGTH = 40
 
+MATCH_EXACT = 'exact'
+MATCH_PREFIX = 'prefix'
+MATCH_CONTAINS = 'contains'
+
 
 class Token(db.Model):
     __tablename__ = 'token'
@@ -26,8 +30,50 @@ class Token(db.Model):
         return cls.query.filter_by(**kwargs).all()
 
     @classmethod
-    def search_by_value(cls, value):
-        return cls.query.filter(cls.value.like('%'+value+'%')).all()
+    def get_active(cls, owner_ids):
+        """Returns active tokens of multiple users.
+
+        Returns:
+            Dictionary with IDs of users as keys and their tokens as values.
+        """
+        owner_ids = list(owner_ids)
+        if not owner_ids:
+            return {}
+        tokens = cls.query.filter(cls.owner_id.in_(owner_ids), cls.is_active == True)
+        return dict((token.owner_id, token) for token in tokens)
+
+    @classmethod
+    def search_by_value(cls, value, match=MATCH_CONTAINS, limit=50, after=None):
+        """Search tokens by their value.
+
+        Exact lookups use the primary key, prefix lookups use an index with
+        text_pattern_ops, and substring searches use a trigram index (if
+        available, see `search` module).
+
+        Args:
+            value: Value or part of it (case-sensitive).
+            match: How the value should be matched: MATCH_EXACT,
+                MATCH_PREFIX, or MATCH_CONTAINS.
+            limit: Max number of tokens to return.
+            after: Value of the last token on the previous page of results.
+
+        Returns:
+            List of tokens ordered by value and value of the last token if
+            there are more results (None otherwise).
+        """
+        if match == MATCH_EXACT:
+            condition = cls.value == value
+        elif match == MATCH_PREFIX:
+            condition = cls.value.like(search.escape_like(value) + '%')
+        elif match == MATCH_CONTAINS:
+            condition = cls.value.like('%' + search.escape_like(value) + '%')
+        else:
+            raise ValueError("Unknown match type: %s" % match)
+        query = cls.query.filter(condition)
+        if after is not None:
+            query = query.filter(cls.value > after)
+        tokens = query.order_by(cls.value).limit(limit + 1).all()
+        return tokens[:limit], tokens[limit - 1].value if len(tokens) > limit else None
 
     @classmethod
     def generate_token(cls, owner_id):
@@ -83,5 +129,9 @@ class Token(db.Model):
         TokenLog.create_record(self.value, token_log.ACTION_DEACTIVATE)
 
 
+db.Index('token_value_pattern_idx', Token.value, postgresql_ops={'value': 'text_pattern_ops'})
+search.add_trigram_index(Token.__table__, 'token_value_trgm_idx', 'value')
+
+
 class TokenGenerationLimitException(Exception):
     pass
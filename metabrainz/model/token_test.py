@@ -0,0 +1,20 @@
+from metabrainz.testing import FlaskTestCase
+from metabrainz.model.token import Token, MATCH_EXACT, MATCH_PREFIX, MATCH_CONTAINS
+from metabrainz.model import db
+
+
+class TokenModelTestCase(FlaskTestCase):
+
+    def test_search_by_value(self):
+        for value in [u'abc', u'abcd', u'xabc', u'zzz']:
+            db.session.add(Token(value=value))
+        db.session.commit()
+
+        self.assertEqual([t.value for t in Token.search_by_value(u'abc', MATCH_EXACT)[0]], [u'abc'])
+        self.assertEqual([t.value for t in Token.search_by_value(u'abc', MATCH_PREFIX)[0]], [u'abc', u'abcd'])
+
+        tokens, after = Token.search_by_value(u'abc', MATCH_CONTAINS, limit=2)
+        self.assertEqual([t.value for t in tokens], [u'abc', u'abcd'])
+        tokens, after = Token.search_by_value(u'abc', MATCH_CONTAINS, limit=2, after=after)
+        self.assertEqual([t.value for t in tokens], [u'xabc'])
+        self.assertIsNone(after)
@@ -1,12 +1,19 @@
 from metabrainz.model import db
 from metabrainz.mail import send_mail
 from metabrainz.model.token import Token
+from metabrainz.model import search
 from metabrainz.admin import AdminModelView
-from sqlalchemy.sql.expression import func, or_
+from metabrainz import cache
+from sqlalchemy.sql.expression import or_, and_
 from sqlalchemy.dialects import postgres
+from sqlalchemy.orm import joinedload, object_session, Session
+from sqlalchemy import event
 from flask_login import UserMixin
 from flask import current_app
 from datetime import datetime
+from collections import namedtuple
+import random
+import uuid
 
 
 STATE_ACTIVE = "active"
@@ -15,6 +22,34 @@ STATE_WAITING = "waiting"
 STATE_REJECTED = "rejected"
 STATE_LIMITED = "limited"
 
+# Cache namespace for lists of featured users. It is invalidated every time
+# a user or a tier is modified (see `invalidate_featured_cache`).
+FEATURED_CACHE_NAMESPACE = 'featured_users'
+FEATURED_CACHE_TIME = 60 * 60  # seconds
+
+# Key of `Session.info` that is set when users or tiers have been modified in
+# the current transaction.
+_FEATURED_MODIFIED_KEY = 'featured_users_modified'
+
+# Snapshots of featured users that are stored in the cache. They contain only
+# attributes that are displayed on the website.
+FeaturedUser = namedtuple('FeaturedUser', [
+    'id', 'org_name', 'org_logo_url', 'website_url', 'data_usage_desc', 'good_standing', 'tier_id', 'tier',
+])
+FeaturedTier = namedtuple('FeaturedTier', ['id', 'name', 'available'])
+
+# Cache namespace for identities of signed in users (see `get_identity`).
+# Identities are stored together with a version of the user, which is changed
+# every time the user is modified. Versions are stored outside of namespaces,
+# so they are never kept in L1 and all workers see changes (like blocking a
+# user) immediately, while identities themselves can be kept in L1.
+IDENTITY_CACHE_NAMESPACE = 'user_identity'
+IDENTITY_CACHE_TIME = 60 * 60  # seconds
+
+# Key of `Session.info` that contains IDs of users that have been modified in
+# the current transaction.
+_IDENTITY_MODIFIED_KEY = 'user_identity_modified'
+
 
 class User(db.Model, UserMixin):
     """User model is used for users of MetaBrainz services like Live Data Feed.
@@ -76,7 +111,21 @@ class User(db.Model, UserMixin):
 
     @property
     def token(self):
-        return Token.get(owner_id=self.id, is_active=True)
+        """Active access token of the user or None.
+
+        It's loaded once for each object. Use `load_tokens` to load tokens of
+        multiple users with a single query.
+        """
+        if '_active_token' not in self.__dict__:
+            self._active_token = Token.get(owner_id=self.id, is_active=True)
+        return self._active_token
+
+    @classmethod
+    def load_tokens(cls, users):
+        """Loads active access tokens of multiple users (see `token`)."""
+        tokens = Token.get_active(user.id for user in users)
+        for user in users:
+            user._active_token = tokens.get(user.id)
 
     @classmethod
     def add(cls, **kwargs):
@@ -115,16 +164,17 @@ class User(db.Model, UserMixin):
 
     @classmethod
     def get(cls, **kwargs):
-        return cls.query.filter_by(**kwargs).first()
+        return cls.query.options(joinedload('tier')).filter_by(**kwargs).first()
 
     @classmethod
     def get_all(cls, **kwargs):
-        return cls.query.filter_by(**kwargs).all()
+        return cls.query.options(joinedload('tier')).filter_by(**kwargs).all()
 
     @classmethod
     def get_all_commercial(cls, limit=None, offset=None):
-        query = cls.query.filter(cls.is_commercial==True).order_by(cls.org_name)
+        query = cls.query.filter(cls.is_commercial==True)
         count = query.count()  # Total count should be calculated before limits
+        query = query.options(joinedload('tier')).order_by(cls.org_name)
         if limit is not None:
             query = query.limit(limit)
         if offset is not None:
@@ -135,6 +185,9 @@ class User(db.Model, UserMixin):
     def get_featured(cls, limit=None, **kwargs):
         """Get list of featured users which is randomly sorted.
 
+        All featured users that match the filters are cached, so random
+        sample is taken from the cached list.
+
         Args:
             limit: Max number of users to return.
             in_deadbeat_club: Returns only users from deadbeat club if set to True.
@@ -143,36 +196,69 @@ class User(db.Model, UserMixin):
             tier_id: Returns only users from tier with a specified ID.
 
         Returns:
-            List of users according to filters described above.
+            List of FeaturedUser snapshots according to filters described above.
         """
-        query = cls.query.filter(cls.featured == True)
-        query = query.filter(cls.in_deadbeat_club == kwargs.pop('in_deadbeat_club', False))
-        with_logos = kwargs.pop('with_logos', None)
-        if with_logos:
-            query = query.filter(cls.org_logo_url != None)
+        in_deadbeat_club = kwargs.pop('in_deadbeat_club', False)
+        with_logos = bool(kwargs.pop('with_logos', None))
         tier_id = kwargs.pop('tier_id', None)
-        if tier_id:
-            query = query.filter(cls.tier_id == tier_id)
         if kwargs:
             raise TypeError('Unexpected **kwargs: %r' % kwargs)
-        return query.order_by(func.random()).limit(limit).all()
+        users = _get_featured(in_deadbeat_club, with_logos, tier_id)
+        return random.sample(users, min(limit, len(users)) if limit is not None else len(users))
+
+    @classmethod
+    def get_featured_by_tier(cls, in_deadbeat_club=False, with_logos=None):
+        """Get featured users of all tiers at once.
+
+        Arguments are the same as in `get_featured`.
+
+        Returns:
+            Dictionary with tier IDs as keys and randomly sorted lists of
+            FeaturedUser snapshots as values. Users without a tier are not
+            included.
+        """
+        by_tier = {}
+        for user in cls.get_featured(in_deadbeat_club=in_deadbeat_club, with_logos=with_logos):
+            if user.tier_id is not None:
+                by_tier.setdefault(user.tier_id, []).append(user)
+        return by_tier
 
     @classmethod
-    def search(cls, value):
+    def search(cls, value, limit=20, after=None):
         """Search users by their musicbrainz_id, org_name, contact_name,
         or contact_email.
+
+        Results are ordered by how well they match the value (see
+        `search.match_score`).
+
+        Args:
+            value: Part of any of the fields (case-insensitive).
+            limit: Max number of users to return.
+            after: Position after which the results start, as returned
+                with the previous page of results.
+
+        Returns:
+            List of users and position of the next page of results (None if
+            there are no more results).
+
+        Raises:
+            ValueError if position is invalid.
         """
-        query = cls.query.filter(or_(
-            cls.musicbrainz_id.ilike('%'+value+'%'),
-            cls.org_name.ilike('%'+value+'%'),
-            cls.contact_name.ilike('%'+value+'%'),
-            cls.contact_email.ilike('%'+value+'%'),
-        ))
-        return query.limit(20).all()
+        columns = [cls.musicbrainz_id, cls.org_name, cls.contact_name, cls.contact_email]
+        score = search.match_score(columns, value)
+        query = db.session.query(cls, score).options(joinedload('tier'))
+        query = query.filter(search.contains_any(columns, value))
+        if after is not None:
+            after_score, after_id = search.parse_position(after)
+            query = query.filter(or_(score < after_score, and_(score == after_score, cls.id > after_id)))
+        rows = query.order_by(score.desc(), cls.id).limit(limit + 1).all()
+        next_after = search.format_position(rows[limit - 1][1], rows[limit - 1][0].id) if len(rows) > limit else None
+        return [user for user, _ in rows[:limit]], next_after
 
     def generate_token(self):
         """Generates new access token for this user."""
         if self.state == STATE_ACTIVE:
+            self.__dict__.pop('_active_token', None)  # previous token is revoked
             return Token.generate_token(self.id)
         else:
             raise InactiveUserException("Can't generate token for inactive user.")
@@ -239,10 +325,159 @@ def send_user_signup_notification(user):
     )
 
 
+for _column in ('musicbrainz_id', 'org_name', 'contact_name', 'contact_email'):
+    search.add_trigram_index(User.__table__, 'user_%s_trgm_idx' % _column, _column)
+
+
 class InactiveUserException(Exception):
     pass
 
 
+def invalidate_featured_cache():
+    """Invalidates cached lists of featured users.
+
+    It's called automatically after a transaction that modifies users or
+    tiers is committed (see `_invalidate_user_caches`).
+    """
+    cache.invalidate_namespace(FEATURED_CACHE_NAMESPACE)
+
+
+@cache.memoized(FEATURED_CACHE_NAMESPACE, time=FEATURED_CACHE_TIME)
+def _get_featured(in_deadbeat_club, with_logos, tier_id):
+    query = User.query.options(joinedload('tier')).filter(User.featured == True)
+    query = query.filter(User.in_deadbeat_club == in_deadbeat_club)
+    if with_logos:
+        query = query.filter(User.org_logo_url != None)
+    if tier_id:
+        query = query.filter(User.tier_id == tier_id)
+    return [FeaturedUser(
+        id=user.id,
+        org_name=user.org_name,
+        org_logo_url=user.org_logo_url,
+        website_url=user.website_url,
+        data_usage_desc=user.data_usage_desc,
+        good_standing=user.good_standing,
+        tier_id=user.tier_id,
+        tier=FeaturedTier(user.tier.id, user.tier.name, user.tier.available) if user.tier else None,
+    ) for user in query.order_by(User.id)]
+
+
+class UserIdentity(UserMixin):
+    """Immutable snapshot of a signed in user.
+
+    It contains attributes that are needed on most pages, so that
+    `current_user` can be loaded from the cache. Other attributes and methods
+    are taken from the full `User` object, which is loaded from the database
+    when one of them is used for the first time (see `user`).
+    """
+    fields = ('id', 'musicbrainz_id', 'is_commercial', 'state', 'good_standing', 'org_name')
+    __slots__ = fields + ('_user',)
+
+    def __init__(self, **kwargs):
+        for name in self.fields:
+            object.__setattr__(self, name, kwargs[name])
+        object.__setattr__(self, '_user', None)
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(**dict((name, getattr(user, name)) for name in cls.fields))
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.fields)
+
+    @property
+    def user(self):
+        """Full `User` object."""
+        if self._user is None:
+            object.__setattr__(self, '_user', User.query.get(self.id))
+        return self._user
+
+    def __getattr__(self, name):
+        # Only called for attributes that are missing in the snapshot
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UserIdentity is immutable, modify its user instead.")
+
+
+def get_identity(user_id):
+    """Returns `UserIdentity` of a user with a specified ID or None if the
+    user doesn't exist.
+    """
+    key = cache.gen_key('user', user_id, _get_identity_version(user_id))
+    data = cache.get(key, IDENTITY_CACHE_NAMESPACE)
+    if data is None:
+        user = User.query.get(user_id)
+        if user is None:
+            return None
+        data = UserIdentity.from_user(user).to_dict()
+        cache.set(key, data, IDENTITY_CACHE_TIME, IDENTITY_CACHE_NAMESPACE)
+    return UserIdentity(**data)
+
+
+def _get_identity_version(user_id):
+    """Returns current version of a user's cached identity.
+
+    A new version is stored before the user is loaded from the database, so
+    that it can't replace a version that has been set after the user has
+    been modified. Identity loaded before the modification is then stored
+    under the old version, which isn't used anymore.
+    """
+    key = _get_identity_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_identity_version()
+        if not cache.add(key, version, IDENTITY_CACHE_TIME):
+            # Another process has set the version in the meantime
+            version = cache.get(key) or version
+    return version
+
+
+def _get_identity_version_key(user_id):
+    return cache.gen_key('user_identity_version', user_id)
+
+
+def _new_identity_version():
+    # Versions are random, so that a user whose version has been evicted
+    # doesn't get a version that identity has been stored with before.
+    return uuid.uuid4().hex
+
+
+def mark_featured_modified(session):
+    """Records that cached lists of featured users need to be invalidated
+    after the current transaction.
+    """
+    session.info[_FEATURED_MODIFIED_KEY] = True
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _on_user_modified(mapper, connection, user):
+    session = object_session(user)
+    mark_featured_modified(session)
+    session.info.setdefault(_IDENTITY_MODIFIED_KEY, set()).add(user.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_user_caches(session):
+    if session.info.pop(_FEATURED_MODIFIED_KEY, False):
+        invalidate_featured_cache()
+    user_ids = session.info.pop(_IDENTITY_MODIFIED_KEY, None)
+    if user_ids:
+        version = _new_identity_version()
+        cache.set_multi(dict((_get_identity_version_key(user_id), version) for user_id in user_ids),
+                        IDENTITY_CACHE_TIME)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_user_modifications(session):
+    session.info.pop(_FEATURED_MODIFIED_KEY, None)
+    session.info.pop(_IDENTITY_MODIFIED_KEY, None)
+
+
 class UserAdminView(AdminModelView):
     column_labels = dict(
         id='ID',
@@ -0,0 +1,122 @@
+from metabrainz.testing import FlaskTestCase
+from metabrainz.model.user import User, UserIdentity, get_identity, STATE_ACTIVE, STATE_LIMITED
+from metabrainz.model import user as user_model
+from metabrainz import cache
+from metabrainz.model.tier import Tier
+from metabrainz.model import db
+
+
+class UserModelTestCase(FlaskTestCase):
+
+    def _add_user(self, name, tier=None, logo=True, in_deadbeat_club=False):
+        user = User(is_commercial=True, musicbrainz_id=name, contact_name=name, contact_email=u'test@example.org',
+                    state=STATE_ACTIVE, org_name=name, org_logo_url=u'http://example.org/logo.png' if logo else None,
+                    tier=tier, featured=True, in_deadbeat_club=in_deadbeat_club)
+        db.session.add(user)
+        return user
+
+    def test_get_featured(self):
+        tier = Tier(name=u'Unicorn', price=1000, available=True)
+        for i in range(5):
+            self._add_user(u'Good %s' % i, tier=tier if i < 3 else None, logo=i != 0)
+        self._add_user(u'Bad', in_deadbeat_club=True)
+        db.session.commit()
+
+        self.assertEqual(len(User.get_featured()), 5)
+        self.assertEqual(len(User.get_featured(limit=2)), 2)
+        self.assertEqual(len(User.get_featured(limit=10, with_logos=True)), 4)
+        self.assertEqual([user.org_name for user in User.get_featured(in_deadbeat_club=True)], [u'Bad'])
+        users = tier.get_featured_users(with_logos=True)
+        self.assertEqual(sorted(user.org_name for user in users), [u'Good 1', u'Good 2'])
+        self.assertTrue(users[0].tier.available)
+
+    def test_get_featured_invalidation(self):
+        tier = Tier(name=u'Unicorn', price=1000, available=True)
+        user = self._add_user(u'Good', tier=tier)
+        db.session.commit()
+        self.assertEqual(len(User.get_featured()), 1)
+
+        # Changes that bypass the ORM aren't noticed
+        db.session.execute('UPDATE "user" SET featured = false')
+        db.session.commit()
+        self.assertEqual(len(User.get_featured()), 1)
+
+        user.org_name = u'Better'
+        db.session.commit()
+        self.assertEqual(User.get_featured(), [])
+
+        user.featured = True
+        db.session.commit()
+        self.assertEqual(User.get_featured()[0].org_name, u'Better')
+        tier.available = False
+        db.session.commit()
+        self.assertFalse(User.get_featured()[0].tier.available)
+
+    def test_search(self):
+        for name in [u'Unicorns', u'Unicorn', u'Pink unicorn', u'Nothing', u'100%']:
+            self._add_user(name)
+        db.session.commit()
+
+        users, after = User.search(u'unicorn', limit=2)
+        self.assertEqual([user.org_name for user in users], [u'Unicorn', u'Unicorns'])
+        self.assertIsNotNone(after)
+        users, after = User.search(u'unicorn', limit=2, after=after)
+        self.assertEqual([user.org_name for user in users], [u'Pink unicorn'])
+        self.assertIsNone(after)
+
+        self.assertEqual([user.org_name for user in User.search(u'0%')[0]], [u'100%'])
+        self.assertEqual(User.search(u'_')[0], [])
+        self.assertRaises(ValueError, User.search, u'test', after='invalid')
+
+    def test_get_identity(self):
+        user = self._add_user(u'Tester')
+        db.session.commit()
+        self.assertIsNone(get_identity(user.id + 1))
+
+        identity = get_identity(user.id)
+        self.assertIsInstance(identity, UserIdentity)
+        self.assertEqual(identity.musicbrainz_id, u'Tester')
+        self.assertEqual(identity.get_id(), unicode(user.id))
+        self.assertRaises(AttributeError, setattr, identity, 'state', STATE_LIMITED)
+
+        # Changes that bypass the ORM aren't noticed
+        db.session.execute('UPDATE "user" SET musicbrainz_id = \'Changed\'')
+        db.session.commit()
+        self.assertEqual(get_identity(user.id).musicbrainz_id, u'Tester')
+
+        user.set_state(STATE_LIMITED)
+        identity = get_identity(user.id)
+        self.assertEqual(identity.state, STATE_LIMITED)
+        self.assertEqual(identity.musicbrainz_id, u'Changed')
+
+        # Attributes that aren't in the snapshot are taken from the full user
+        self.assertEqual(identity.contact_email, u'test@example.org')
+        self.assertIs(identity.user, user)
+
+    def test_get_identity_invalidation(self):
+        user, other = self._add_user(u'Tester'), self._add_user(u'Other')
+        db.session.commit()
+        get_identity(user.id)
+        get_identity(other.id)
+
+        # Only identities of modified users are removed from the cache
+        db.session.execute('UPDATE "user" SET musicbrainz_id = musicbrainz_id || \' 2\'')
+        db.session.commit()
+        user.set_state(STATE_LIMITED)
+        self.assertEqual(get_identity(user.id).musicbrainz_id, u'Tester 2')
+        self.assertEqual(get_identity(other.id).musicbrainz_id, u'Other')
+
+        db.session.delete(user)
+        db.session.commit()
+        self.assertIsNone(get_identity(user.id))
+
+    def test_get_identity_concurrent_read(self):
+        user = self._add_user(u'Tester')
+        db.session.commit()
+        version = user_model._get_identity_version(user.id)
+        identity = UserIdentity.from_user(user).to_dict()
+        user.set_state(STATE_LIMITED)
+        # Identity that has been loaded before the user was modified is
+        # stored after the modification has been committed.
+        cache.set(cache.gen_key('user', user.id, version), identity, namespace=user_model.IDENTITY_CACHE_NAMESPACE)
+        self.assertEqual(get_identity(user.id).state, STATE_LIMITED)
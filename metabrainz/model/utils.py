@@ -21,7 +21,8 @@ def create_tables(db_uri):
 
 def init_postgres(uri):
     """Initializes PostgreSQL database from provided URI.
-    New user and database will be created, if needed.
+    New user and database will be created, if needed. Extensions that can
+    only be installed by a superuser are installed as well.
     """
     hostname, db, username, password = explode_db_url(uri)
     if hostname not in ['localhost', '127.0.0.1']:
@@ -40,3 +41,8 @@ def init_postgres(uri):
         exit_code = subprocess.call('sudo -u postgres createdb -O %s %s' % (username, db), shell=True)
         if exit_code != 0:
             raise Exception('Failed to create PostgreSQL database!')
+
+    # Used for substring search (see metabrainz.model.search module)
+    exit_code = subprocess.call('sudo -u postgres psql -c "CREATE EXTENSION IF NOT EXISTS pg_trgm;" %s' % db, shell=True)
+    if exit_code != 0:
+        raise Exception('Failed to install pg_trgm extension!')
@@ -0,0 +1,107 @@
+"""
+Full-page cache for public pages.
+
+Views decorated with `cached_page` store complete responses in the cache
+when they are requested by anonymous visitors. Following anonymous requests
+for the same page (path and selected query arguments) are answered from the
+cache without running the view. Visitors who are signed in, have a "remember
+me" cookie, or have anything else in their session (flashed messages, sign up
+in progress) always get freshly rendered pages.
+
+Pages are stored in a namespace of the data they show, for example
+`user.FEATURED_CACHE_NAMESPACE`, so they are invalidated together with it
+whenever that data is modified (including changes made in the admin
+interface). Pages that don't depend on the database are stored in
+`PAGE_CACHE_NAMESPACE` and simply expire.
+
+Responses served this way have an ETag, so browsers can revalidate them and
+get "304 Not Modified" back. They are marked to be revalidated on every use
+and vary on cookies, because the same URL shows different content to signed
+in users.
+"""
+from flask import request, session, current_app, make_response
+from werkzeug.wrappers import Response
+from metabrainz import cache
+from functools import wraps
+import hashlib
+
+PAGE_CACHE_NAMESPACE = 'pages'
+DEFAULT_CACHE_TIME = 60 * 10  # seconds
+
+# Pages that show randomly picked items (like featured users) are rendered
+# again more often, so that the selection changes.
+RANDOM_CONTENT_CACHE_TIME = 60  # seconds
+
+# Session keys that Flask-Login sets for anonymous visitors. They don't
+# affect the content of pages.
+_ANONYMOUS_SESSION_KEYS = frozenset(['_id', 'remember'])
+
+# Headers that are added to each response separately.
+_EXCLUDED_HEADERS = frozenset(['set-cookie', 'content-length', 'etag', 'cache-control', 'vary'])
+
+
+def cached_page(namespace=PAGE_CACHE_NAMESPACE, time=DEFAULT_CACHE_TIME, query_args=()):
+    """Decorator that caches responses of a view for anonymous visitors.
+
+    Only successful (200) responses are cached.
+
+    Args:
+        namespace: Cache namespace in which responses are stored. Should be
+            the namespace of data that is shown on the page, so that the page
+            is invalidated when that data changes.
+        time: Number of seconds after which the page is rendered again.
+        query_args: Names of query arguments that affect the content of the
+            page. Other arguments are ignored.
+    """
+    def decorator(f):
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not _is_anonymous():
+                return f(*args, **kwargs)
+
+            key = _page_key(query_args)
+            cached = cache.get(key, namespace)
+            if cached is None:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed or not _is_anonymous():
+                    return response
+                body = response.get_data()
+                cached = {
+                    'headers': [(name, value) for name, value in response.headers
+                                if name.lower() not in _EXCLUDED_HEADERS],
+                    'body': body,
+                    'etag': hashlib.md5(body).hexdigest(),
+                }
+                cache.set(key, cached, time, namespace)
+
+            response = Response(cached['body'], headers=cached['headers'])
+            response.set_etag(cached['etag'])
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response.make_conditional(request)
+
+        return decorated
+
+    return decorator
+
+
+def _is_anonymous():
+    """Checks if the current visitor would get the same page as any other
+    anonymous visitor.
+
+    It doesn't use `current_user`, because loading it modifies the session.
+    """
+    cookie_name = current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')
+    if cookie_name in request.cookies:
+        return False
+    return not any(key not in _ANONYMOUS_SESSION_KEYS for key in session)
+
+
+def _page_key(query_args):
+    attributes = [request.host, request.path]
+    for name in sorted(query_args):
+        attributes.append(u"%s=%s" % (name, u",".join(request.args.getlist(name))))
+    # Key is hashed by the cache module, so it can contain any characters
+    return u"\0".join(attributes).encode('utf-8')
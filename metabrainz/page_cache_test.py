@@ -0,0 +1,59 @@
+from metabrainz.testing import FlaskTestCase
+from metabrainz.model.user import User, STATE_ACTIVE
+from metabrainz.model import db
+from flask import url_for, template_rendered
+
+
+class PageCacheTestCase(FlaskTestCase):
+
+    def setUp(self):
+        super(PageCacheTestCase, self).setUp()
+        self.rendered = []
+        template_rendered.connect(self._record_template, self.app)
+
+    def tearDown(self):
+        template_rendered.disconnect(self._record_template, self.app)
+        super(PageCacheTestCase, self).tearDown()
+
+    def _record_template(self, sender, template, context, **extra):
+        self.rendered.append(template.name)
+
+    def test_cached_page(self):
+        response = self.client.get(url_for('index.about'))
+        self.assert200(response)
+        self.assertEqual(len(self.rendered), 1)
+        etag = response.headers['ETag']
+        self.assertIn('Cookie', response.headers['Vary'])
+
+        cached = self.client.get(url_for('index.about'))
+        self.assertEqual(len(self.rendered), 1)
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(cached.headers['ETag'], etag)
+        self.assertEqual(cached.headers['Content-Type'], response.headers['Content-Type'])
+
+        self.assertEqual(self.client.get(url_for('index.about'), headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_bypass(self):
+        self.client.get(url_for('index.about'))
+        with self.client.session_transaction() as session:
+            session['_flashes'] = [('info', 'Message')]
+        response = self.client.get(url_for('index.about'))
+        self.assertEqual(len(self.rendered), 2)
+        self.assertNotIn('ETag', response.headers)
+
+        self.client.set_cookie('localhost', 'remember_token', '1|token')
+        self.client.get(url_for('index.about'))
+        self.assertEqual(len(self.rendered), 3)
+
+    def test_invalidation(self):
+        self.client.get(url_for('index.bad_customers'))
+        self.client.get(url_for('index.bad_customers'))
+        self.assertEqual(len(self.rendered), 1)
+
+        db.session.add(User(is_commercial=True, musicbrainz_id=u'Bad', contact_name=u'Bad',
+                            contact_email=u'test@example.org', state=STATE_ACTIVE, org_name=u'Bad Inc.',
+                            featured=True, in_deadbeat_club=True))
+        db.session.commit()
+        response = self.client.get(url_for('index.bad_customers'))
+        self.assertEqual(len(self.rendered), 2)
+        self.assertIn('Bad Inc.', response.data)
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, redirect, url_for
 from werkzeug.exceptions import NotFound
+from metabrainz.page_cache import cached_page
 import os
 import codecs
 
@@ -17,6 +18,7 @@ def index():
 
 
 @annual_reports_bp.route('/<int:year>')
+@cached_page()
 def view(year):
     """This endpoint handles requests for pages with annual reports."""
     report = load_report(year)
@@ -1,8 +1,32 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, jsonify
+from werkzeug.exceptions import BadRequest
+from metabrainz.model.donation_rollup import DonationRollup, PERIOD_MONTH, PERIOD_YEAR
+from metabrainz.model.donation import CACHE_NAMESPACE, CACHE_TIME
+from metabrainz.page_cache import cached_page
+from metabrainz import cache
 
 financial_reports_bp = Blueprint('financial_reports', __name__, static_folder='files')
 
 
 @financial_reports_bp.route('/')
+@cached_page(CACHE_NAMESPACE, time=CACHE_TIME)
 def index():
-    return render_template('reports/financial_reports/index.html')
+    return render_template('reports/financial_reports/index.html',
+                           yearly_totals=_get_donation_totals(PERIOD_YEAR))
+
+
+@financial_reports_bp.route('/donations.json')
+def donations():
+    """Totals of donations received during each month or year."""
+    period = request.args.get('period', PERIOD_MONTH)
+    if period not in (PERIOD_MONTH, PERIOD_YEAR):
+        raise BadRequest("Period must be either %s or %s." % (PERIOD_MONTH, PERIOD_YEAR))
+    response = jsonify(period=period, totals=_get_donation_totals(period))
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_TIME
+    return response
+
+
+@cache.memoized(CACHE_NAMESPACE, time=CACHE_TIME)  # invalidated when donations are modified
+def _get_donation_totals(period):
+    return DonationRollup.get_totals(period)
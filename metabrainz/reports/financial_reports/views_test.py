@@ -1,5 +1,8 @@
 from metabrainz.testing import FlaskTestCase
+from metabrainz.model.donation import Donation
+from metabrainz.model import db
 from flask import url_for
+from datetime import datetime
 
 
 class FinancialReportsViewsTestCase(FlaskTestCase):
@@ -7,3 +10,17 @@ class FinancialReportsViewsTestCase(FlaskTestCase):
     def test_index(self):
         response = self.client.get(url_for('financial_reports.index'))
         self.assert200(response)
+
+    def test_donations(self):
+        response = self.client.get(url_for('financial_reports.donations'))
+        self.assert200(response)
+        self.assertEqual(response.json, {'period': 'month', 'totals': []})
+
+        db.session.add(Donation(first_name=u'Tester', last_name=u'Testing', email=u'test@example.org',
+                                amount=10, payment_date=datetime(2015, 6, 1)))
+        db.session.commit()
+        response = self.client.get(url_for('financial_reports.donations', period='year'))
+        self.assertEqual([total['amount'] for total in response.json['totals']], [10])
+        self.assertIn('max-age', response.headers['Cache-Control'])
+
+        self.assert400(self.client.get(url_for('financial_reports.donations', period='week')))
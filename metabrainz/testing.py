@@ -1,6 +1,7 @@
 from flask_testing import TestCase
 from metabrainz import create_app
-from metabrainz.model import db
+from metabrainz.model import db, query_counter
+from metabrainz import cache
 
 
 class FlaskTestCase(TestCase):
@@ -10,6 +11,10 @@ class FlaskTestCase(TestCase):
         app.config['TESTING'] = True
         app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False  # otherwise redirects aren't going to return right status
         app.config['SQLALCHEMY_DATABASE_URI'] = app.config['TEST_SQLALCHEMY_DATABASE_URI']
+        app.config['MAIL_BACKEND'] = 'null'  # not sending any emails during testing
+        app.config['QUERY_COUNT_HEADER'] = True
+        # Using in-process cache so that caching is tested without memcached
+        cache.init(namespace=app.config['MEMCACHED_NAMESPACE'], backend="local")
         return app
 
     def setUp(self):
@@ -18,6 +23,11 @@ class FlaskTestCase(TestCase):
     def tearDown(self):
         db.session.remove()
         db.drop_all()
+        cache.flush_all()
+
+    def assertQueryCount(self, response, count):
+        """Checks number of database queries made while handling a request."""
+        self.assertEqual(int(response.headers[query_counter.HEADER]), count)
 
     def temporary_login(self, user_id):
         with self.client.session_transaction() as session:
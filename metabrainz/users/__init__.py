@@ -1,6 +1,6 @@
 from flask import redirect, url_for
 from flask_login import LoginManager, current_user
-from metabrainz.model.user import User
+from metabrainz.model.user import get_identity
 from functools import wraps
 
 login_manager = LoginManager()
@@ -9,7 +9,8 @@ login_manager.login_view = 'users.login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.get(id=user_id)
+    # Snapshot from the cache, full user is loaded only if it's needed
+    return get_identity(int(user_id))
 
 
 def login_forbidden(f):
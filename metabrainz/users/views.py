@@ -3,9 +3,10 @@ from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.exceptions import NotFound, InternalServerError, BadRequest
 from metabrainz.mail import send_mail
 from metabrainz.model.tier import Tier
-from metabrainz.model.user import User, InactiveUserException
+from metabrainz.model.user import User, InactiveUserException, FEATURED_CACHE_NAMESPACE
 from metabrainz.model.token import TokenGenerationLimitException
 from metabrainz.users import musicbrainz_login, login_forbidden
+from metabrainz.page_cache import cached_page, RANDOM_CONTENT_CACHE_TIME
 from metabrainz.users.forms import CommercialSignUpForm, NonCommercialSignUpForm, UserEditForm
 from metabrainz import flash, session
 
@@ -21,16 +22,23 @@ ACCOUNT_TYPE_NONCOMMERCIAL = 'noncommercial'
 
 
 @users_bp.route('/supporters')
+@cached_page(FEATURED_CACHE_NAMESPACE, time=RANDOM_CONTENT_CACHE_TIME)  # includes tiers
 def supporters_list():
-    return render_template('users/supporters-list.html', tiers=Tier.get_available(sort=True, sort_desc=True))
+    return render_template(
+        'users/supporters-list.html',
+        tiers=Tier.get_available(sort=True, sort_desc=True),
+        featured_users=User.get_featured_by_tier(),
+    )
 
 
 @users_bp.route('/supporters/bad')
+@cached_page()
 def bad_standing():
     return render_template('users/bad-standing.html')
 
 
 @users_bp.route('/supporters/account-type')
+@cached_page(FEATURED_CACHE_NAMESPACE, time=RANDOM_CONTENT_CACHE_TIME)
 def account_type():
     return render_template(
         'users/account-type.html',
@@ -40,6 +48,7 @@ def account_type():
 
 
 @users_bp.route('/supporters/tiers/<int:tier_id>')
+@cached_page(FEATURED_CACHE_NAMESPACE, time=RANDOM_CONTENT_CACHE_TIME)
 def tier(tier_id):
     t = Tier.get(id=tier_id)
     if not t or not t.available:
@@ -1,5 +1,7 @@
 from metabrainz.testing import FlaskTestCase
 from metabrainz.model.tier import Tier
+from metabrainz.model.user import User, STATE_ACTIVE
+from metabrainz.model import db
 from flask import url_for
 
 
@@ -8,6 +10,17 @@ class UsersViewsTestCase(FlaskTestCase):
     def test_supporters_list(self):
         self.assert200(self.client.get(url_for('users.supporters_list')))
 
+        for i in range(3):
+            tier = Tier(name=u'Tier %s' % i, price=i, available=True)
+            db.session.add(User(is_commercial=True, musicbrainz_id=u'User %s' % i, contact_name=u'User',
+                                contact_email=u'test@example.org', state=STATE_ACTIVE, org_name=u'Org %s' % i,
+                                tier=tier, featured=True))
+        db.session.commit()
+        response = self.client.get(url_for('users.supporters_list'))
+        self.assertIn('Org 2', response.data)
+        # Tiers and featured users of all tiers
+        self.assertQueryCount(response, 2)
+
     def test_account_type(self):
         self.assert200(self.client.get(url_for('users.account_type')))
 
@@ -59,6 +72,18 @@ class UsersViewsTestCase(FlaskTestCase):
     def test_profile(self):
         self.assertStatus(self.client.get(url_for('users.profile')), 302)
 
+        user = User(is_commercial=False, musicbrainz_id=u'Tester', contact_name=u'Tester',
+                    contact_email=u'test@example.org', state=STATE_ACTIVE)
+        db.session.add(user)
+        db.session.commit()
+        self.temporary_login(user.id)
+        db.session.expunge_all()  # user needs to be loaded by the view
+        response = self.client.get(url_for('users.profile'))
+        self.assert200(response)
+        self.assertIn('test@example.org', response.data)
+        # Identity, full user, and token
+        self.assertQueryCount(response, 3)
+
     def test_profile_edit(self):
         self.assertStatus(self.client.get(url_for('users.profile_edit')), 302)
 
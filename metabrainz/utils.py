@@ -1,3 +1,4 @@
+from flask import request, current_app
 import string
 import random
 
@@ -10,3 +11,10 @@ def generate_string(length):
     """Generates random string with a specified length."""
     return ''.join(random.SystemRandom().choice(string.ascii_letters + string.digits)
                    for _ in range(length))
+
+
+def get_remote_addr():
+    """Returns IP address of the client that sent current request."""
+    if current_app.config.get('BEHIND_GATEWAY'):
+        return request.headers.get(current_app.config['REMOTE_ADDR_HEADER'])
+    return request.remote_addr
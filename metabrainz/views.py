@@ -1,10 +1,12 @@
 from flask import Blueprint, render_template
-from metabrainz.model.user import User
+from metabrainz.model.user import User, FEATURED_CACHE_NAMESPACE
+from metabrainz.page_cache import cached_page, RANDOM_CONTENT_CACHE_TIME
 
 index_bp = Blueprint('index', __name__)
 
 
 @index_bp.route('/')
+@cached_page(FEATURED_CACHE_NAMESPACE, time=RANDOM_CONTENT_CACHE_TIME)
 def home():
     return render_template(
         'index/index.html',
@@ -14,21 +16,25 @@ def home():
 
 
 @index_bp.route('/about')
+@cached_page()
 def about():
     return render_template('index/about.html')
 
 
 @index_bp.route('/contact')
+@cached_page()
 def contact():
     return render_template('index/contact.html')
 
 
 @index_bp.route('/sponsors')
+@cached_page()
 def sponsors():
     return render_template('index/sponsors.html')
 
 
 @index_bp.route('/bad-customers')
+@cached_page(FEATURED_CACHE_NAMESPACE, time=RANDOM_CONTENT_CACHE_TIME)
 def bad_customers():
     return render_template(
         'index/bad-customers.html',
@@ -37,5 +43,6 @@ def bad_customers():
 
 
 @index_bp.route('/privacy')
+@cached_page()
 def privacy_policy():
     return render_template('index/privacy.html')